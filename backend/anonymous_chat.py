@@ -1,53 +1,141 @@
 # backend/anonymous_chat.py
 import asyncio
-from collections import defaultdict
-from typing import Dict, List
+import json
+import os
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Dict, Set
 import uuid
 
+from chat_backplane import create_backplane
+from metrics import LatencyTracker
+
+class ChatConnection:
+    """One room member's WebSocket with a bounded outbound queue
+
+    A sender task drains the queue so a slow client only ever delays its
+    own messages. If the queue fills up the client is too slow to keep up
+    and is disconnected.
+    """
+
+    def __init__(self, manager, room_id, websocket, max_queue):
+        self.manager = manager
+        self.room_id = room_id
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.closed = False
+        self.task = asyncio.create_task(self._send_loop())
+
+    def enqueue(self, payload, sent_at):
+        """Queue a serialized message; returns False if the client is too slow"""
+        try:
+            self.queue.put_nowait((payload, sent_at))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _send_loop(self):
+        try:
+            while True:
+                payload, sent_at = await self.queue.get()
+                await self.websocket.send_text(payload)
+                self.manager.record_delivery(time.time() - sent_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket is dead; drop it from the room
+            self.manager.evict(self, "dead")
+
+    async def close(self):
+        self.closed = True
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
 class ChatManager:
-    def __init__(self):
-        self.active_rooms: Dict[str, List] = defaultdict(list)
-        self.user_rooms: Dict[str, str] = {}
-    
-    def join_chat(self, user_id: str):
+    """Anonymous chat rooms: matchmaking plus the live WebSocket hub
+
+    Room membership and cross-node message fan-out go through the chat
+    backplane (in-process or Redis). This node subscribes to a room only
+    while it has local connections in it, and delivers the room's
+    messages to those connections. The last CHAT_HISTORY_SIZE messages of
+    each subscribed room are kept in memory for join-time history; older
+    pages are read from the database.
+    """
+
+    def __init__(self, backplane=None, max_queue=None, db=None, history_size=None):
+        self.backplane = backplane or create_backplane()
+        self.connections: Dict[str, Set[ChatConnection]] = defaultdict(set)
+        self.max_queue = max_queue or int(os.getenv("CHAT_SEND_QUEUE", "100"))
+        self.db = db
+        self.history_size = history_size or int(os.getenv("CHAT_HISTORY_SIZE", "100"))
+        self.recent: Dict[str, deque] = {}
+        self.latency = LatencyTracker()
+
+        self.messages = 0
+        self.deliveries = 0
+        self.evictions = {"dead": 0, "slow": 0}
+        self.history_pages = {"memory": 0, "database": 0}
+
+    async def join_chat(self, user_id: str, topic: str = None, language: str = None):
         """Join a chat room - either existing or new"""
-        # Check if user is already in a room
-        if user_id in self.user_rooms:
-            return self.user_rooms[user_id]
-        
-        # Find a suitable room or create new one
-        room_id = None
-        for rid, users in self.active_rooms.items():
-            if len(users) < 5:  # Room size limit
-                room_id = rid
-                break
-        
-        if not room_id:
-            room_id = str(uuid.uuid4())
-        
-        # Add user to room
-        self.active_rooms[room_id].append(user_id)
-        self.user_rooms[user_id] = room_id
-        
-        return room_id
-    
-    def leave_chat(self, room_id: str, user_id: str):
+        return await self.backplane.join(user_id, topic, language)
+
+    async def leave_chat(self, room_id: str, user_id: str):
         """Remove user from chat room"""
-        if room_id in self.active_rooms and user_id in self.active_rooms[room_id]:
-            self.active_rooms[room_id].remove(user_id)
-        
-        if user_id in self.user_rooms:
-            del self.user_rooms[user_id]
-        
-        # Clean up empty rooms
-        if room_id in self.active_rooms and not self.active_rooms[room_id]:
-            del self.active_rooms[room_id]
-    
-    async def broadcast_message(self, room_id: str, message_data: dict, sender_websocket):
-        """Broadcast message to all users in room"""
-        if room_id not in self.active_rooms:
+        await self.backplane.leave(room_id, user_id)
+
+    async def connect(self, room_id: str, websocket):
+        """Register an accepted WebSocket as a member of the room"""
+        connection = ChatConnection(self, room_id, websocket, self.max_queue)
+        first = room_id not in self.connections
+        self.connections[room_id].add(connection)
+        if first:
+            self.recent.setdefault(room_id, deque(maxlen=self.history_size))
+            await self.backplane.subscribe(room_id, self._deliver)
+        return connection
+
+    async def disconnect(self, connection: ChatConnection):
+        self._remove(connection)
+        await connection.close()
+
+    def evict(self, connection: ChatConnection, reason: str):
+        """Drop a dead or too-slow connection without waiting on it"""
+        if connection.closed:
             return
-        
+        self.evictions[reason] += 1
+        self._remove(connection)
+        connection.closed = True
+        if reason == "slow":
+            connection.task.cancel()
+            asyncio.ensure_future(self._close_socket(connection.websocket))
+
+    def _remove(self, connection: ChatConnection):
+        members = self.connections.get(connection.room_id)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del self.connections[connection.room_id]
+                asyncio.ensure_future(self._unsubscribe_if_empty(connection.room_id))
+
+    async def _unsubscribe_if_empty(self, room_id):
+        # Someone may have reconnected to the room in the meantime
+        if room_id not in self.connections:
+            # The ring would miss messages sent while unsubscribed
+            self.recent.pop(room_id, None)
+            await self.backplane.unsubscribe(room_id)
+
+    async def _close_socket(self, websocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    async def broadcast_message(self, room_id: str, message_data: dict):
+        """Broadcast message to all users in room, on every node"""
         # Prepare message for broadcasting
         broadcast_message = {
             "type": "message",
@@ -55,10 +143,192 @@ class ChatManager:
             "message": message_data.get("message", ""),
             "timestamp": message_data.get("timestamp", "")
         }
-        
-        # In a real implementation, you would store connections
-        # and broadcast to all users in the room
-        # This is a simplified version
-        
-        # For now, just echo back to sender
-        await sender_websocket.send_json(broadcast_message)
\ No newline at end of file
+
+        # Serialize once; each member's sender task does the actual send
+        self.messages += 1
+        await self.backplane.publish(room_id, json.dumps(broadcast_message))
+
+    def _deliver(self, room_id, payload, sent_at):
+        """Queue a backplane message on this node's connections in the room"""
+        recent = self.recent.get(room_id)
+        if recent is not None:
+            recent.append(payload)
+        for connection in list(self.connections.get(room_id, ())):
+            if not connection.enqueue(payload, sent_at):
+                self.evict(connection, "slow")
+
+    async def history(self, room_id: str, limit: int = 50, before: str = None):
+        """A page of the room's messages, oldest first, sent before the cursor
+
+        The cursor is the ISO timestamp of the oldest message already seen;
+        next_cursor is None once there is nothing older.
+        """
+        limit = max(1, min(limit, self.history_size))
+        messages = []
+        for payload in self.recent.get(room_id, ()):
+            message = json.loads(payload)
+            if before is None or message["timestamp"] < before:
+                messages.append(message)
+        messages = messages[-limit:]
+        if messages:
+            self.history_pages["memory"] += 1
+
+        if len(messages) < limit and self.db is not None:
+            # Continue from the oldest message the ring still holds
+            cursor = messages[0]["timestamp"] if messages else before
+            older = await self.db.get_chat_messages(room_id, limit - len(messages),
+                                                    start_after=datetime.fromisoformat(cursor) if cursor else None)
+            self.history_pages["database"] += 1
+            messages = [self._anonymize(doc) for doc in older] + messages
+
+        next_cursor = messages[0]["timestamp"] if len(messages) == limit else None
+        return {"messages": messages, "next_cursor": next_cursor}
+
+    async def list_rooms(self, limit: int = 50, start_after: str = None):
+        """A page of rooms with stored messages, ordered by room id"""
+        limit = max(1, min(limit, 100))
+        rooms = await self.db.get_chat_rooms(limit, start_after) if self.db is not None else []
+        return {
+            "rooms": [{
+                "room_id": room["id"],
+                "last_message_at": self._isoformat(room.get("last_message_at")),
+                "connections": len(self.connections.get(room["id"], ()))
+            } for room in rooms],
+            "next_cursor": rooms[-1]["id"] if len(rooms) == limit else None
+        }
+
+    def _anonymize(self, doc):
+        # Same shape as a broadcast message
+        return {
+            "type": "message",
+            "user_id": "anonymous",
+            "message": doc.get("message", ""),
+            "timestamp": self._isoformat(doc.get("timestamp"))
+        }
+
+    def _isoformat(self, timestamp):
+        if timestamp is None:
+            return None
+        # Firestore returns UTC-aware datetimes; cursors compare naive ones
+        return timestamp.replace(tzinfo=None).isoformat()
+
+    def record_delivery(self, seconds):
+        self.deliveries += 1
+        self.latency.record("delivery", seconds)
+
+    async def close(self):
+        await self.backplane.close()
+
+    def stats(self):
+        return {
+            "connected_rooms": len(self.connections),
+            "connections": sum(len(members) for members in self.connections.values()),
+            "messages": self.messages,
+            "deliveries": self.deliveries,
+            "evictions": dict(self.evictions),
+            "latency": self.latency.snapshot(),
+            "history": dict(self.history_pages, rooms=len(self.recent)),
+            "backplane": self.backplane.stats()
+        }
+
+if __name__ == "__main__":
+    import random
+
+    from chat_backplane import LocalBackplane
+
+    # Matchmaking: churn (one leave, one join) with 12k nearly full rooms,
+    # against the previous linear scan over all rooms
+    USERS = 60000
+    CHURN = 20000
+
+    def linear_join(rooms, user_rooms, user_id):
+        for rid, users in rooms.items():
+            if len(users) < 5:
+                break
+        else:
+            rid = str(uuid.uuid4())
+            rooms[rid] = []
+        rooms[rid].append(user_id)
+        user_rooms[user_id] = rid
+
+    def linear_leave(rooms, user_rooms, user_id):
+        rid = user_rooms.pop(user_id)
+        rooms[rid].remove(user_id)
+        if not rooms[rid]:
+            del rooms[rid]
+
+    random.seed(0)
+    churn = [(random.randrange(USERS), USERS + i) for i in range(CHURN)]
+
+    async def indexed_churn(backplane):
+        for user in range(USERS):
+            await backplane.join(f"user-{user}", topic=random.choice(("anxiety", "stress", None)))
+        start = time.perf_counter()
+        for leaving, joining in churn:
+            user_id = f"user-{leaving}"
+            if user_id in backplane.user_rooms:
+                await backplane.leave(backplane.user_rooms[user_id], user_id)
+            await backplane.join(f"user-{joining}", topic=random.choice(("anxiety", "stress", None)))
+        return (time.perf_counter() - start) / CHURN * 1e6
+
+    backplane = LocalBackplane()
+    indexed_us = asyncio.run(indexed_churn(backplane))
+
+    rooms, user_rooms = {}, {}
+    for user in range(USERS):
+        linear_join(rooms, user_rooms, f"user-{user}")
+    start = time.perf_counter()
+    for leaving, joining in churn[:2000]:
+        if f"user-{leaving}" in user_rooms:
+            linear_leave(rooms, user_rooms, f"user-{leaving}")
+        linear_join(rooms, user_rooms, f"user-{joining}")
+    linear_us = (time.perf_counter() - start) / 2000 * 1e6
+    print(f"{len(backplane.active_rooms)} rooms: indexed leave+join {indexed_us:.1f} us, "
+          f"linear scan {linear_us:.1f} us")
+
+    # Broadcast load test: thousands of 5-member rooms, with one stalled
+    # client in every tenth room that must not slow the rest down
+    ROOMS = 2000
+    MEMBERS = 5
+    MESSAGES_PER_ROOM = 20
+
+    class FakeWebSocket:
+        def __init__(self, stalled=False):
+            self.stalled = stalled
+            self.received = 0
+
+        async def send_text(self, payload):
+            if self.stalled:
+                await asyncio.sleep(3600)
+            await asyncio.sleep(0)
+            self.received += 1
+
+        async def close(self, code=1000):
+            pass
+
+    async def main():
+        manager = ChatManager(max_queue=10)
+        for room in range(ROOMS):
+            for member in range(MEMBERS):
+                await manager.connect(f"room-{room}", FakeWebSocket(stalled=room % 10 == 0 and member == 0))
+
+        async def room_traffic(room_id):
+            for i in range(MESSAGES_PER_ROOM):
+                await manager.broadcast_message(room_id, {"message": f"hello {i}", "timestamp": ""})
+                await asyncio.sleep(random.uniform(0, 0.01))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(room_traffic(f"room-{room}") for room in range(ROOMS)))
+        expected = ROOMS * MESSAGES_PER_ROOM * MEMBERS - (ROOMS // 10) * MESSAGES_PER_ROOM
+        while manager.deliveries < expected and time.perf_counter() - start < 30:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+
+        stats = manager.stats()
+        delivery = stats["latency"]["delivery"]
+        print(f"{ROOMS} rooms x {MEMBERS} members: {stats['messages'] / elapsed:8.0f} messages/s, "
+              f"{stats['deliveries'] / elapsed:8.0f} deliveries/s")
+        print(f"delivery latency p50 {delivery['p50_ms']} ms, p99 {delivery['p99_ms']} ms, "
+              f"evictions {stats['evictions']}")
+
+    asyncio.run(main())
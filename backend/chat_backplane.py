@@ -0,0 +1,371 @@
+# backend/chat_backplane.py
+import asyncio
+import os
+import time
+import uuid
+
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+
+
+def create_backplane():
+    """Build the chat backplane selected by CHAT_BACKPLANE (local or redis)"""
+    backend = os.getenv("CHAT_BACKPLANE", "local").lower()
+    if backend == "redis":
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+        return RedisBackplane(client)
+    return LocalBackplane()
+
+
+class LocalBackplane:
+    """Room membership and message fan-out within a single process
+
+    Rooms that still have space are indexed per pool (topic and language)
+    in buckets by free-slot count, so joining and leaving are O(1) however
+    many rooms are open. Joins fill the fullest open room first, and a pool
+    is dropped once it has no open rooms left.
+    """
+
+    def __init__(self, room_size=None):
+        self.room_size = room_size or int(os.getenv("CHAT_ROOM_SIZE", "5"))
+        self.active_rooms = {}
+        self.user_rooms = {}
+        self.room_pools = {}
+        # pool -> list indexed by free slots -> insertion-ordered set of room ids
+        self.open_rooms = {}
+        self.handlers = {}
+
+        self.published = 0
+        self.received = 0
+
+    async def join(self, user_id, topic=None, language=None):
+        # Check if user is already in a room
+        if user_id in self.user_rooms:
+            return self.user_rooms[user_id]
+
+        pool = (topic, language)
+        buckets = self._buckets(pool)
+
+        # Find the fullest room with space, or create a new one
+        room_id = None
+        for free in range(1, self.room_size):
+            if buckets[free]:
+                room_id = next(iter(buckets[free]))
+                del buckets[free][room_id]
+                break
+
+        if not room_id:
+            room_id = str(uuid.uuid4())
+            self.active_rooms[room_id] = set()
+            self.room_pools[room_id] = pool
+
+        members = self.active_rooms[room_id]
+        members.add(user_id)
+        self.user_rooms[user_id] = room_id
+        if len(members) < self.room_size:
+            buckets[self.room_size - len(members)][room_id] = None
+        self._drop_if_empty(pool)
+
+        return room_id
+
+    async def leave(self, room_id, user_id):
+        members = self.active_rooms.get(room_id)
+        if self.user_rooms.get(user_id) == room_id:
+            del self.user_rooms[user_id]
+        if members is None or user_id not in members:
+            return
+
+        pool = self.room_pools[room_id]
+        buckets = self._buckets(pool)
+        buckets[self.room_size - len(members)].pop(room_id, None)
+        members.discard(user_id)
+
+        # Clean up empty rooms
+        if not members:
+            del self.active_rooms[room_id]
+            del self.room_pools[room_id]
+        else:
+            buckets[self.room_size - len(members)][room_id] = None
+        self._drop_if_empty(pool)
+
+    def _buckets(self, pool):
+        buckets = self.open_rooms.get(pool)
+        if buckets is None:
+            buckets = self.open_rooms[pool] = [{} for _ in range(self.room_size + 1)]
+        return buckets
+
+    def _drop_if_empty(self, pool):
+        if not any(self.open_rooms[pool]):
+            del self.open_rooms[pool]
+
+    async def subscribe(self, room_id, handler):
+        """Deliver the room's messages to handler(room_id, payload, sent_at)"""
+        self.handlers[room_id] = handler
+
+    async def unsubscribe(self, room_id):
+        self.handlers.pop(room_id, None)
+
+    async def publish(self, room_id, payload):
+        self.published += 1
+        handler = self.handlers.get(room_id)
+        if handler is not None:
+            self.received += 1
+            handler(room_id, payload, time.time())
+
+    async def close(self):
+        pass
+
+    def stats(self):
+        return {
+            "backend": "local",
+            "rooms": len(self.active_rooms),
+            "open_rooms": sum(len(rooms) for buckets in self.open_rooms.values() for rooms in buckets),
+            "pools": len(self.open_rooms),
+            "subscribed_rooms": len(self.handlers),
+            "published": self.published,
+            "received": self.received
+        }
+
+
+class RedisBackplane:
+    """Room membership and message fan-out shared by every node through Redis
+
+    Open rooms live in one sorted set per pool, scored by member count, and
+    joins and leaves are optimistic WATCH/MULTI transactions on that set.
+    Membership keys expire after CHAT_MEMBERSHIP_TTL seconds unless the node
+    that joined the user keeps refreshing them, so a node that dies does not
+    leave its users in rooms forever. Each room is a pub/sub channel; a node
+    only subscribes to the channels of rooms it has local members in.
+    """
+
+    def __init__(self, client, room_size=None, membership_ttl=None):
+        self.client = client
+        self.room_size = room_size or int(os.getenv("CHAT_ROOM_SIZE", "5"))
+        self.membership_ttl = membership_ttl or int(os.getenv("CHAT_MEMBERSHIP_TTL", "120"))
+        self.pubsub = client.pubsub()
+        self.handlers = {}
+        # user_id -> room_id for users this node joined
+        self.members = {}
+        self._reader = None
+        self._refresher = None
+
+        self.published = 0
+        self.received = 0
+        self.retries = 0
+
+    def _pool_key(self, topic, language):
+        return f"chat:open:{topic or ''}:{language or ''}"
+
+    async def join(self, user_id, topic=None, language=None):
+        existing = await self.client.get(f"chat:user:{user_id}")
+        if existing:
+            return existing
+
+        pool_key = self._pool_key(topic, language)
+        async with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(pool_key)
+                    # Fullest room that still has space
+                    rooms = await pipe.zrevrangebyscore(pool_key, self.room_size - 1, 1, start=0, num=1, withscores=True)
+                    room_id, count = (rooms[0][0], int(rooms[0][1])) if rooms else (str(uuid.uuid4()), 0)
+                    members_key = f"chat:room:{room_id}:members"
+                    await pipe.watch(members_key)
+                    if rooms and not await pipe.exists(members_key):
+                        # Its members' keys expired with their node; drop it and look again
+                        pipe.multi()
+                        pipe.zrem(pool_key, room_id)
+                        await pipe.execute()
+                        continue
+
+                    pipe.multi()
+                    pipe.sadd(members_key, user_id)
+                    pipe.expire(members_key, self.membership_ttl)
+                    pipe.set(f"chat:user:{user_id}", room_id, ex=self.membership_ttl)
+                    pipe.set(f"chat:room:{room_id}:pool", pool_key, ex=self.membership_ttl)
+                    if count + 1 < self.room_size:
+                        pipe.zadd(pool_key, {room_id: count + 1})
+                    else:
+                        pipe.zrem(pool_key, room_id)
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    self.retries += 1
+
+        self.members[user_id] = room_id
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh())
+        return room_id
+
+    async def leave(self, room_id, user_id):
+        if self.members.get(user_id) == room_id:
+            del self.members[user_id]
+
+        user_key = f"chat:user:{user_id}"
+        members_key = f"chat:room:{room_id}:members"
+        room_pool_key = f"chat:room:{room_id}:pool"
+        async with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(user_key, members_key, room_pool_key)
+                    pool_key = await pipe.get(room_pool_key)
+                    if pool_key is not None:
+                        await pipe.watch(pool_key)
+                    # The user may already have left and joined another room
+                    in_room = await pipe.get(user_key) == room_id
+                    member = await pipe.sismember(members_key, user_id)
+                    if not in_room and not member:
+                        return
+                    remaining = await pipe.scard(members_key) - 1
+
+                    pipe.multi()
+                    if in_room:
+                        pipe.delete(user_key)
+                    if member:
+                        pipe.srem(members_key, user_id)
+                        if remaining and pool_key is not None:
+                            pipe.zadd(pool_key, {room_id: remaining})
+                        elif not remaining:
+                            # Clean up empty rooms
+                            if pool_key is not None:
+                                pipe.zrem(pool_key, room_id)
+                            pipe.delete(room_pool_key)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    self.retries += 1
+
+    async def _refresh(self):
+        # Keep this node's memberships alive; they expire if the node dies
+        while True:
+            await asyncio.sleep(self.membership_ttl / 3)
+            try:
+                async with self.client.pipeline(transaction=False) as pipe:
+                    for user_id, room_id in list(self.members.items()):
+                        pipe.expire(f"chat:user:{user_id}", self.membership_ttl)
+                        pipe.expire(f"chat:room:{room_id}:members", self.membership_ttl)
+                        pipe.expire(f"chat:room:{room_id}:pool", self.membership_ttl)
+                    await pipe.execute()
+            except Exception as e:
+                print(f"Error refreshing chat memberships: {e}")
+
+    async def subscribe(self, room_id, handler):
+        """Deliver the room's messages to handler(room_id, payload, sent_at)"""
+        self.handlers[room_id] = handler
+        await self.pubsub.subscribe(f"chat:room:{room_id}")
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read())
+
+    async def unsubscribe(self, room_id):
+        self.handlers.pop(room_id, None)
+        await self.pubsub.unsubscribe(f"chat:room:{room_id}")
+
+    async def publish(self, room_id, payload):
+        # Prefix the send time so receiving nodes can measure delivery latency
+        await self.client.publish(f"chat:room:{room_id}", f"{time.time():.6f}\n{payload}")
+        self.published += 1
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error reading chat backplane: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is None:
+                continue
+
+            room_id = message["channel"][len("chat:room:"):]
+            handler = self.handlers.get(room_id)
+            if handler is not None:
+                sent_at, payload = message["data"].split("\n", 1)
+                self.received += 1
+                handler(room_id, payload, float(sent_at))
+
+    async def close(self):
+        for task in (self._reader, self._refresher):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+    def stats(self):
+        return {
+            "backend": "redis",
+            "subscribed_rooms": len(self.handlers),
+            "local_members": len(self.members),
+            "published": self.published,
+            "received": self.received,
+            "transaction_retries": self.retries
+        }
+
+
+if __name__ == "__main__":
+    # Cross-node delivery latency: two nodes share one Redis (REDIS_URL, or
+    # an in-process fakeredis server if installed), with members of each room split
+    # across both nodes
+    import random
+
+    ROOMS = 200
+    MESSAGES = 2000
+
+    def make_clients():
+        if os.getenv("REDIS_URL"):
+            return [redis.from_url(os.environ["REDIS_URL"], decode_responses=True) for _ in range(2)]
+        try:
+            import fakeredis
+        except ImportError:
+            # fakeredis is only needed here, so it is not in requirements.txt
+            raise SystemExit("Set REDIS_URL or pip install fakeredis to run this benchmark")
+        server = fakeredis.FakeServer()
+        return [fakeredis.FakeAsyncRedis(server=server, decode_responses=True) for _ in range(2)]
+
+    async def main():
+        node_a, node_b = (RedisBackplane(client) for client in make_clients())
+        latencies = []
+        expected = 0
+        received = asyncio.Event()
+
+        def on_message(room_id, payload, sent_at):
+            latencies.append(time.time() - sent_at)
+            if len(latencies) == expected:
+                received.set()
+
+        # Members of the first half of the rooms connect to node b, the
+        # rest to node a; each node subscribes to its own rooms only
+        local_rooms = {node_a: set(), node_b: set()}
+        for i in range(ROOMS * 5):
+            node = node_b if i < ROOMS * 5 // 2 else node_a
+            local_rooms[node].add(await node.join(f"user-{i}"))
+        for node, rooms in local_rooms.items():
+            handler = on_message if node is node_b else (lambda *args: None)
+            for room_id in rooms:
+                await node.subscribe(room_id, handler)
+
+        rooms = sorted(local_rooms[node_a] | local_rooms[node_b])
+        targets = [random.choice(rooms) for _ in range(MESSAGES)]
+        expected = sum(1 for room_id in targets if room_id in local_rooms[node_b])
+
+        start = time.perf_counter()
+        for room_id in targets:
+            await node_a.publish(room_id, '{"type": "message"}')
+        await asyncio.wait_for(received.wait(), 30)
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        print(f"{MESSAGES} messages over {len(rooms)} rooms: {MESSAGES / elapsed:7.0f} messages/s, "
+              f"cross-node p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+        print(f"node b subscribed to {len(local_rooms[node_b])} rooms and received {node_b.received} "
+              f"of {MESSAGES} messages ({expected} expected)")
+        await node_a.close()
+        await node_b.close()
+
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+# backend/chat_sessions.py
+import os
+import sys
+from collections import OrderedDict, deque
+
+# user_id the endpoints fall back to when the caller is not signed in
+ANONYMOUS_USER = "anonymous"
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1
+
+
+class ChatSession:
+    """One user's recent conversation turns, trimmed to a token budget"""
+
+    def __init__(self, token_budget):
+        self.token_budget = token_budget
+        self.turns = deque()
+        self.tokens = 0
+
+    def add_turn(self, user_message, reply):
+        self.turns.append((user_message, reply))
+        self.tokens += estimate_tokens(user_message) + estimate_tokens(reply)
+        # Drop the oldest turns once over budget, always keeping the newest
+        while self.tokens > self.token_budget and len(self.turns) > 1:
+            old_message, old_reply = self.turns.popleft()
+            self.tokens -= estimate_tokens(old_message) + estimate_tokens(old_reply)
+
+    def transcript(self):
+        return "\n".join(f"User: {message}\nMannMitra: {reply}" for message, reply in self.turns)
+
+    def memory_bytes(self):
+        return sys.getsizeof(self.turns) + sum(
+            sys.getsizeof(message) + sys.getsizeof(reply) for message, reply in self.turns
+        )
+
+
+class ChatSessionPool:
+    """Bounded LRU pool of per-user chat sessions
+
+    Evicted or never-seen sessions are rebuilt lazily from the user's
+    stored conversations the next time they send a message. Anonymous
+    callers all share one user_id, so they are never pooled: each of their
+    requests gets a fresh session with no history.
+    """
+
+    def __init__(self, db, max_sessions=None, token_budget=None, history_limit=20):
+        self.db = db
+        self.max_sessions = max_sessions or int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+        self.token_budget = token_budget or int(os.getenv("CHAT_SESSION_TOKEN_BUDGET", "2000"))
+        self.history_limit = history_limit
+        self.sessions = OrderedDict()
+
+        self.hits = 0
+        self.rebuilds = 0
+        self.evictions = 0
+        self.anonymous = 0
+
+    async def get(self, user_id):
+        """Return the user's session, rebuilding it from Firestore if needed"""
+        if not user_id or user_id == ANONYMOUS_USER:
+            self.anonymous += 1
+            return ChatSession(self.token_budget)
+
+        session = self.sessions.get(user_id)
+        if session is not None:
+            self.sessions.move_to_end(user_id)
+            self.hits += 1
+            return session
+
+        session = ChatSession(self.token_budget)
+        if self.db is not None:
+            for conversation in await self.db.get_recent_conversations(user_id, self.history_limit):
+                session.add_turn(conversation.get('user_message') or "", conversation.get('ai_response') or "")
+        self.rebuilds += 1
+
+        # Another request for the same user may have rebuilt it meanwhile
+        if user_id in self.sessions:
+            return self.sessions[user_id]
+
+        self.sessions[user_id] = session
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.evictions += 1
+        return session
+
+    def stats(self):
+        sessions = list(self.sessions.values())
+        memory = sum(session.memory_bytes() for session in sessions)
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "rebuilds": self.rebuilds,
+            "evictions": self.evictions,
+            "anonymous": self.anonymous,
+            "avg_tokens": round(sum(s.tokens for s in sessions) / len(sessions), 1) if sessions else 0,
+            "memory_bytes": memory,
+            "avg_memory_bytes": memory // len(sessions) if sessions else 0
+        }
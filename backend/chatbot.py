@@ -2,17 +2,43 @@
 import google.generativeai as genai
 from google.cloud import aiplatform
 import vertexai
-from vertexai.preview.language_models import ChatModel, InputOutputTextPair
+from vertexai.preview.language_models import ChatMessage, ChatModel, InputOutputTextPair
+import asyncio
+import json
 import os
+import time
 from dotenv import load_dotenv
 
+from chat_sessions import ChatSessionPool
+from crisis_screen import CrisisScreen
+from llm_backends import RecordedModel, use_recorded_backend
+from metrics import LatencyTracker
+from mood_analysis import MoodAnalyzer
+
 load_dotenv()
 
 class ChatAssistant:
-    def __init__(self):
+    def __init__(self, db=None, crisis_screen=None):
+        self.latency = LatencyTracker()
+        # Each user gets their own conversation history
+        self.sessions = ChatSessionPool(db)
+        # Local pre-screen that escalates known crisis phrases early and lets
+        # small talk skip the LLM crisis check
+        self.crisis_screen = crisis_screen or CrisisScreen()
+        
+        if use_recorded_backend():
+            # Replay recorded responses instead of calling the hosted models
+            self.gemini_model = RecordedModel()
+            self.use_vertex = False
+        else:
+            self._init_models()
+        
+        self._init_context()
+    
+    def _init_models(self):
         # Configure Gemini API
         genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        self.gemini_model = genai.GenerativeModel('gemini-pro')
+        self.gemini_model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-pro"))
         
         # Initialize Vertex AI
         try:
@@ -22,7 +48,8 @@ class ChatAssistant:
         except Exception as e:
             print(f"Vertex AI initialization failed: {e}. Using Gemini only.")
             self.use_vertex = False
-        
+    
+    def _init_context(self):
         # Define mental health context
         self.context = """
         You are MannMitra, a mental health assistant. Your role is to:
@@ -36,51 +63,252 @@ class ChatAssistant:
         Keep responses concise but compassionate.
         """
         
-        # Start chat session if using Vertex AI
+        # Examples for Vertex AI chat sessions
         if self.use_vertex:
-            self.chat = self.vertex_chat_model.start_chat(
-                context=self.context,
-                examples=[
-                    InputOutputTextPair(
-                        input_text="I'm feeling really sad today",
-                        output_text="I'm sorry you're feeling this way. It's okay to feel sad sometimes. Would you like to talk about what's bothering you?"
-                    ),
-                    InputOutputTextPair(
-                        input_text="I'm so stressed with work",
-                        output_text="Work stress can be overwhelming. Have you tried any relaxation techniques like deep breathing or taking short breaks?"
-                    ),
-                    InputOutputTextPair(
-                        input_text="I don't think anyone cares about me",
-                        output_text="Your feelings are valid, and I want you to know that I care. Would you like to explore these feelings more? If you're in crisis, we can connect you with someone to talk to immediately."
-                    )
-                ]
-            )
+            self.examples = [
+                InputOutputTextPair(
+                    input_text="I'm feeling really sad today",
+                    output_text="I'm sorry you're feeling this way. It's okay to feel sad sometimes. Would you like to talk about what's bothering you?"
+                ),
+                InputOutputTextPair(
+                    input_text="I'm so stressed with work",
+                    output_text="Work stress can be overwhelming. Have you tried any relaxation techniques like deep breathing or taking short breaks?"
+                ),
+                InputOutputTextPair(
+                    input_text="I don't think anyone cares about me",
+                    output_text="Your feelings are valid, and I want you to know that I care. Would you like to explore these feelings more? If you're in crisis, we can connect you with someone to talk to immediately."
+                )
+            ]
+    
+    def start_vertex_chat(self, session=None):
+        """Start a Vertex AI chat seeded with the user's recent turns"""
+        history = []
+        for message, reply in (session.turns if session is not None else ()):
+            history.append(ChatMessage(content=message, author="user"))
+            history.append(ChatMessage(content=reply, author="bot"))
+        return self.vertex_chat_model.start_chat(
+            context=self.context,
+            examples=self.examples,
+            message_history=history
+        )
+    
+    def reply_prompt(self, message, session=None):
+        transcript = session.transcript() if session is not None else ""
+        if transcript:
+            return f"{self.context}\n\n{transcript}\nUser: {message}\nMannMitra:"
+        return f"{self.context}\n\nUser: {message}\nMannMitra:"
+    
+    async def respond(self, message, user_id, mood_analyzer):
+        """Reply, crisis flag and mood for one message
+
+        With Gemini this is a single structured-output request. The Vertex
+        chat session cannot return structured output, so there the reply,
+        crisis check and mood analysis run concurrently instead.
+        """
+        start = time.perf_counter()
+        session = await self.sessions.get(user_id)
+        verdict = self.crisis_screen.screen(message)
+        result = None
+        if not self.use_vertex:
+            result = await self._respond_structured(message, session, verdict)
+        if result is None:
+            result = await self._respond_concurrent(message, session, mood_analyzer, verdict)
+        session.add_turn(message, result["response"])
+        self.latency.record("respond", time.perf_counter() - start)
+        return result
     
-    def get_response(self, message, user_id):
+    async def _respond_structured(self, message, session, verdict):
+        prompt = f"""
+        {self.context}
+        
+        Conversation so far:
+        {session.transcript() or "(none)"}
+        
+        Read the user's message and answer with a JSON object with exactly these keys:
+        "reply": your response to the user,
+        "crisis": true if the message indicates immediate self-harm or severe crisis, otherwise false,
+        "mood": the user's primary mood, one of: {", ".join(MoodAnalyzer.valid_moods)}
+        
+        If "crisis" is true, the reply must validate their feelings and offer immediate support options.
+        
+        User message: "{message}"
+        """
+        
         try:
-            # Try Vertex AI first if available
-            if self.use_vertex:
-                response = self.chat.send_message(message, temperature=0.8)
-                response_text = response.text
-            else:
-                # Fallback to Gemini
-                prompt = f"{self.context}\n\nUser: {message}\nMannMitra:"
-                response = self.gemini_model.generate_content(prompt)
-                response_text = response.text
+            response = await self.gemini_model.generate_content_async(prompt)
+            text = response.text.strip()
+            # Strip a markdown code fence if the model added one
+            if text.startswith("```"):
+                text = text.strip("`")
+                text = text[text.index("{"):]
+            data = json.loads(text)
             
-            # For crisis detection
-            if self.detect_crisis(message):
-                crisis_response = self.gemini_model.generate_content(
+            mood = str(data.get("mood", "neutral")).strip().lower()
+            if mood not in MoodAnalyzer.valid_moods:
+                mood = "neutral"
+            flagged = data.get("crisis") is True or mood == "crisis"
+            reply = data["reply"]
+            # Known crisis phrases always get the crisis reply, and a missing or
+            # malformed crisis flag is uncertain, so only small talk is cleared
+            uncertain = not isinstance(data.get("crisis"), bool) and verdict != "safe"
+            crisis = flagged or verdict == "crisis" or uncertain
+            if crisis and not flagged:
+                reply = await asyncio.to_thread(self.generate_crisis_reply, message)
+            return {"response": reply, "crisis": crisis, "mood": mood}
+        except Exception as e:
+            print(f"Structured chat error: {e}")
+            return None
+    
+    async def _respond_concurrent(self, message, session, mood_analyzer, verdict):
+        reply, crisis, mood = await asyncio.gather(
+            asyncio.to_thread(self.generate_reply, message, session),
+            asyncio.to_thread(self.detect_crisis, message, verdict),
+            asyncio.to_thread(mood_analyzer.analyze_text, message, verdict)
+        )
+        if crisis:
+            reply = await asyncio.to_thread(self.generate_crisis_reply, message)
+        return {"response": reply, "crisis": crisis, "mood": mood}
+    
+    async def stream_response(self, message, user_id, mood_analyzer):
+        """Stream reply tokens as they are generated
+
+        Yields ("token", text) events and finally ("done", {"response",
+        "crisis", "mood"}). A known crisis phrase goes straight to the crisis
+        reply, and a risky message waits for the crisis check before its
+        first token. Otherwise the check runs alongside the reply and is
+        polled between chunks; once it fires, ("crisis", None) is yielded and
+        the crisis reply tokens replace what was streamed so far.
+        """
+        start = time.perf_counter()
+        session = await self.sessions.get(user_id)
+        verdict = self.crisis_screen.screen(message)
+        crisis_task = None
+        if verdict in ("risk", "unclear"):
+            crisis_task = asyncio.create_task(asyncio.to_thread(self.classify_crisis, message))
+        mood_task = asyncio.create_task(asyncio.to_thread(mood_analyzer.analyze_text, message, verdict))
+        
+        crisis = verdict == "crisis"
+        if verdict == "risk":
+            crisis = await crisis_task
+        
+        reply = []
+        first_token = True
+        if not crisis:
+            tokens = self._stream_reply(message, session)
+            try:
+                async for token in tokens:
+                    if first_token:
+                        self.latency.record("first_token", time.perf_counter() - start)
+                        first_token = False
+                    reply.append(token)
+                    yield "token", token
+                    if crisis_task is not None and crisis_task.done() and crisis_task.result():
+                        crisis = True
+                        break
+            except Exception as e:
+                print(f"Chat stream error: {e}")
+                if not reply:
+                    reply.append("I'm here to listen. How are you feeling today?")
+                    yield "token", reply[0]
+            finally:
+                await tokens.aclose()
+            if not crisis and crisis_task is not None:
+                crisis = await crisis_task
+        
+        if crisis:
+            yield "crisis", None
+            reply = []
+            try:
+                async for token in self._stream_gemini(
                     f"User message: {message}. This seems like a potential crisis. Generate a compassionate response that validates their feelings and offers immediate support options."
-                )
-                return crisis_response.text
+                ):
+                    if first_token:
+                        self.latency.record("first_token", time.perf_counter() - start)
+                        first_token = False
+                    reply.append(token)
+                    yield "token", token
+            except Exception as e:
+                print(f"Chat stream error: {e}")
+                reply = ["I'm here to listen. How are you feeling today?"]
+                yield "token", reply[0]
+        
+        mood = await mood_task
+        session.add_turn(message, "".join(reply))
+        self.latency.record("stream", time.perf_counter() - start)
+        yield "done", {"response": "".join(reply), "crisis": crisis, "mood": mood}
+    
+    async def _stream_reply(self, message, session):
+        if not self.use_vertex:
+            async for token in self._stream_gemini(self.reply_prompt(message, session)):
+                yield token
+            return
+        
+        # The Vertex SDK only offers a blocking stream; drain it on a thread
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        
+        def produce():
+            try:
+                chat = self.start_vertex_chat(session)
+                for response in chat.send_message_streaming(message, temperature=0.8):
+                    loop.call_soon_threadsafe(queue.put_nowait, ("token", response.text))
+                loop.call_soon_threadsafe(queue.put_nowait, ("end", None))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+        
+        producer = asyncio.create_task(asyncio.to_thread(produce))
+        while True:
+            kind, value = await queue.get()
+            if kind == "end":
+                break
+            if kind == "error":
+                raise value
+            yield value
+        await producer
+    
+    async def _stream_gemini(self, prompt):
+        response = await self.gemini_model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    
+    def generate_reply(self, message, session=None):
+        try:
+            # Try Vertex AI first if available
+            if self.use_vertex:
+                response = self.start_vertex_chat(session).send_message(message, temperature=0.8)
+                return response.text
             
-            return response_text
+            # Fallback to Gemini
+            prompt = self.reply_prompt(message, session)
+            response = self.gemini_model.generate_content(prompt)
+            return response.text
+        except Exception as e:
+            print(f"Chat error: {e}")
+            return "I'm here to listen. How are you feeling today?"
+    
+    def generate_crisis_reply(self, message):
+        try:
+            crisis_response = self.gemini_model.generate_content(
+                f"User message: {message}. This seems like a potential crisis. Generate a compassionate response that validates their feelings and offers immediate support options."
+            )
+            return crisis_response.text
         except Exception as e:
             print(f"Chat error: {e}")
             return "I'm here to listen. How are you feeling today?"
     
-    def detect_crisis(self, message):
+    def detect_crisis(self, message, verdict=None):
+        # The screen only escalates early or skips small talk; every other
+        # message gets the LLM check
+        if verdict is None:
+            verdict = self.crisis_screen.screen(message)
+        if verdict == "crisis":
+            return True
+        if verdict == "safe":
+            return False
+        return self.classify_crisis(message)
+    
+    def classify_crisis(self, message):
         # Use Gemini to detect crisis language
         prompt = f"""
         Analyze this message for signs of mental health crisis: "{message}"
@@ -95,6 +323,14 @@ class ChatAssistant:
         
         try:
             response = self.gemini_model.generate_content(prompt)
-            return "CRISIS" in response.text
-        except:
-            return False
\ No newline at end of file
+            answer = response.text.upper()
+        except Exception as e:
+            # An unanswered check is treated as a crisis rather than cleared
+            print(f"Error in crisis detection: {e}")
+            return True
+        if "CRISIS" in answer:
+            return True
+        if "CONCERN" in answer or "OK" in answer:
+            return False
+        # Neither label in the answer: uncertain, so err towards crisis
+        return True
\ No newline at end of file
@@ -0,0 +1,139 @@
+# backend/components.py
+import asyncio
+import importlib
+import os
+import threading
+import time
+
+
+class StartupProfiler:
+    """Import time per module and init time per component since process start"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports = {}
+        self.inits = {}
+        self.ready_ms = None
+        self._lock = threading.Lock()
+
+    def record_import(self, module, seconds):
+        with self._lock:
+            self.imports[module] = round(seconds * 1000, 1)
+
+    def record_init(self, name, seconds):
+        with self._lock:
+            self.inits[name] = round(seconds * 1000, 1)
+
+    def mark_ready(self):
+        self.ready_ms = round((time.perf_counter() - self.started) * 1000, 1)
+
+    def report(self):
+        with self._lock:
+            return {
+                "ready_ms": self.ready_ms,
+                "uptime_ms": round((time.perf_counter() - self.started) * 1000, 1),
+                "import_ms": dict(self.imports),
+                "init_ms": dict(self.inits)
+            }
+
+
+profiler = StartupProfiler()
+
+
+def timed_import(module):
+    """Import a module, recording how long the first import took"""
+    start = time.perf_counter()
+    imported = importlib.import_module(module)
+    if module not in profiler.imports:
+        profiler.record_import(module, time.perf_counter() - start)
+    return imported
+
+
+class LazyComponent:
+    """Stand-in for a subsystem that imports and builds it on first use
+
+    Attribute access is forwarded to the real object, which is created by
+    build(module) the first time any attribute is needed. Import and
+    construction times are recorded in the startup profiler.
+
+    Building takes a blocking lock, so on the event loop a component must be
+    awaited with ready() (or load()) before its attributes are used; forwarding
+    to a component that is not built yet raises there instead of blocking.
+    """
+
+    def __init__(self, name, module, build):
+        self._name = name
+        self._module = module
+        self._build = build
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        """The built instance, building it on the calling thread if needed"""
+        if self._instance is None:
+            if _on_event_loop():
+                raise RuntimeError(f"{self._name} is not built yet; await its ready() on the event loop")
+            with self._lock:
+                if self._instance is None:
+                    module = timed_import(self._module)
+                    start = time.perf_counter()
+                    instance = self._build(module)
+                    profiler.record_init(self._name, time.perf_counter() - start)
+                    self._instance = instance
+        return self._instance
+
+    async def ready(self):
+        """The built instance, waiting for an in-progress warm-up or building
+        it on a worker thread so the event loop never blocks"""
+        if self._instance is None:
+            await asyncio.to_thread(self.resolve)
+        return self._instance
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._instance is not None else "not loaded"
+        return f"<LazyComponent {self._name} ({state})>"
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+async def load(*components):
+    """Await the given components' builds, for use at the top of a handler"""
+    for component in components:
+        if isinstance(component, LazyComponent):
+            await component.ready()
+
+
+def is_loaded(component):
+    return not isinstance(component, LazyComponent) or component._instance is not None
+
+
+def warm_up(components, on_done=None):
+    """Build components one by one on a background thread
+
+    Disabled with COMPONENT_WARMUP=0, in which case every component is
+    built by the first request that needs it.
+    """
+    if os.getenv("COMPONENT_WARMUP", "1") == "0":
+        return None
+
+    def run():
+        for component in components:
+            try:
+                component.resolve()
+            except Exception as e:
+                print(f"Error warming up {component._name}: {e}")
+        if on_done is not None:
+            on_done()
+
+    thread = threading.Thread(target=run, name="component-warmup", daemon=True)
+    thread.start()
+    return thread
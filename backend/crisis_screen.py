@@ -0,0 +1,345 @@
+# backend/crisis_screen.py
+import os
+import re
+
+import numpy as np
+
+# Phrases that always mark a message as a crisis, whatever the model says.
+# Text is lowercased and apostrophes removed before matching.
+CRISIS_PHRASES = [
+    "kill myself", "killing myself", "end my life", "ending my life", "end it all",
+    "take my own life", "want to die", "wanna die", "going to die tonight",
+    "suicide", "suicidal", "hurt myself", "harm myself", "self harm", "selfharm",
+    "cut myself", "cutting myself", "overdose", "hang myself", "better off dead",
+    "better off without me", "no reason to live", "dont want to live",
+    "dont want to be alive", "not want to be alive", "never wake up",
+    "no way out", "say goodbye to everyone", "jump off a"
+]
+
+# Phrases that are not a crisis on their own but need the full LLM check
+RISK_PHRASES = [
+    "hopeless", "worthless", "cant go on", "give up on everything", "no point",
+    "nobody cares", "no one cares", "empty inside", "a burden", "trapped",
+    "cant take it", "cant cope", "numb", "dont care anymore", "disappear",
+    "falling apart", "hate myself", "pills", "alone in this", "no future"
+]
+
+# Word weights for the linear pre-screen model; the bias keeps ordinary
+# messages well below the escalation threshold
+MODEL_WEIGHTS = {
+    "die": 2.5, "dead": 1.8, "death": 1.5, "kill": 2.0, "knife": 1.5, "blade": 1.5,
+    "gun": 1.5, "bridge": 0.8, "goodbye": 1.0, "alive": 1.2, "live": 0.8, "life": 0.5,
+    "depressed": 1.2, "depression": 1.2, "lonely": 0.9, "crying": 0.8, "cry": 0.6,
+    "pain": 0.8, "hurt": 0.8, "hurting": 0.8, "scared": 0.6, "panic": 0.8,
+    "miserable": 1.0, "sad": 0.6, "tired": 0.4, "exhausted": 0.5, "anymore": 0.7,
+    "never": 0.4, "nothing": 0.5, "nobody": 0.7, "cant": 0.4, "hate": 0.7,
+    "myself": 0.5, "end": 0.5, "over": 0.3, "sleep": 0.2, "alone": 0.7,
+    "happy": -1.0, "great": -0.8, "good": -0.6, "thanks": -0.8, "thank": -0.8,
+    "excited": -1.0, "better": -0.4, "fun": -0.8, "glad": -0.8, "proud": -0.8,
+    "calm": -0.6, "relaxed": -0.8, "enjoyed": -0.8,
+    # Everyday topics people bring to the chat
+    "work": -0.4, "job": -0.4, "exam": -0.4, "exams": -0.4, "school": -0.4, "class": -0.4,
+    "assignments": -0.4, "project": -0.4, "presentation": -0.4, "presentations": -0.4,
+    "meeting": -0.4, "music": -0.4, "movie": -0.4, "dinner": -0.4, "cooked": -0.4,
+    "cat": -0.4, "dog": -0.4, "friend": -0.4, "friends": -0.4, "weekend": -0.4,
+    "holidays": -0.4, "techniques": -0.4, "focus": -0.4, "laugh": -0.6, "managing": -0.4
+}
+MODEL_BIAS = -2.5
+
+# Words that keep a message off the safe tier however low its model score:
+# death and finality, means of self-harm, harm and pain, hopelessness and
+# leaving. Slang and indirect phrasing land here rather than in the phrase
+# lists, so a message using them always gets the LLM check.
+RISK_TOKENS = {
+    # death and finality
+    "die", "dies", "dying", "died", "dead", "death", "suicide", "suicidal", "kill", "killing", "killed",
+    "unalive", "kms", "kys", "end", "ending", "ended", "over", "gone", "forever", "last", "final",
+    "goodbye", "goodbyes", "farewell", "born", "alive", "live", "living", "life", "exist", "existing",
+    "anymore", "done", "leave", "leaving", "tonight", "ready",
+    # means
+    "pill", "pills", "tablets", "medication", "meds", "overdose", "od", "rope", "noose", "hang",
+    "hanging", "knife", "blade", "razor", "gun", "guns", "shoot", "bridge", "roof", "jump", "jumping",
+    "drown", "drowning", "poison", "bleach", "cut", "cutting", "bleed", "bleeding", "wrist", "wrists",
+    "train", "traffic", "stockpiled", "stockpile",
+    # harm and pain
+    "hurt", "hurting", "harm", "pain", "suffer", "suffering", "weapon",
+    # hopelessness and leaving
+    "hopeless", "pointless", "point", "worthless", "useless", "burden", "trapped", "nobody", "noone",
+    "nothing", "never", "miss", "sorry", "escape", "disappear", "vanish", "give", "giving", "given",
+    "fight", "fighting", "stop", "sleep", "wake", "rest", "note", "letter", "letters", "plan", "planning"
+}
+
+
+def normalize(text):
+    """Lowercase, drop apostrophes and collapse everything else to single spaces"""
+    text = text.lower().replace("'", "").replace("’", "")
+    return " " + " ".join(re.findall(r"[a-z0-9]+", text)) + " "
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over a fixed phrase list
+
+    Finds every phrase in a single pass over the text, however many phrases
+    there are. Phrases are matched on whole words only.
+    """
+
+    def __init__(self, phrases):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for phrase in phrases:
+            state = 0
+            for char in normalize(phrase):
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(phrase)
+
+        # Breadth-first pass to fill in the failure links
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        """Phrases found in text, which must already be normalized"""
+        matches = []
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                matches.extend(self.output[state])
+        return matches
+
+
+class CrisisScreen:
+    """Local first tier of crisis detection
+
+    screen() returns:
+
+    - "crisis" when a known crisis phrase is present; the caller replies
+      with crisis support without waiting for the LLM
+    - "risk" when a risk phrase matches or the model score reaches the
+      threshold; the LLM check runs before any reply is shown
+    - "safe" when the model score is below safe_threshold and no word is in
+      RISK_TOKENS; only these messages skip the LLM check
+    - "unclear" for everything else, which still gets the LLM check
+
+    screen() counts each verdict for stats(); classify() returns the same
+    verdict without counting, for callers that only need it as a hint.
+
+    The default safe_threshold is the one checked in __main__. It sits just
+    below the model's score for a message with no known words, so only
+    messages with clearly positive words are skipped; at higher thresholds
+    unseen crisis phrasing without risk tokens starts to be cleared.
+    """
+
+    def __init__(self, threshold=None, safe_threshold=None):
+        self.threshold = threshold or float(os.getenv("CRISIS_SCREEN_THRESHOLD", "0.3"))
+        self.safe_threshold = safe_threshold or float(os.getenv("CRISIS_SCREEN_SAFE_THRESHOLD", "0.05"))
+        self.crisis_matcher = PhraseMatcher(CRISIS_PHRASES)
+        self.risk_matcher = PhraseMatcher(RISK_PHRASES)
+        self.vocabulary = {word: i for i, word in enumerate(MODEL_WEIGHTS)}
+        self.weights = np.array(list(MODEL_WEIGHTS.values()))
+
+        self.counts = {"crisis": 0, "risk": 0, "unclear": 0, "safe": 0}
+
+    def score_batch(self, texts):
+        """Model probability of risk for each normalized text"""
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            for word in text.split():
+                col = self.vocabulary.get(word)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        features = np.zeros((len(texts), len(self.weights)))
+        np.add.at(features, (rows, cols), 1.0)
+        return 1 / (1 + np.exp(-(features @ self.weights + MODEL_BIAS)))
+
+    def screen(self, message):
+        verdict = self.classify(message)
+        self.counts[verdict] += 1
+        return verdict
+
+    def classify(self, message):
+        text = normalize(message)
+        if self.crisis_matcher.find(text):
+            verdict = "crisis"
+        else:
+            score = self.score_batch([text])[0]
+            if self.risk_matcher.find(text) or score >= self.threshold:
+                verdict = "risk"
+            elif score < self.safe_threshold and RISK_TOKENS.isdisjoint(text.split()):
+                verdict = "safe"
+            else:
+                verdict = "unclear"
+        return verdict
+
+    def stats(self):
+        screened = sum(self.counts.values())
+        return {
+            "screened": screened,
+            "crisis": self.counts["crisis"],
+            "escalated": self.counts["risk"],
+            "unclear": self.counts["unclear"],
+            "skipped": self.counts["safe"],
+            "skip_rate": round(self.counts["safe"] / screened, 3) if screened else 0
+        }
+
+
+# Labelled messages for the benchmark: crisis, concern or ok
+FIXTURES = [
+    ("I want to kill myself", "crisis"),
+    ("I've been thinking about ending my life", "crisis"),
+    ("I don't want to be alive anymore", "crisis"),
+    ("Everyone would be better off without me", "crisis"),
+    ("I cut myself again last night", "crisis"),
+    ("I have the pills ready, I'm going to overdose", "crisis"),
+    ("I just want to die", "crisis"),
+    ("There is no reason to live", "crisis"),
+    ("I keep having suicidal thoughts", "crisis"),
+    ("I'm going to end it all tonight", "crisis"),
+    ("I feel so hopeless about everything", "concern"),
+    ("I'm worthless and nobody cares", "concern"),
+    ("I can't take it anymore", "concern"),
+    ("I feel empty inside and numb", "concern"),
+    ("I'm so depressed and lonely, I cry every night", "concern"),
+    ("I'm just a burden to my family", "concern"),
+    ("Sometimes I wish I could disappear", "concern"),
+    ("I hate myself so much", "concern"),
+    ("Nothing matters, I never feel anything but pain", "concern"),
+    ("I feel so sad and alone, nobody ever calls", "concern"),
+    ("I'm so stressed with work", "ok"),
+    ("I had a great day today, thanks!", "ok"),
+    ("Can you suggest some relaxation techniques?", "ok"),
+    ("I'm a bit nervous about my exam tomorrow", "ok"),
+    ("My friend and I went hiking and it was fun", "ok"),
+    ("I feel tired after a long week", "ok"),
+    ("How do I sleep better?", "ok"),
+    ("I'm excited about my new job", "ok"),
+    ("I argued with my brother and I'm annoyed", "ok"),
+    ("I feel calm after meditating", "ok"),
+    ("What music helps with focus?", "ok"),
+    ("I'm a little sad that the holidays are over", "ok"),
+    ("Work is busy but I'm managing", "ok"),
+    ("I'm proud that I finished my project", "ok"),
+    ("I feel anxious before presentations", "ok"),
+    ("Thank you for listening", "ok"),
+    ("I miss my family who live far away", "ok"),
+    ("I cooked dinner and watched a movie", "ok"),
+    ("My cat made me laugh today", "ok"),
+    ("I'm overwhelmed with assignments this week", "ok")
+]
+
+# Crisis messages written separately from the phrase lists and weights
+# above, to check that the screen never clears phrasing it was not built
+# from. These must reach the LLM or be escalated; none may be "safe".
+HELDOUT_CRISIS = [
+    "I want to end things tonight",
+    "I am going to jump from the roof",
+    "I took all my medication at once",
+    "I wrote my goodbye letters",
+    "I dont see the point in living",
+    "I want to unalive myself",
+    "I am planning to kms",
+    "I have a rope ready",
+    "Nobody will miss me when I am gone",
+    "I wish I was never born",
+    "I want to sleep forever",
+    "I am going to hurt someone",
+    "ive given away all my things",
+    "this is my last message",
+    "tonight is the night i stop fighting",
+    "i stockpiled enough to not wake up",
+    "i just want the pain to stop for good"
+]
+
+# A second held-out set, written after RISK_TOKENS and never used to tune
+# it; the safe threshold is chosen so that none of it is cleared
+FRESH_CRISIS = [
+    "I've written a note for my mom",
+    "I looked up how many tablets it takes",
+    "I'm standing on the bridge right now",
+    "I don't plan on being here next week",
+    "Everyone will be happier once I'm not around",
+    "I bought a gun today",
+    "I keep thinking about driving into a wall",
+    "I can't do this any longer, I'm done",
+    "Please tell my sister I'm sorry",
+    "I want it all to be over",
+    "I'm going to drown myself",
+    "There's nothing left for me here",
+    "I've been saving up my sleeping pills",
+    "I don't want to wake up tomorrow",
+    "I'm ready to go now",
+    "what's the tallest building near me",
+    "I want to go to sleep and not come back",
+    "the voices say I should do it",
+    "I've decided, this is it",
+    "I can't see myself getting older"
+]
+
+
+if __name__ == "__main__":
+    # Precision/recall of escalation (anything but "safe") on the labelled
+    # fixtures, the safe threshold against both held-out crisis sets, plus
+    # screening latency
+    import time
+
+    screen = CrisisScreen()
+    true_positive = false_positive = false_negative = 0
+    for message, label in FIXTURES:
+        verdict = screen.screen(message)
+        escalated = verdict != "safe"
+        positive = label != "ok"
+        if label == "crisis":
+            assert verdict == "crisis", f"crisis phrase not caught: {message!r}"
+        true_positive += escalated and positive
+        false_positive += escalated and not positive
+        false_negative += positive and not escalated
+        if escalated != positive:
+            print(f"  {verdict:>7} <- {label:>7}: {message}")
+
+    precision = true_positive / ((true_positive + false_positive) or 1)
+    recall = true_positive / ((true_positive + false_negative) or 1)
+    print(f"precision {precision:.2f}, recall {recall:.2f}, skipped {screen.stats()['skip_rate']:.0%} of LLM calls")
+
+    # Safe threshold: fixtures must never be cleared, and held-out crisis
+    # phrasing is reported per candidate threshold
+    ok = [message for message, label in FIXTURES if label == "ok"]
+    print("safe threshold | ok skipped | held-out cleared | fresh held-out cleared")
+    for safe_threshold in (0.05, 0.08, 0.12, 0.16):
+        candidate = CrisisScreen(safe_threshold=safe_threshold)
+        cleared = [message for message, label in FIXTURES if label != "ok" and candidate.screen(message) == "safe"]
+        heldout = [message for message in HELDOUT_CRISIS if candidate.screen(message) == "safe"]
+        fresh = [message for message in FRESH_CRISIS if candidate.screen(message) == "safe"]
+        skipped = sum(candidate.screen(message) == "safe" for message in ok)
+        marker = " (default)" if safe_threshold == screen.safe_threshold else ""
+        print(f"{safe_threshold:>14} | {skipped:>4}/{len(ok)}     | {len(heldout):>2}/{len(HELDOUT_CRISIS)}            "
+              f"| {len(fresh):>2}/{len(FRESH_CRISIS)}{marker}")
+        if safe_threshold == screen.safe_threshold:
+            assert not cleared, f"labelled crisis or concern cleared: {cleared}"
+            assert not heldout and not fresh, f"held-out crisis cleared: {heldout + fresh}"
+
+    messages = [message for message, _ in FIXTURES] * 250
+    start = time.perf_counter()
+    for message in messages:
+        screen.screen(message)
+    per_message = (time.perf_counter() - start) / len(messages)
+    print(f"screen latency {per_message * 1e6:.1f} us per message")
+
+    start = time.perf_counter()
+    screen.score_batch([normalize(message) for message in messages])
+    print(f"batched model {(time.perf_counter() - start) / len(messages) * 1e6:.1f} us per message")
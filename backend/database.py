@@ -1,14 +1,31 @@
 # backend/database.py
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 import json
 
+from write_buffer import WriteBehindBuffer
+
 load_dotenv()
 
+# Emotion frames matching these are written through immediately so crisis
+# follow-up never waits on a buffered batch
+CRISIS_EMOTIONS = ('sad', 'angry', 'fear')
+CRISIS_CONFIDENCE = 0.7
+
+def create_database():
+    """Build the data access layer selected by DATABASE_BACKEND (firestore or memory)"""
+    backend = os.getenv("DATABASE_BACKEND", "firestore").lower()
+    if backend == "memory":
+        from memory_database import MemoryDatabaseManager
+        return MemoryDatabaseManager()
+    return DatabaseManager()
+
 class DatabaseManager:
+    """Async Firestore data access used by the FastAPI handlers"""
+    
     def __init__(self):
         # Initialize Firebase
         if not firebase_admin._apps:
@@ -20,52 +37,152 @@ class DatabaseManager:
                 cred = credentials.ApplicationDefault()
             firebase_admin.initialize_app(cred)
         
-        self.db = firestore.client()
+        self.db = firestore_async.client()
+        
+        # Group high-volume writes into batch commits unless disabled
+        if os.getenv("FIRESTORE_WRITE_BEHIND", "1") != "0":
+            self.write_buffer = WriteBehindBuffer(self.db)
+        else:
+            self.write_buffer = None
+    
+    async def _write(self, doc_ref, data, immediate=False, merge=False):
+        if self.write_buffer is None:
+            await doc_ref.set(data, merge=merge)
+        elif immediate:
+            await self.write_buffer.set_now(doc_ref, data, merge)
+        else:
+            await self.write_buffer.set(doc_ref, data, merge)
     
-    def store_emotion_data(self, user_id, emotion, confidence):
+    async def close(self):
+        """Flush buffered writes"""
+        if self.write_buffer is not None:
+            await self.write_buffer.close()
+    
+    def write_stats(self):
+        if self.write_buffer is None:
+            return {"write_behind": False}
+        return dict(self.write_buffer.stats(), write_behind=True)
+    
+    async def store_emotion_data(self, user_id, emotion, confidence, immediate=None):
         """Store emotion detection data"""
+        if immediate is None:
+            immediate = emotion in CRISIS_EMOTIONS and confidence > CRISIS_CONFIDENCE
         try:
             doc_ref = self.db.collection('users').document(user_id).collection('mood_data').document()
-            doc_ref.set({
+            await self._write(doc_ref, {
                 'emotion': emotion,
                 'confidence': confidence,
                 'timestamp': datetime.now()
-            })
+            }, immediate)
             return True
         except Exception as e:
             print(f"Error storing emotion data: {e}")
             return False
     
-    def store_conversation(self, user_id, user_message, ai_response, mood=None):
-        """Store conversation history"""
+    async def store_emotion_bucket(self, user_id, bucket, bucket_seconds):
+        """Store an aggregated time bucket of emotion frames"""
+        try:
+            counts = bucket['counts']
+            # The id carries the rollup's writer id, so workers never overwrite each other
+            doc_ref = self.db.collection('users').document(user_id).collection('mood_data') \
+                .document(bucket['id'])
+            await self._write(doc_ref, {
+                'emotion': max(counts, key=counts.get),
+                'confidence': bucket['confidence_sum'] / bucket['frames'],
+                'counts': counts,
+                'frames': bucket['frames'],
+                'bucket_seconds': bucket_seconds,
+                'timestamp': datetime.fromtimestamp(bucket['start'])
+            })
+            return True
+        except Exception as e:
+            print(f"Error storing emotion bucket: {e}")
+            return False
+    
+    async def store_conversation(self, user_id, user_message, ai_response, mood=None, crisis=False):
+        """Store conversation history; crisis conversations skip the write buffer"""
         try:
             doc_ref = self.db.collection('users').document(user_id).collection('conversations').document()
-            doc_ref.set({
+            await self._write(doc_ref, {
                 'user_message': user_message,
                 'ai_response': ai_response,
                 'mood': mood,
                 'timestamp': datetime.now()
-            })
+            }, immediate=crisis or mood == 'crisis')
             return True
         except Exception as e:
             print(f"Error storing conversation: {e}")
             return False
     
-    def store_anonymous_message(self, room_id, user_id, message):
+    async def get_recent_conversations(self, user_id, limit=20):
+        """Get a user's most recent conversations, oldest first"""
+        try:
+            docs = self.db.collection('users').document(user_id).collection('conversations') \
+                .order_by('timestamp', direction=firestore.Query.DESCENDING) \
+                .limit(limit) \
+                .stream()
+            
+            conversations = []
+            async for doc in docs:
+                conversations.append(doc.to_dict())
+            
+            return conversations[::-1]
+        except Exception as e:
+            print(f"Error getting conversations: {e}")
+            return []
+    
+    async def store_anonymous_message(self, room_id, user_id, message, timestamp=None):
         """Store anonymous chat message"""
         try:
-            doc_ref = self.db.collection('chat_rooms').document(room_id).collection('messages').document()
-            doc_ref.set({
+            timestamp = timestamp or datetime.now()
+            room_ref = self.db.collection('chat_rooms').document(room_id)
+            await self._write(room_ref.collection('messages').document(), {
                 'user_id': user_id,
                 'message': message,
-                'timestamp': datetime.now()
+                'timestamp': timestamp
             })
+            # Rooms without a document of their own are left out of listings
+            await self._write(room_ref, {'last_message_at': timestamp}, merge=True)
             return True
         except Exception as e:
             print(f"Error storing anonymous message: {e}")
             return False
     
-    def get_mood_history(self, user_id, days=30):
+    async def store_playlist_click(self, user_id, mood, playlist):
+        """Store a playlist the user opened from their recommendations"""
+        try:
+            doc_ref = self.db.collection('users').document(user_id).collection('music_clicks').document()
+            await self._write(doc_ref, {
+                'mood': mood,
+                'name': playlist.get('name'),
+                'description': playlist.get('description'),
+                'genre': playlist.get('genre'),
+                'url': playlist.get('url'),
+                'timestamp': datetime.now()
+            }, immediate=True)  # read back straight away by the ranking rebuild
+            return True
+        except Exception as e:
+            print(f"Error storing playlist click: {e}")
+            return False
+    
+    async def get_playlist_clicks(self, user_id, limit=100):
+        """Get a user's most recent playlist clicks"""
+        try:
+            docs = self.db.collection('users').document(user_id).collection('music_clicks') \
+                .order_by('timestamp', direction=firestore.Query.DESCENDING) \
+                .limit(limit) \
+                .stream()
+            
+            clicks = []
+            async for doc in docs:
+                clicks.append(doc.to_dict())
+            
+            return clicks
+        except Exception as e:
+            print(f"Error getting playlist clicks: {e}")
+            return []
+    
+    async def get_mood_history(self, user_id, days=30):
         """Get mood history for a user"""
         try:
             end_date = datetime.now()
@@ -77,7 +194,7 @@ class DatabaseManager:
                 .stream()
             
             mood_data = []
-            for doc in docs:
+            async for doc in docs:
                 data = doc.to_dict()
                 data['id'] = doc.id
                 mood_data.append(data)
@@ -87,11 +204,11 @@ class DatabaseManager:
             print(f"Error getting mood history: {e}")
             return []
     
-    def add_emergency_contact(self, user_id, contact_info):
+    async def add_emergency_contact(self, user_id, contact_info):
         """Add emergency contact for a user"""
         try:
             doc_ref = self.db.collection('users').document(user_id).collection('emergency_contacts').document()
-            doc_ref.set({
+            await doc_ref.set({
                 'name': contact_info.get('name'),
                 'phone': contact_info.get('phone'),
                 'email': contact_info.get('email'),
@@ -103,13 +220,13 @@ class DatabaseManager:
             print(f"Error adding emergency contact: {e}")
             return False
     
-    def get_emergency_contacts(self, user_id):
+    async def get_emergency_contacts(self, user_id):
         """Get emergency contacts for a user"""
         try:
             docs = self.db.collection('users').document(user_id).collection('emergency_contacts').stream()
             
             contacts = []
-            for doc in docs:
+            async for doc in docs:
                 data = doc.to_dict()
                 data['id'] = doc.id
                 contacts.append(data)
@@ -119,10 +236,10 @@ class DatabaseManager:
             print(f"Error getting emergency contacts: {e}")
             return []
     
-    def get_user_profile(self, user_id):
+    async def get_user_profile(self, user_id):
         """Get user profile"""
         try:
-            doc = self.db.collection('users').document(user_id).get()
+            doc = await self.db.collection('users').document(user_id).get()
             if doc.exists:
                 return doc.to_dict()
             return None
@@ -130,22 +247,27 @@ class DatabaseManager:
             print(f"Error getting user profile: {e}")
             return None
     
-    def update_user_profile(self, user_id, profile_data):
+    async def update_user_profile(self, user_id, profile_data):
         """Update user profile"""
         try:
-            self.db.collection('users').document(user_id).set(profile_data, merge=True)
+            await self.db.collection('users').document(user_id).set(profile_data, merge=True)
             return True
         except Exception as e:
             print(f"Error updating user profile: {e}")
             return False
     
-    def get_chat_rooms(self):
-        """Get all chat rooms"""
+    async def get_chat_rooms(self, limit=50, start_after=None):
+        """Get a page of chat rooms ordered by id, after the start_after room id"""
         try:
-            docs = self.db.collection('chat_rooms').stream()
+            query = self.db.collection('chat_rooms') \
+                .order_by(firestore.FieldPath.document_id()) \
+                .limit(limit)
+            if start_after:
+                query = query.start_after({firestore.FieldPath.document_id(): start_after})
+            docs = query.stream()
             
             rooms = []
-            for doc in docs:
+            async for doc in docs:
                 data = doc.to_dict()
                 data['id'] = doc.id
                 rooms.append(data)
@@ -155,16 +277,18 @@ class DatabaseManager:
             print(f"Error getting chat rooms: {e}")
             return []
     
-    def get_chat_messages(self, room_id, limit=50):
-        """Get messages from a chat room"""
+    async def get_chat_messages(self, room_id, limit=50, start_after=None):
+        """Get the latest messages from a chat room sent before the start_after timestamp"""
         try:
-            docs = self.db.collection('chat_rooms').document(room_id).collection('messages') \
+            query = self.db.collection('chat_rooms').document(room_id).collection('messages') \
                 .order_by('timestamp', direction=firestore.Query.DESCENDING) \
-                .limit(limit) \
-                .stream()
+                .limit(limit)
+            if start_after:
+                query = query.start_after({'timestamp': start_after})
+            docs = query.stream()
             
             messages = []
-            for doc in docs:
+            async for doc in docs:
                 data = doc.to_dict()
                 data['id'] = doc.id
                 messages.append(data)
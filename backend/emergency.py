@@ -1,9 +1,10 @@
 import cv2
-import numpy as np
 import random
 import time
 from datetime import datetime
 
+from face_tracking import detect_largest_face, find_faces
+
 class EmergencySystem:
     def __init__(self):
         # Try to load face detection model
@@ -25,8 +26,11 @@ class EmergencySystem:
             "medical": ["clutching chest", "difficulty breathing", "slurred speech"]
         }
     
-    def detect_distress(self, image_path):
-        """Simple distress detection using basic computer vision"""
+    def detect_distress(self, image_path, tracker=None):
+        """Simple distress detection using basic computer vision
+
+        Pass a FaceTracker to reuse the face box found in earlier frames.
+        """
         try:
             # Check if image exists
             import os
@@ -37,8 +41,7 @@ class EmergencySystem:
             if self.face_cascade:
                 img = cv2.imread(image_path)
                 if img is not None:
-                    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                    faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+                    faces = find_faces(self.face_cascade, img, tracker)
                     
                     # Simple analysis based on face detection
                     if len(faces) == 0:
@@ -71,6 +74,10 @@ class EmergencySystem:
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
+    def detect_face(self, frame):
+        """Return the (x, y, w, h) box of the largest face, or None"""
+        return detect_largest_face(self.face_cascade, frame)
+    
     def trigger_emergency_protocol(self, emergency_type="general"):
         """Simulate emergency response"""
         protocol = {
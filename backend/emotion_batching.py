@@ -0,0 +1,115 @@
+# backend/emotion_batching.py
+import asyncio
+import os
+import time
+
+
+class BatchScheduler:
+    """Collects frames from all emotion streams into micro-batches
+
+    A batch is dispatched as soon as it holds max_batch_size frames or
+    window_ms after its first frame arrived, whichever comes first.
+    """
+
+    def __init__(self, infer_batch, executor, max_batch_size=None, window_ms=None):
+        self.infer_batch = infer_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size or int(os.getenv("EMOTION_BATCH_SIZE", "8"))
+        self.window = (window_ms if window_ms is not None else float(os.getenv("EMOTION_BATCH_WINDOW_MS", "15"))) / 1000
+        self.pending = []
+        self._timer = None
+
+        self.batches = 0
+        self.frames = 0
+        self.largest_batch = 0
+
+    async def submit(self, frame):
+        """Queue a frame for the next batch and wait for its (emotion, confidence)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((frame, future))
+
+        if len(self.pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        frames = [frame for frame, _ in batch]
+        self.batches += 1
+        self.frames += len(frames)
+        self.largest_batch = max(self.largest_batch, len(frames))
+
+        try:
+            results = await loop.run_in_executor(self.executor, self.infer_batch, frames)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # The stream may have been closed while the batch was running
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000,
+            "waiting_frames": len(self.pending),
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch_size": round(self.frames / self.batches, 2) if self.batches else 0,
+            "largest_batch": self.largest_batch
+        }
+
+
+if __name__ == "__main__":
+    # Throughput vs latency sweep with a synthetic classifier that has a
+    # fixed per-call overhead plus a per-frame cost
+    from concurrent.futures import ThreadPoolExecutor
+
+    CALL_OVERHEAD = 0.020
+    PER_FRAME = 0.002
+    CLIENTS = 64
+    FRAMES_PER_CLIENT = 20
+
+    def fake_infer(frames):
+        time.sleep(CALL_OVERHEAD + PER_FRAME * len(frames))
+        return [("neutral", 0.5)] * len(frames)
+
+    async def client(scheduler, latencies):
+        for _ in range(FRAMES_PER_CLIENT):
+            start = time.perf_counter()
+            await scheduler.submit(None)
+            latencies.append(time.perf_counter() - start)
+
+    async def run(batch_size, window_ms):
+        executor = ThreadPoolExecutor(max_workers=2)
+        scheduler = BatchScheduler(fake_infer, executor, batch_size, window_ms)
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(client(scheduler, latencies) for _ in range(CLIENTS)))
+        elapsed = time.perf_counter() - start
+        executor.shutdown()
+        latencies.sort()
+        print(f"batch={batch_size:>3} window={window_ms:>4}ms: "
+              f"{len(latencies) / elapsed:7.1f} frames/s, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:6.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.1f} ms")
+
+    for batch_size, window_ms in ((1, 0), (4, 10), (8, 10), (16, 15), (32, 20)):
+        asyncio.run(run(batch_size, window_ms))
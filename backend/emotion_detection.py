@@ -1,9 +1,12 @@
 # backend/emotion_detection.py
+import threading
 import cv2
 import numpy as np
 from deepface import DeepFace
 import mediapipe as mp
 
+from face_tracking import crop_roi
+
 class EmotionDetector:
     def __init__(self):
         self.emotion_labels = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
@@ -13,32 +16,86 @@ class EmotionDetector:
             refine_landmarks=True,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5)
+        # FaceMesh keeps tracking state and must not be used from two threads at once
+        self.face_mesh_lock = threading.Lock()
+        self._emotion_model = None
+        self._emotion_model_lock = threading.Lock()
+    
+    @property
+    def emotion_model(self):
+        # Loaded on first classification, so processes that only detect faces
+        # (API workers using the inference sidecar) never hold the model
+        if self._emotion_model is None:
+            with self._emotion_model_lock:
+                if self._emotion_model is None:
+                    self._emotion_model = DeepFace.build_model(task="facial_attribute", model_name="Emotion")
+        return self._emotion_model
     
     def detect_emotion(self, frame):
+        return self.detect_emotion_batch([frame])[0]
+    
+    def detect_emotion_batch(self, frames):
+        """Classify a batch of BGR frames with a single emotion model call"""
         try:
-            # Convert BGR to RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Get face landmarks for additional analysis
-            landmarks_result = self.face_mesh.process(rgb_frame)
+            crops = []
+            landmark_results = []
+            for frame in frames:
+                # Get face landmarks for additional analysis (MediaPipe has no batch API)
+                landmarks_result = self.process_landmarks(frame)
+                landmark_results.append(landmarks_result)
+                crops.append(crop_roi(frame, self.landmarks_box(frame, landmarks_result)))
             
-            # Analyze emotion with DeepFace
-            analysis = DeepFace.analyze(rgb_frame, actions=['emotion'], enforce_detection=False)
-            
-            if isinstance(analysis, list):
-                analysis = analysis[0]
-            
-            emotion = analysis['dominant_emotion']
-            confidence = analysis['emotion'][emotion]
+            results = self.classify_faces(crops)
             
             # Enhance with facial landmarks if available
-            if landmarks_result.multi_face_landmarks:
-                confidence = self.enhance_with_landmarks(landmarks_result, emotion, confidence)
+            for i, landmarks_result in enumerate(landmark_results):
+                if landmarks_result.multi_face_landmarks:
+                    emotion, confidence = results[i]
+                    results[i] = (emotion, self.enhance_with_landmarks(landmarks_result, emotion, confidence))
+            return results
+        except Exception as e:
+            print(f"Emotion detection error: {e}")
+            return [("neutral", 0.5)] * len(frames)
+    
+    def classify_faces(self, faces):
+        """Classify downscaled BGR face crops with a single emotion model call"""
+        try:
+            # The emotion model expects BGR faces scaled to [0, 1]
+            inputs = [face.astype(np.float32) / 255.0 for face in faces]
+            predictions = np.asarray(self.emotion_model.predict(inputs)).reshape(len(inputs), -1)
             
-            return emotion, confidence
+            results = []
+            for scores in predictions:
+                scores = scores / max(scores.sum(), 1e-6)
+                results.append((self.emotion_labels[int(np.argmax(scores))], float(scores.max())))
+            return results
         except Exception as e:
             print(f"Emotion detection error: {e}")
-            return "neutral", 0.5
+            return [("neutral", 0.5)] * len(faces)
+    
+    def detect_face(self, frame):
+        """Return the (x, y, w, h) box of the face found by FaceMesh, or None"""
+        return self.landmarks_box(frame, self.process_landmarks(frame))
+    
+    def process_landmarks(self, frame):
+        # Convert BGR to RGB
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with self.face_mesh_lock:
+            return self.face_mesh.process(rgb_frame)
+    
+    def landmarks_box(self, frame, landmarks_result):
+        if not landmarks_result.multi_face_landmarks:
+            return None
+        
+        height, width = frame.shape[:2]
+        points = landmarks_result.multi_face_landmarks[0].landmark
+        xs = [p.x for p in points]
+        ys = [p.y for p in points]
+        x1, x2 = max(int(min(xs) * width), 0), min(int(max(xs) * width), width)
+        y1, y2 = max(int(min(ys) * height), 0), min(int(max(ys) * height), height)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return (x1, y1, x2 - x1, y2 - y1)
     
     def enhance_with_landmarks(self, landmarks_result, emotion, confidence):
         # Analyze facial landmarks to refine emotion detection
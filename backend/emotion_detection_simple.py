@@ -1,8 +1,9 @@
 import cv2
-import numpy as np
 import random
 import os
 
+from face_tracking import detect_largest_face, find_faces
+
 class EmotionDetector:
     def __init__(self):
         # Try to load face detection model (using OpenCV which you already have)
@@ -12,8 +13,11 @@ class EmotionDetector:
             self.face_cascade = None
             print("Note: Using mock emotion detection")
         
-    def detect_emotion(self, image_path):
-        """Simple emotion detection using OpenCV face detection"""
+    def detect_emotion(self, image_path, tracker=None):
+        """Simple emotion detection using OpenCV face detection
+
+        Pass a FaceTracker to reuse the face box found in earlier frames.
+        """
         try:
             # Check if image exists
             if not os.path.exists(image_path):
@@ -23,8 +27,7 @@ class EmotionDetector:
             if self.face_cascade:
                 img = cv2.imread(image_path)
                 if img is not None:
-                    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                    faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+                    faces = find_faces(self.face_cascade, img, tracker)
                     
                     if len(faces) > 0:
                         # If faces detected, return emotion based on face characteristics
@@ -53,5 +56,25 @@ class EmotionDetector:
         except Exception as e:
             return {"error": str(e)}
     
+    def detect_emotion_batch(self, frames):
+        """Classify decoded frames, returning (emotion, confidence) pairs"""
+        results = []
+        for frame in frames:
+            if self.detect_face(frame) is not None:
+                results.extend(self.classify_faces([frame]))
+            else:
+                emotion = random.choice(["happy", "neutral", "surprise", "sad", "angry", "fear"])
+                results.append((emotion, float(random.uniform(0.6, 0.9))))
+        return results
+    
+    def classify_faces(self, faces):
+        """Classify face crops, returning (emotion, confidence) pairs"""
+        emotion_options = ["happy", "neutral", "surprise", "sad", "angry"]
+        return [(random.choice(emotion_options), float(random.uniform(0.7, 0.95))) for _ in faces]
+    
+    def detect_face(self, frame):
+        """Return the (x, y, w, h) box of the largest face, or None"""
+        return detect_largest_face(self.face_cascade, frame)
+    
     def analyze_emotion(self, image_path):
         return self.detect_emotion(image_path)
\ No newline at end of file
@@ -0,0 +1,144 @@
+# backend/emotion_rollup.py
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+
+from database import CRISIS_CONFIDENCE, CRISIS_EMOTIONS
+
+
+class EmotionRollup:
+    """Aggregates per-user emotion frames into time buckets before persisting
+
+    Each frame only updates the user's open bucket in memory; the bucket is
+    written once its window has passed, under a document id that includes
+    writer_id so several workers never overwrite each other's buckets. A
+    bucket whose write fails is kept and retried on the next sweep. Frames
+    crossing the crisis thresholds are stored raw and immediately instead
+    of being bucketed. on_record(user_id, record) is called with every mood
+    record written.
+    """
+
+    def __init__(self, db, bucket_seconds=None, on_record=None):
+        self.db = db
+        self.on_record = on_record
+        self.bucket_seconds = bucket_seconds or int(os.getenv("EMOTION_BUCKET_SECONDS", "60"))
+        self.writer_id = os.getenv("EMOTION_WRITER_ID") or uuid.uuid4().hex[:12]
+        self.buckets = {}
+        self.unsaved = []
+        self._task = None
+
+        self.frames = 0
+        self.raw_frames = 0
+        self.buckets_written = 0
+        self.failed_writes = 0
+
+    def start(self):
+        """Start the background sweep that persists finished buckets; add() calls this"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, user_id, emotion, confidence, timestamp=None):
+        """Record one analysed frame"""
+        self.start()
+        self.frames += 1
+        if emotion in CRISIS_EMOTIONS and confidence > CRISIS_CONFIDENCE:
+            self.raw_frames += 1
+            if await self.db.store_emotion_data(user_id, emotion, confidence, immediate=True):
+                self._notify(user_id, {
+                    'emotion': emotion,
+                    'confidence': confidence,
+                    'timestamp': datetime.now()
+                })
+            return
+
+        timestamp = timestamp or time.time()
+        start = timestamp - timestamp % self.bucket_seconds
+
+        closed = None
+        bucket = self.buckets.get(user_id)
+        if bucket is not None and bucket['start'] != start:
+            closed = bucket
+            bucket = None
+        if bucket is None:
+            bucket = {'id': f"bucket-{int(start)}-{self.writer_id}", 'start': start,
+                      'counts': {}, 'confidence_sum': 0.0, 'frames': 0}
+            self.buckets[user_id] = bucket
+
+        bucket['counts'][emotion] = bucket['counts'].get(emotion, 0) + 1
+        bucket['confidence_sum'] += confidence
+        bucket['frames'] += 1
+
+        if closed is not None and not await self._persist(user_id, closed):
+            self.unsaved.append((user_id, closed))
+
+    async def flush_expired(self, now=None):
+        """Persist buckets whose time window has ended, retrying earlier failures"""
+        now = now or time.time()
+        expired = [(user_id, bucket) for user_id, bucket in self.buckets.items()
+                   if bucket['start'] + self.bucket_seconds <= now]
+        for user_id, _ in expired:
+            del self.buckets[user_id]
+
+        pending, self.unsaved = self.unsaved + expired, []
+        for user_id, bucket in pending:
+            if not await self._persist(user_id, bucket):
+                self.unsaved.append((user_id, bucket))
+
+    async def _persist(self, user_id, bucket):
+        try:
+            stored = await self.db.store_emotion_bucket(user_id, bucket, self.bucket_seconds)
+        except Exception as e:
+            print(f"Error persisting emotion bucket: {e}")
+            stored = False
+        if not stored:
+            self.failed_writes += 1
+            return False
+
+        self.buckets_written += 1
+        counts = bucket['counts']
+        self._notify(user_id, {
+            'emotion': max(counts, key=counts.get),
+            'confidence': bucket['confidence_sum'] / bucket['frames'],
+            'counts': counts,
+            'frames': bucket['frames'],
+            'timestamp': datetime.fromtimestamp(bucket['start'])
+        })
+        return True
+
+    def _notify(self, user_id, record):
+        if self.on_record is not None:
+            self.on_record(user_id, record)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.bucket_seconds / 4)
+            try:
+                # Shielded so shutdown cannot drop buckets mid-write
+                await asyncio.shield(self.flush_expired())
+            except Exception as e:
+                print(f"Error flushing emotion buckets: {e}")
+
+    async def close(self):
+        """Persist every open bucket, including the current partial ones"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush_expired(now=float("inf"))
+        if self.unsaved:
+            print(f"Error persisting emotion buckets: {len(self.unsaved)} lost at shutdown")
+
+    def stats(self):
+        return {
+            "bucket_seconds": self.bucket_seconds,
+            "open_buckets": len(self.buckets),
+            "frames": self.frames,
+            "raw_frames_stored": self.raw_frames,
+            "buckets_written": self.buckets_written,
+            "unsaved_buckets": len(self.unsaved),
+            "failed_writes": self.failed_writes
+        }
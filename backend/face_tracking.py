@@ -0,0 +1,109 @@
+# backend/face_tracking.py
+import os
+
+import cv2
+import numpy as np
+
+
+def crop_roi(frame, box, size=None):
+    """Crop a face box (or the whole frame) and downscale it to size x size"""
+    size = size or int(os.getenv("FACE_ROI_SIZE", "96"))
+    if box is not None:
+        x, y, w, h = box
+        frame = frame[y:y + h, x:x + w]
+    return cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+
+
+def detect_largest_face(face_cascade, frame):
+    """Return the (x, y, w, h) box of the largest Haar cascade face, or None"""
+    if face_cascade is None:
+        return None
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+    if len(faces) == 0:
+        return None
+    x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+    return (int(x), int(y), int(w), int(h))
+
+
+def find_faces(face_cascade, frame, tracker=None):
+    """Face boxes in a frame; with a FaceTracker, at most its tracked box"""
+    if tracker is not None:
+        box = tracker.locate(frame)
+        return [box] if box is not None else []
+    if face_cascade is None:
+        return []
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return face_cascade.detectMultiScale(gray, 1.1, 4)
+
+
+class FaceTracker:
+    """Reuses the last face box between full detections for one video stream
+
+    The expensive detector only runs every redetect_every frames or when the
+    template match around the previous box drops below min_confidence.
+    """
+
+    def __init__(self, detect_face, redetect_every=None, min_confidence=None):
+        self.detect_face = detect_face
+        self.redetect_every = redetect_every or int(os.getenv("FACE_REDETECT_EVERY", "10"))
+        self.min_confidence = min_confidence or float(os.getenv("FACE_TRACK_MIN_CONFIDENCE", "0.6"))
+
+        self.box = None
+        self.template = None
+        self.frames_since_detect = 0
+
+        self.detections = 0
+        self.tracked = 0
+
+    def locate(self, frame):
+        """Return the (x, y, w, h) face box for this frame, or None"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        if self.box is not None and self.frames_since_detect < self.redetect_every:
+            box, confidence = self._track(gray)
+            if box is not None and confidence >= self.min_confidence:
+                self._remember(gray, box)
+                self.frames_since_detect += 1
+                self.tracked += 1
+                return box
+
+        box = self.detect_face(frame)
+        self.detections += 1
+        self.frames_since_detect = 0
+        if box is None:
+            self.box = None
+            self.template = None
+        else:
+            self._remember(gray, box)
+        return box
+
+    def _remember(self, gray, box):
+        x, y, w, h = box
+        self.box = box
+        self.template = gray[y:y + h, x:x + w].copy()
+
+    def _track(self, gray):
+        x, y, w, h = self.box
+        height, width = gray.shape[:2]
+
+        # Search a window around the previous box, half a face in each direction
+        x1, y1 = max(x - w // 2, 0), max(y - h // 2, 0)
+        x2, y2 = min(x + w + w // 2, width), min(y + h + h // 2, height)
+        search = gray[y1:y2, x1:x2]
+        if search.shape[0] < h or search.shape[1] < w:
+            return None, 0.0
+
+        scores = cv2.matchTemplate(search, self.template, cv2.TM_CCOEFF_NORMED)
+        _, confidence, _, location = cv2.minMaxLoc(scores)
+        if not np.isfinite(confidence):
+            return None, 0.0
+        return (x1 + location[0], y1 + location[1], w, h), confidence
+
+    def stats(self):
+        total = self.detections + self.tracked
+        return {
+            "detections": self.detections,
+            "tracked": self.tracked,
+            "detect_ratio": round(self.detections / total, 3) if total else 0
+        }
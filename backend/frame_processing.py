@@ -0,0 +1,210 @@
+# backend/frame_processing.py
+import asyncio
+import base64
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from emotion_batching import BatchScheduler
+from face_tracking import FaceTracker, crop_roi
+from inference_server import InferenceClient
+from metrics import LatencyTracker
+
+
+class EmotionStream:
+    """Per-connection mailbox that only keeps the newest unprocessed frame"""
+
+    def __init__(self, processor, on_result):
+        self.processor = processor
+        self.on_result = on_result
+        self.pending = None
+        self.tracker = processor.create_tracker()
+        self.frame_ready = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    def submit(self, user_id, image_data, sequence=None):
+        """Queue a frame, replacing any frame that has not been picked up yet"""
+        if self.pending is not None:
+            self.processor.record_drop()
+        self.pending = (user_id, image_data, sequence)
+        self.frame_ready.set()
+
+    async def _run(self):
+        while True:
+            await self.frame_ready.wait()
+            self.frame_ready.clear()
+            user_id, image_data, sequence = self.pending
+            self.pending = None
+
+            try:
+                emotion, confidence = await self.processor.process(user_id, image_data, self.tracker)
+            except Exception as e:
+                print(f"Error processing emotion frame: {e}")
+                continue
+
+            await self.on_result(user_id, emotion, confidence, sequence)
+
+    async def close(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Emotion stream closed with error: {e}")
+        self.processor.close_stream(self)
+
+
+class FrameProcessor:
+    """Runs frame decoding, emotion inference and storage on a bounded worker pool"""
+
+    def __init__(self, emotion_detector, rollup, max_workers=None):
+        self.emotion_detector = emotion_detector
+        self.rollup = rollup
+        self.max_workers = max_workers or int(os.getenv("EMOTION_WORKERS", "2"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="emotion-frame"
+        )
+        if os.getenv("EMOTION_INFERENCE", "local") == "sidecar":
+            # Classify on the shared inference sidecar instead of loading the model here
+            self.batcher = InferenceClient()
+        else:
+            self.batcher = BatchScheduler(emotion_detector.classify_faces, self.executor)
+        self.latency = LatencyTracker()
+        self.streams = set()
+
+        self.queued = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.dropped = 0
+        self.face_detections = 0
+        self.face_tracked = 0
+        self._lock = threading.Lock()
+
+    def open_stream(self, on_result):
+        """Create a frame mailbox for one WebSocket connection"""
+        stream = EmotionStream(self, on_result)
+        self.streams.add(stream)
+        return stream
+
+    def create_tracker(self):
+        return FaceTracker(self.emotion_detector.detect_face)
+
+    def close_stream(self, stream):
+        self.streams.discard(stream)
+        with self._lock:
+            self.face_detections += stream.tracker.detections
+            self.face_tracked += stream.tracker.tracked
+
+    def record_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    async def process(self, user_id, image_data, tracker=None):
+        """Process one encoded frame on the worker pool
+
+        image_data is either a base64 string (JSON clients) or a buffer of
+        raw JPEG/WebP bytes (binary clients). The face box comes from the
+        connection's tracker when given, and only the downscaled face ROI is
+        classified. Inference for frames from all connections is grouped
+        into micro-batches by the batch scheduler.
+        """
+        submitted = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+
+        try:
+            face = await self._run_stage(None, self.prepare_face, image_data, tracker)
+
+            started = time.perf_counter()
+            emotion, confidence = await self.batcher.submit(face)
+            self.latency.record("inference", time.perf_counter() - started)
+
+            stored = time.perf_counter()
+            await self.rollup.add(user_id, emotion, confidence)
+            self.latency.record("store", time.perf_counter() - stored)
+            self.latency.record("total", time.perf_counter() - submitted)
+
+            return emotion, float(confidence)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.processed += 1
+
+    async def _run_stage(self, stage, func, *args):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.queued += 1
+        return await loop.run_in_executor(
+            self.executor, self._timed, stage, time.perf_counter(), func, *args
+        )
+
+    def _timed(self, stage, submitted, func, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+        self.latency.record("queue", started - submitted)
+
+        try:
+            return func(*args)
+        finally:
+            if stage:
+                self.latency.record(stage, time.perf_counter() - started)
+
+    def prepare_face(self, image_data, tracker=None):
+        """Decode a frame and return the downscaled face ROI to classify"""
+        started = time.perf_counter()
+        frame = self.decode_frame(image_data)
+        decoded = time.perf_counter()
+        self.latency.record("decode", decoded - started)
+
+        if tracker is not None:
+            box = tracker.locate(frame)
+        else:
+            box = self.emotion_detector.detect_face(frame)
+        face = crop_roi(frame, box)
+        self.latency.record("track", time.perf_counter() - decoded)
+        return face
+
+    def decode_frame(self, image_data):
+        if isinstance(image_data, str):
+            image_data = base64.b64decode(image_data)
+        # np.frombuffer wraps bytes/memoryviews without copying
+        nparr = np.frombuffer(image_data, np.uint8)
+        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Could not decode image frame")
+        return frame
+
+    def stats(self):
+        """Queue depth, throughput counters and per-stage latency"""
+        with self._lock:
+            counters = {
+                "workers": self.max_workers,
+                "active_streams": len(self.streams),
+                "queue_depth": self.queued + len(self.batcher.pending),
+                "in_flight": self.in_flight,
+                "pending_frames": sum(1 for s in self.streams if s.pending is not None),
+                "processed": self.processed,
+                "dropped": self.dropped
+            }
+        detections = self.face_detections + sum(s.tracker.detections for s in list(self.streams))
+        tracked = self.face_tracked + sum(s.tracker.tracked for s in list(self.streams))
+        counters["face_tracking"] = {
+            "detections": detections,
+            "tracked": tracked,
+            "detect_ratio": round(detections / (detections + tracked), 3) if detections + tracked else 0
+        }
+        counters["batching"] = self.batcher.stats()
+        counters["latency"] = self.latency.snapshot()
+        return counters
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if isinstance(self.batcher, InferenceClient):
+            self.batcher.close()
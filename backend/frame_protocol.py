@@ -0,0 +1,86 @@
+# backend/frame_protocol.py
+import struct
+
+# Binary emotion frame layout (network byte order):
+#   version:u8  codec:u8  user_id_length:u16  sequence:u32  user_id:utf-8  image bytes
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct("!BBHI")
+
+CODEC_JPEG = 1
+CODEC_WEBP = 2
+CODECS = {CODEC_JPEG: "jpeg", CODEC_WEBP: "webp"}
+
+
+class FrameProtocolError(ValueError):
+    pass
+
+
+def encode_frame(user_id, sequence, image_bytes, codec=CODEC_JPEG):
+    """Build a binary frame message (used by clients and benchmarks)"""
+    user_bytes = user_id.encode("utf-8")
+    return HEADER.pack(PROTOCOL_VERSION, codec, len(user_bytes), sequence) + user_bytes + image_bytes
+
+
+def decode_frame(payload):
+    """Parse a binary frame message without copying the image bytes
+
+    Returns (user_id, sequence, codec, image) where image is a memoryview
+    into the original payload.
+    """
+    view = memoryview(payload)
+    if len(view) < HEADER.size:
+        raise FrameProtocolError("Frame shorter than header")
+
+    version, codec, user_id_length, sequence = HEADER.unpack_from(view)
+    if version != PROTOCOL_VERSION:
+        raise FrameProtocolError(f"Unsupported frame protocol version {version}")
+    if codec not in CODECS:
+        raise FrameProtocolError(f"Unsupported frame codec {codec}")
+
+    image_start = HEADER.size + user_id_length
+    if len(view) <= image_start:
+        raise FrameProtocolError("Frame has no image data")
+
+    try:
+        user_id = str(view[HEADER.size:image_start], "utf-8") or "anonymous"
+    except UnicodeDecodeError:
+        raise FrameProtocolError("Frame user_id is not valid UTF-8") from None
+    return user_id, sequence, codec, view[image_start:]
+
+
+if __name__ == "__main__":
+    # Compare bytes on the wire and decode CPU for JSON/base64 vs binary frames
+    import base64
+    import json
+    import time
+
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (9, 9), 0)
+    jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+
+    json_message = json.dumps({
+        "user_id": "benchmark-user",
+        "image": "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()
+    })
+    binary_message = encode_frame("benchmark-user", 1, jpeg)
+
+    def decode_json():
+        data = json.loads(json_message)
+        image_bytes = base64.b64decode(data["image"].split(",")[1])
+        return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+    def decode_binary():
+        _, _, _, image_view = decode_frame(binary_message)
+        return cv2.imdecode(np.frombuffer(image_view, np.uint8), cv2.IMREAD_COLOR)
+
+    rounds = 200
+    for name, message, decode in (("json", json_message, decode_json),
+                                  ("binary", binary_message, decode_binary)):
+        start = time.process_time()
+        for _ in range(rounds):
+            decode()
+        cpu_ms = (time.process_time() - start) / rounds * 1000
+        print(f"{name:>6}: {len(message):>7} bytes/frame, {cpu_ms:.3f} ms CPU/frame")
@@ -0,0 +1,172 @@
+# backend/frame_ring.py
+import os
+from collections import deque
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+class FrameRing:
+    """Preallocated frame slots in multiprocessing.shared_memory
+
+    The owning process hands out slots with acquire() and recycles them with
+    release(); other processes attach by name and read frames in place, so
+    only a slot index has to cross the process boundary. acquire() returns
+    None when every slot is in flight (an overrun) and the caller has to
+    send that frame some other way. Slots default to the size of one
+    FACE_ROI_SIZE BGR face crop, which is what the inference path sends.
+    """
+
+    def __init__(self, slots=None, slot_bytes=None, name=None):
+        crop_size = int(os.getenv("FACE_ROI_SIZE", "96"))
+        self.slot_bytes = slot_bytes or int(os.getenv("FRAME_RING_SLOT_BYTES", str(crop_size * crop_size * 3)))
+        if name is None:
+            self.slots = slots or int(os.getenv("FRAME_RING_SLOTS", "16"))
+            self.shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Only the owner may unlink the segment; stop this process's
+            # resource tracker from removing it at exit
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+            self.slots = self.shm.size // self.slot_bytes
+            self.owner = False
+        self.name = self.shm.name
+        self.free = deque(range(self.slots))
+
+        self.writes = 0
+        self.overruns = 0
+
+    def acquire(self):
+        if not self.free:
+            self.overruns += 1
+            return None
+        return self.free.popleft()
+
+    def release(self, slot):
+        self.free.append(slot)
+
+    def fits(self, frame):
+        return frame.nbytes <= self.slot_bytes
+
+    def view(self, slot, shape, dtype=np.uint8):
+        """Array over a slot's memory, without copying"""
+        if not 0 <= slot < self.slots:
+            raise ValueError(f"Slot {slot} is outside a ring of {self.slots} slots")
+        if int(np.prod(shape)) * np.dtype(dtype).itemsize > self.slot_bytes:
+            raise ValueError(f"Shape {tuple(shape)} does not fit a {self.slot_bytes} byte slot")
+        return np.ndarray(shape, dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot, frame):
+        if not self.fits(frame):
+            raise ValueError(f"Frame of {frame.nbytes} bytes does not fit a {self.slot_bytes} byte slot")
+        np.copyto(self.view(slot, frame.shape, frame.dtype), frame)
+        self.writes += 1
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            # A view is still alive; the mapping goes away with the process
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "slots": self.slots,
+            "slot_bytes": self.slot_bytes,
+            "free_slots": len(self.free),
+            "writes": self.writes,
+            "overruns": self.overruns
+        }
+
+
+if __name__ == "__main__":
+    # Pickled ndarray transfer vs shared-memory slots for 96x96 face crops
+    # (what the inference path sends) and full 640x480 BGR frames, sent to a
+    # worker process paced at 30 fps and flat out
+    import multiprocessing
+    import time
+
+    FRAMES = 150
+
+    def pickled_worker(frames, acks):
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            sent, frame = item
+            acks.put((time.perf_counter() - sent, int(frame[0, 0, 0])))
+
+    def ring_worker(ring, shape, frames, acks):
+        # The forked worker inherits the shared mapping itself
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            sent, slot = item
+            frame = ring.view(slot, shape)
+            acks.put((time.perf_counter() - sent, int(frame[0, 0, 0]), slot))
+            del frame
+
+    def run(shape, mode, fps):
+        context = multiprocessing.get_context("fork")
+        frames, acks = context.Queue(), context.Queue()
+        ring = FrameRing(slots=16, slot_bytes=int(np.prod(shape))) if mode == "shared memory" else None
+        if ring:
+            worker = context.Process(target=ring_worker, args=(ring, shape, frames, acks))
+        else:
+            worker = context.Process(target=pickled_worker, args=(frames, acks))
+        worker.start()
+
+        frame = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+        latencies = []
+        cpu_start, start = time.process_time(), time.perf_counter()
+        for i in range(FRAMES):
+            if fps:
+                time.sleep(max(0.0, start + i / fps - time.perf_counter()))
+            if ring:
+                slot = ring.acquire()
+                while slot is None:
+                    # Overrun: wait for the worker to hand a slot back
+                    latency, _, done = acks.get()
+                    ring.release(done)
+                    latencies.append(latency)
+                    slot = ring.acquire()
+                ring.write(slot, frame)
+                frames.put((time.perf_counter(), slot))
+                while not acks.empty():
+                    latency, _, done = acks.get()
+                    ring.release(done)
+                    latencies.append(latency)
+            else:
+                frames.put((time.perf_counter(), frame))
+                while not acks.empty():
+                    latencies.append(acks.get()[0])
+        while len(latencies) < FRAMES:
+            ack = acks.get()
+            latencies.append(ack[0])
+            if ring:
+                ring.release(ack[2])
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        frames.put(None)
+        worker.join()
+        if ring:
+            ring.close()
+
+        latencies.sort()
+        pace = f"{fps} fps" if fps else "flat out"
+        print(f"{shape[1]}x{shape[0]} {mode:>13}, {pace:>8}: {FRAMES / elapsed:7.1f} frames/s, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:6.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.2f} ms, "
+              f"sender CPU {cpu / FRAMES * 1000:5.2f} ms/frame")
+
+    for shape in ((96, 96, 3), (480, 640, 3)):
+        for fps in (30, None):
+            for mode in ("pickled", "shared memory"):
+                run(shape, mode, fps)
+    ring = FrameRing()
+    print(f"default ring: {ring.slots} slots of {ring.slot_bytes} bytes, {ring.slots * ring.slot_bytes / 1024:.0f} KB")
+    ring.close()
@@ -0,0 +1,338 @@
+# backend/inference_server.py
+import asyncio
+import importlib
+import multiprocessing
+import os
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from emotion_batching import BatchScheduler
+from frame_ring import FrameRing
+
+# Hello, once per connection: frame ring name length and slot size, then the
+# name (empty when the client has no ring).
+# Request: request id, height, width, channels and frame ring slot, then the
+# raw uint8 face crop unless it was written to the slot (slot >= 0).
+# Response: request id, confidence, label length, then the UTF-8 label. A
+# negative confidence marks an error and the label is the error message.
+HELLO_HEADER = struct.Struct("!HI")
+REQUEST_HEADER = struct.Struct("!IHHBi")
+RESPONSE_HEADER = struct.Struct("!IfB")
+
+
+def socket_path():
+    return os.getenv("INFERENCE_SOCKET", "/tmp/mannmitra-inference.sock")
+
+
+def load_detector():
+    module = importlib.import_module(os.getenv("INFERENCE_DETECTOR", "emotion_detection"))
+    return module.EmotionDetector()
+
+
+def serve_forever(sock, build_detector=load_detector):
+    """Run one inference process on an already listening socket"""
+    detector = build_detector()
+    try:
+        asyncio.run(_serve(sock, detector))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serve(sock, detector):
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+    # Requests from every connected API worker share one batcher
+    batcher = BatchScheduler(detector.classify_faces, executor)
+
+    async def respond(writer, request_id, face):
+        try:
+            emotion, confidence = await batcher.submit(face)
+        except Exception as e:
+            print(f"Inference error: {e}")
+            emotion, confidence = "neutral", 0.5
+        reply(writer, request_id, emotion, confidence)
+
+    def reply(writer, request_id, label, confidence):
+        if not writer.is_closing():
+            label = label.encode()[:255]
+            writer.write(RESPONSE_HEADER.pack(request_id, confidence, len(label)) + label)
+
+    async def handle(reader, writer):
+        tasks = set()
+        ring = None
+        try:
+            name_length, slot_bytes = HELLO_HEADER.unpack(await reader.readexactly(HELLO_HEADER.size))
+            if name_length:
+                name = (await reader.readexactly(name_length)).decode(errors="replace")
+                try:
+                    ring = FrameRing(slot_bytes=slot_bytes, name=name)
+                except (OSError, ValueError) as e:
+                    # Slot requests on this connection get error replies
+                    print(f"Error attaching frame ring {name}: {e}")
+            
+            while True:
+                header = await reader.readexactly(REQUEST_HEADER.size)
+                request_id, height, width, channels, slot = REQUEST_HEADER.unpack(header)
+                if slot >= 0:
+                    # Read in place; the client keeps the slot until it gets the response
+                    try:
+                        if ring is None:
+                            raise ValueError("Frame ring slot sent but no frame ring is attached")
+                        face = ring.view(slot, (height, width, channels))
+                    except ValueError as e:
+                        reply(writer, request_id, str(e), -1.0)
+                        continue
+                else:
+                    payload = await reader.readexactly(height * width * channels)
+                    face = np.frombuffer(payload, np.uint8).reshape(height, width, channels)
+                # Keep reading while earlier requests wait for their batch
+                task = asyncio.create_task(respond(writer, request_id, face))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            if ring is not None:
+                ring.close()
+
+    server = await asyncio.start_unix_server(handle, sock=sock)
+    async with server:
+        await server.serve_forever()
+
+
+def start_server(path=None, processes=None, build_detector=load_detector):
+    """Bind the socket and fork the inference processes that share it
+
+    Each process loads its own copy of the models after the fork, so
+    INFERENCE_PROCESSES trades memory for throughput.
+    """
+    path = path or socket_path()
+    processes = processes or int(os.getenv("INFERENCE_PROCESSES", "1"))
+    if os.path.exists(path):
+        os.unlink(path)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(128)
+
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=serve_forever, args=(sock, build_detector), name=f"inference-{i}", daemon=True)
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    sock.close()
+    return workers
+
+
+class InferenceClient:
+    """Sends face crops to the inference sidecar over its Unix socket
+
+    Has the same submit()/stats() interface as BatchScheduler, so the frame
+    processor can use either. Requests are pipelined over one connection per
+    API worker; the sidecar does the batching. Crops are written to a shared
+    memory FrameRing and only the slot index is sent, falling back to
+    sending the pixels when the ring is full (FRAME_RING_SLOTS=0 disables it).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or socket_path()
+        self.ring = FrameRing() if int(os.getenv("FRAME_RING_SLOTS", "16")) > 0 else None
+        self.pending = {}
+        self.slots = {}
+        self.next_id = 0
+        self.reader = None
+        self.writer = None
+        self._lock = asyncio.Lock()
+
+        self.requests = 0
+        self.failures = 0
+        self.connections = 0
+
+    async def _connect(self):
+        async with self._lock:
+            if self.writer is None or self.writer.is_closing():
+                self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+                name = self.ring.name.encode() if self.ring is not None else b""
+                slot_bytes = self.ring.slot_bytes if self.ring is not None else 0
+                self.writer.write(HELLO_HEADER.pack(len(name), slot_bytes) + name)
+                self.connections += 1
+                asyncio.create_task(self._read_responses(self.reader))
+
+    async def submit(self, face):
+        """Classify one face crop and return (emotion, confidence)"""
+        await self._connect()
+        face = np.ascontiguousarray(face, dtype=np.uint8)
+        height, width = face.shape[:2]
+        channels = face.shape[2] if face.ndim == 3 else 1
+
+        self.next_id = (self.next_id + 1) % 2 ** 32
+        request_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.requests += 1
+
+        slot = -1
+        if self.ring is not None and self.ring.fits(face):
+            slot = self.ring.acquire()
+            if slot is None:
+                slot = -1
+            else:
+                self.ring.write(slot, face)
+                # Released when the response arrives, even if this request is cancelled
+                self.slots[request_id] = slot
+        try:
+            self.writer.write(REQUEST_HEADER.pack(request_id, height, width, channels, slot))
+            if slot < 0:
+                self.writer.write(face.data)
+            await self.writer.drain()
+            return await future
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def _read_responses(self, reader):
+        try:
+            while True:
+                header = await reader.readexactly(RESPONSE_HEADER.size)
+                request_id, confidence, label_length = RESPONSE_HEADER.unpack(header)
+                emotion = (await reader.readexactly(label_length)).decode()
+                self._release_slot(request_id)
+                future = self.pending.get(request_id)
+                if future is not None and not future.done():
+                    if confidence < 0:
+                        self.failures += 1
+                        future.set_exception(RuntimeError(f"Inference sidecar error: {emotion}"))
+                    else:
+                        future.set_result((emotion, confidence))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            print(f"Inference sidecar connection lost: {e}")
+        finally:
+            if reader is self.reader:
+                # Fail what was in flight; the next submit reconnects
+                for future in list(self.pending.values()):
+                    if not future.done():
+                        self.failures += 1
+                        future.set_exception(ConnectionError("Inference sidecar connection lost"))
+                for request_id in list(self.slots):
+                    self._release_slot(request_id)
+                self.writer.close()
+                self.writer = None
+
+    def _release_slot(self, request_id):
+        slot = self.slots.pop(request_id, None)
+        if slot is not None:
+            self.ring.release(slot)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.ring is not None:
+            self.ring.close()
+
+    def stats(self):
+        return {
+            "mode": "sidecar",
+            "socket": self.path,
+            "connected": self.writer is not None and not self.writer.is_closing(),
+            "connections": self.connections,
+            "requests": self.requests,
+            "in_flight": len(self.pending),
+            "failures": self.failures,
+            "frame_ring": self.ring.stats() if self.ring is not None else None
+        }
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if sys.argv[1:] != ["benchmark"]:
+        # python inference_server.py: serve until interrupted
+        workers = start_server()
+        print(f"Inference sidecar on {socket_path()} with {len(workers)} process(es)")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    # python inference_server.py benchmark: total memory and throughput for 1, 2,
+    # 4 and 8 API workers, each loading the model vs sharing the sidecar. The
+    # synthetic model is a 56 MB weight matrix applied to each face crop.
+    FACE_SHAPE = (96, 96, 3)
+    CLIENTS_PER_WORKER = 8
+    FRAMES_PER_CLIENT = 25
+
+    class SyntheticDetector:
+        def __init__(self):
+            self.weights = np.random.default_rng(0).random((int(np.prod(FACE_SHAPE)), 512), dtype=np.float32)
+
+        def classify_faces(self, faces):
+            inputs = np.stack([face.reshape(-1) for face in faces]).astype(np.float32) / 255.0
+            scores = inputs @ self.weights
+            return [("neutral", float(s.max() / s.sum())) for s in scores]
+
+    def pss_mb(pid):
+        # Proportional set size counts pages shared after fork only once overall
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+    def api_worker(path, results, done):
+        async def run():
+            if path:
+                scheduler = InferenceClient(path)
+            else:
+                detector = SyntheticDetector()
+                scheduler = BatchScheduler(detector.classify_faces, ThreadPoolExecutor(max_workers=1))
+            face = np.random.default_rng().integers(0, 256, FACE_SHAPE, dtype=np.uint8)
+            await scheduler.submit(face)
+
+            async def client():
+                for _ in range(FRAMES_PER_CLIENT):
+                    await scheduler.submit(face)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(CLIENTS_PER_WORKER)))
+            elapsed = time.perf_counter() - start
+            if path:
+                scheduler.close()
+            return elapsed
+
+        elapsed = asyncio.run(run())
+        results.put((os.getpid(), elapsed, pss_mb(os.getpid())))
+        done.wait()
+
+    context = multiprocessing.get_context("fork")
+    path = "/tmp/mannmitra-inference-benchmark.sock"
+    for mode in ("in-process", "sidecar"):
+        for api_workers in (1, 2, 4, 8):
+            servers = start_server(path, 1, SyntheticDetector) if mode == "sidecar" else []
+            if servers:
+                time.sleep(1.0)
+            results, done = context.Queue(), context.Event()
+            workers = [context.Process(target=api_worker, args=(path if servers else None, results, done))
+                       for _ in range(api_workers)]
+            for worker in workers:
+                worker.start()
+            reports = [results.get() for _ in workers]
+            server_pss = sum(pss_mb(server.pid) for server in servers)
+            done.set()
+            for worker in workers:
+                worker.join()
+            for server in servers:
+                server.terminate()
+                server.join()
+
+            frames = api_workers * CLIENTS_PER_WORKER * FRAMES_PER_CLIENT
+            elapsed = max(report[1] for report in reports)
+            total_pss = server_pss + sum(report[2] for report in reports)
+            print(f"{mode:>10}, {api_workers} API worker(s): {frames / elapsed:8.1f} frames/s, "
+                  f"total PSS {total_pss:7.1f} MB")
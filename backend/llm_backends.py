@@ -0,0 +1,132 @@
+# backend/llm_backends.py
+import asyncio
+import json
+import os
+import time
+
+# Used when LLM_BACKEND=recorded and no LLM_RECORDINGS file is given.
+# Latencies are typical round trips for the hosted models.
+DEFAULT_RECORDINGS = {
+    "responses": [
+        {
+            "contains": '"reply"',
+            "text": '{"reply": "I hear you. It sounds like a lot is weighing on you right now. Would you like to talk about it?", "crisis": false, "mood": "stressed"}',
+            "latency_ms": 1400
+        },
+        {
+            "contains": "signs of mental health crisis",
+            "text": "OK",
+            "latency_ms": 700
+        },
+        {
+            "contains": "determine the primary mood",
+            "text": "stressed",
+            "latency_ms": 600
+        }
+    ],
+    "default": {
+        "text": "I hear you. It sounds like a lot is weighing on you right now. Would you like to talk about it?",
+        "latency_ms": 1200
+    }
+}
+
+
+class RecordedResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class RecordedStream:
+    """Async iterator over a recorded response, split into word chunks"""
+
+    def __init__(self, text, latency_ms):
+        self.words = text.split(" ")
+        self.latency = latency_ms / 1000
+
+    async def __aiter__(self):
+        # Time to first token is roughly a third of the full response time
+        await asyncio.sleep(self.latency / 3)
+        step = self.latency * 2 / 3 / max(len(self.words), 1)
+        for i, word in enumerate(self.words):
+            if i:
+                await asyncio.sleep(step)
+            yield RecordedResponse(word if i == 0 else " " + word)
+
+
+class RecordedModel:
+    """Replays recorded model responses with their recorded latency
+
+    Stands in for the Gemini GenerativeModel and the Vertex text model so
+    the chat pipeline can be run and benchmarked offline. The first
+    recording whose "contains" string appears in the prompt is returned.
+    """
+
+    def __init__(self, path=None):
+        path = path or os.getenv("LLM_RECORDINGS")
+        if path:
+            with open(path) as f:
+                recordings = json.load(f)
+        else:
+            recordings = DEFAULT_RECORDINGS
+        self.responses = recordings.get("responses", [])
+        self.default = recordings.get("default", DEFAULT_RECORDINGS["default"])
+        self.calls = 0
+
+    def _lookup(self, prompt):
+        self.calls += 1
+        for recording in self.responses:
+            if recording.get("contains", "") in prompt:
+                return recording
+        return self.default
+
+    def generate_content(self, prompt, **kwargs):
+        recording = self._lookup(prompt)
+        time.sleep(recording.get("latency_ms", 0) / 1000)
+        return RecordedResponse(recording["text"])
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        recording = self._lookup(prompt)
+        if stream:
+            return RecordedStream(recording["text"], recording.get("latency_ms", 0))
+        await asyncio.sleep(recording.get("latency_ms", 0) / 1000)
+        return RecordedResponse(recording["text"])
+
+    def predict(self, prompt, **kwargs):
+        return self.generate_content(prompt)
+
+
+def use_recorded_backend():
+    return os.getenv("LLM_BACKEND", "google").lower() == "recorded"
+
+
+if __name__ == "__main__":
+    # p50/p99 latency of the original sequential /chat flow (reply, LLM
+    # crisis check, crisis reply if flagged, then uncached mood analysis)
+    # vs the combined pipeline, replaying recorded responses
+    os.environ["LLM_BACKEND"] = "recorded"
+    from chatbot import ChatAssistant
+    from metrics import LatencyTracker
+    from mood_analysis import MoodAnalyzer
+
+    chat_assistant = ChatAssistant()
+    mood_analyzer = MoodAnalyzer()
+    latency = LatencyTracker()
+    messages = ["I'm so stressed with work", "I can't sleep and everything feels heavy"] * 10
+
+    async def main():
+        for message in messages:
+            start = time.perf_counter()
+            chat_assistant.generate_reply(message)
+            if chat_assistant.classify_crisis(message):
+                chat_assistant.generate_crisis_reply(message)
+            mood_analyzer._predict_mood(message)
+            latency.record("sequential", time.perf_counter() - start)
+
+        for message in messages:
+            start = time.perf_counter()
+            await chat_assistant.respond(message, "benchmark", mood_analyzer)
+            latency.record("pipeline", time.perf_counter() - start)
+
+    asyncio.run(main())
+    for stage, stats in latency.snapshot().items():
+        print(f"{stage:>10}: p50 {stats['p50_ms']:8.1f} ms, p99 {stats['p99_ms']:8.1f} ms")
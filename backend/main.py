@@ -1,4 +1,5 @@
 # backend/main.py
+from components import LazyComponent, is_loaded, load, profiler, warm_up
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
@@ -6,24 +7,17 @@ from fastapi.staticfiles import StaticFiles
 import asyncio
 import json
 import base64
-import cv2
-import numpy as np
 from datetime import datetime, timedelta
 import uuid
-import io
 import os
 import tempfile
+import time
 
 # Import modules
-from emotion_detection_simple import EmotionDetector
-from chatbot import ChatAssistant
-from mood_analysis import MoodAnalyzer
-from music_recommendation import MusicRecommender
 from anonymous_chat import ChatManager
-from emergency import EmergencySystem
-from database import DatabaseManager
-from voice_processing import VoiceProcessor
-from auth import AuthManager
+from frame_protocol import FrameProtocolError, decode_frame
+from sentence_chunker import SentenceChunker
+from speech_streaming import MAX_SAMPLE_RATE, MIN_SAMPLE_RATE
 
 app = FastAPI(title="MannMitra API", version="1.0.0")
 
@@ -36,16 +30,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize components
-emotion_detector = EmotionDetector()
-chat_assistant = ChatAssistant()
-mood_analyzer = MoodAnalyzer()
-music_recommender = MusicRecommender()
-chat_manager = ChatManager()
-emergency_system = EmergencySystem()
-voice_processor = VoiceProcessor()
-db = DatabaseManager()
-auth_manager = AuthManager()
+# Initialize components. Heavy subsystems are imported and built on first
+# use (or by the background warm-up) so the API starts serving quickly.
+# Handlers await load() for what they use, and builds resolve their
+# dependencies on the building thread, never on the event loop.
+emotion_detector = LazyComponent("emotion_detector", "emotion_detection_simple", lambda m: m.EmotionDetector())
+mood_analyzer = LazyComponent("mood_analyzer", "mood_analysis", lambda m: m.MoodAnalyzer())
+emergency_system = LazyComponent("emergency_system", "emergency", lambda m: m.EmergencySystem())
+voice_processor = LazyComponent("voice_processor", "voice_processing", lambda m: m.VoiceProcessor())
+db = LazyComponent("db", "database", lambda m: m.create_database())
+chat_manager = ChatManager(db=db)
+music_recommender = LazyComponent("music_recommender", "music_recommendation", lambda m: m.MusicRecommender(db.resolve()))
+chat_assistant = LazyComponent("chat_assistant", "chatbot", lambda m: m.ChatAssistant(db.resolve(), mood_analyzer.resolve().crisis_screen))
+auth_manager = LazyComponent("auth_manager", "auth", lambda m: m.AuthManager())
+mood_cache = LazyComponent("mood_cache", "mood_cache", lambda m: m.MoodHistoryCache(mood_analyzer.resolve()))
+emotion_rollup = LazyComponent("emotion_rollup", "emotion_rollup", lambda m: m.EmotionRollup(db.resolve(), on_record=mood_cache.resolve().append))
+frame_processor = LazyComponent("frame_processor", "frame_processing", lambda m: m.FrameProcessor(emotion_detector.resolve(), emotion_rollup.resolve()))
+
+# Warm-up order: what the first requests are most likely to need
+WARMUP_ORDER = [db, mood_analyzer, chat_assistant, mood_cache, emotion_detector, emotion_rollup,
+                frame_processor, voice_processor, auth_manager, music_recommender, emergency_system]
+
+MEDITATION_GUIDES = {
+    "breathing": {
+        "title": "Deep Breathing Exercise",
+        "description": "A simple breathing exercise to reduce stress and anxiety",
+        "steps": [
+            "Find a comfortable seated position",
+            "Close your eyes and take a deep breath in for 4 seconds",
+            "Hold your breath for 4 seconds",
+            "Exhale slowly for 6 seconds",
+            "Repeat for 5-10 cycles"
+        ],
+        "duration": 300  # 5 minutes
+    },
+    "mindfulness": {
+        "title": "5-Minute Mindfulness Meditation",
+        "description": "A short mindfulness practice to center yourself",
+        "steps": [
+            "Sit comfortably with your eyes closed",
+            "Focus on your breath without trying to change it",
+            "Notice thoughts as they arise without judgment",
+            "Gently return focus to your breath",
+            "Expand awareness to sounds and sensations around you"
+        ],
+        "duration": 300
+    }
+}
+
+# Spoken often enough to synthesize ahead of time: the chat fallback reply
+# and every meditation step
+SPEECH_PREWARM = ["I'm here to listen. How are you feeling today?"] + [
+    text for guide in MEDITATION_GUIDES.values() for text in [guide["title"]] + guide["steps"]
+]
 
 # Mount static files for serving frontend
 app.mount("/static", StaticFiles(directory="frontend/build/static"), name="static")
@@ -59,6 +96,7 @@ async def serve_frontend():
 # Authentication endpoints
 @app.post("/auth/register")
 async def register_user(user_data: dict):
+    await load(auth_manager)
     try:
         user = auth_manager.register_user(
             user_data.get("email"),
@@ -72,6 +110,7 @@ async def register_user(user_data: dict):
 
 @app.post("/auth/login")
 async def login_user(credentials: dict):
+    await load(auth_manager)
     try:
         user = auth_manager.login_user(
             credentials.get("email"),
@@ -83,6 +122,7 @@ async def login_user(credentials: dict):
 
 @app.post("/auth/logout")
 async def logout_user(user_data: dict):
+    await load(auth_manager)
     try:
         auth_manager.logout_user(user_data.get("user_id"))
         return JSONResponse(content={"message": "Logout successful"})
@@ -93,48 +133,73 @@ async def logout_user(user_data: dict):
 @app.websocket("/ws/emotion")
 async def websocket_emotion(websocket: WebSocket):
     await websocket.accept()
+    await load(frame_processor, emergency_system)
     user_id = "anonymous"
+
+    async def send_result(user_id, emotion, confidence, sequence):
+        # Send back emotion data
+        result = {
+            "emotion": emotion,
+            "confidence": confidence,
+            "timestamp": datetime.now().isoformat()
+        }
+        if sequence is not None:
+            result["sequence"] = sequence
+        await websocket.send_json(result)
+        
+        # Check for crisis situation
+        if emotion in ['sad', 'angry', 'fear'] and confidence > 0.7:
+            crisis_level = emergency_system.assess_crisis(user_id, emotion, confidence)
+            if crisis_level > 0.8:
+                await websocket.send_json({
+                    "alert": "crisis_detected",
+                    "message": "We've detected you might need help. Would you like to talk to someone?",
+                    "level": crisis_level
+                })
+
+    # Decoding, inference and storage run on the frame worker pool;
+    # frames arriving faster than they can be processed replace older ones
+    stream = frame_processor.open_stream(send_result)
     try:
         while True:
-            data = await websocket.receive_text()
-            data = json.loads(data)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            
+            # Binary frames: fixed header followed by raw JPEG/WebP bytes
+            if message.get("bytes") is not None:
+                try:
+                    user_id, sequence, _, image = decode_frame(message["bytes"])
+                except FrameProtocolError as e:
+                    await websocket.send_json({"error": str(e)})
+                    continue
+                stream.submit(user_id, image, sequence)
+                continue
+            
+            # JSON frames with a base64 data URL (original protocol)
+            data = json.loads(message["text"])
             
             if 'user_id' in data:
                 user_id = data['user_id']
             
             if 'image' in data:
-                # Process image for emotion detection
-                image_data = data['image'].split(',')[1]
-                image_bytes = base64.b64decode(image_data)
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                # Detect emotion
-                emotion, confidence = emotion_detector.detect_emotion(frame)
-                
-                # Store emotion data
-                db.store_emotion_data(user_id, emotion, confidence)
-                
-                # Send back emotion data
-                await websocket.send_json({
-                    "emotion": emotion,
-                    "confidence": float(confidence),
-                    "timestamp": datetime.now().isoformat()
-                })
-                
-                # Check for crisis situation
-                if emotion in ['sad', 'angry', 'fear'] and confidence > 0.7:
-                    crisis_level = emergency_system.assess_crisis(user_id, emotion, confidence)
-                    if crisis_level > 0.8:
-                        await websocket.send_json({
-                            "alert": "crisis_detected",
-                            "message": "We've detected you might need help. Would you like to talk to someone?",
-                            "level": crisis_level
-                        })
+                stream.submit(user_id, data['image'].split(',')[1], data.get('sequence'))
     except WebSocketDisconnect:
         print("Client disconnected from emotion detection")
     except Exception as e:
         print(f"Error in emotion detection: {e}")
+    finally:
+        await stream.close()
+
+@app.get("/metrics/emotion")
+async def get_emotion_metrics():
+    await load(frame_processor, emotion_rollup)
+    return JSONResponse(content=dict(frame_processor.stats(), rollup=emotion_rollup.stats()))
+
+@app.get("/metrics/database")
+async def get_database_metrics():
+    await load(db)
+    return JSONResponse(content=db.write_stats())
 
 # Chat endpoints
 @app.post("/chat")
@@ -142,76 +207,176 @@ async def chat_endpoint(message: dict):
     user_id = message.get("user_id", "anonymous")
     user_message = message.get("message", "")
     voice_data = message.get("voice", None)
+    await load(chat_assistant, mood_analyzer, db)
     
     # Process voice if provided
     if voice_data:
+        await load(voice_processor)
         user_message = voice_processor.speech_to_text(voice_data)
     
-    # Get AI response
-    response = chat_assistant.get_response(user_message, user_id)
-    
-    # Analyze mood from text
-    mood = mood_analyzer.analyze_text(user_message)
+    # Get AI response, crisis flag and mood from text in one pipeline
+    result = await chat_assistant.respond(user_message, user_id, mood_analyzer)
+    response = result["response"]
+    mood = result["mood"]
     
     # Store conversation
-    db.store_conversation(user_id, user_message, response, mood)
+    await db.store_conversation(user_id, user_message, response, mood, crisis=result["crisis"])
     
     # Convert to speech if requested
     speech_data = None
     if message.get("voice_response", False):
-        speech_data = voice_processor.text_to_speech(response)
+        await load(voice_processor)
+        audio = await asyncio.to_thread(voice_processor.text_to_speech, response)
+        if audio:
+            speech_data = base64.b64encode(audio).decode('utf-8')
     
     return JSONResponse(content={
         "response": response,
         "mood": mood,
+        "crisis": result["crisis"],
         "speech_data": speech_data,
         "user_message": user_message
     })
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(message: dict):
+    """Server-sent events: token, audio (per sentence), crisis and done"""
+    user_id = message.get("user_id", "anonymous")
+    user_message = message.get("message", "")
+    voice_data = message.get("voice", None)
+    voice_response = message.get("voice_response", False)
+    await load(chat_assistant, mood_analyzer, db)
+    if voice_data or voice_response:
+        await load(voice_processor)
+    
+    # Process voice if provided
+    if voice_data:
+        user_message = await asyncio.to_thread(voice_processor.speech_to_text, voice_data)
+    
+    async def events():
+        chunker = SentenceChunker()
+        speech_tasks = []
+        
+        def synthesize(sentences):
+            for sentence in sentences:
+                speech_tasks.append(asyncio.create_task(
+                    asyncio.to_thread(voice_processor.text_to_speech, sentence)
+                ))
+        
+        async def finished_audio(wait=False):
+            # Emit synthesized sentences in order, as soon as they are ready
+            while speech_tasks and (wait or speech_tasks[0].done()):
+                audio = await speech_tasks.pop(0)
+                if audio:
+                    yield sse_event("audio", {"speech_data": base64.b64encode(audio).decode('utf-8')})
+        
+        async for kind, data in chat_assistant.stream_response(user_message, user_id, mood_analyzer):
+            if kind == "token":
+                yield sse_event("token", {"text": data})
+                if voice_response:
+                    synthesize(chunker.feed(data))
+                    async for event in finished_audio():
+                        yield event
+            elif kind == "crisis":
+                # The crisis reply replaces everything streamed so far
+                chunker = SentenceChunker()
+                for task in speech_tasks:
+                    task.cancel()
+                speech_tasks.clear()
+                yield sse_event("crisis", {"message": "Replacing reply with crisis support"})
+            else:
+                if voice_response:
+                    synthesize(chunker.flush())
+                    async for event in finished_audio(wait=True):
+                        yield event
+                
+                # Persist only once the reply is complete
+                await db.store_conversation(user_id, user_message, data["response"], data["mood"], crisis=data["crisis"])
+                yield sse_event("done", dict(data, user_message=user_message))
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 # Music recommendation endpoint
 @app.get("/music/{mood}")
 async def get_music(mood: str, user_id: str = None):
-    playlists = music_recommender.get_playlists(mood, user_id)
+    await load(music_recommender)
+    playlists = await music_recommender.get_playlists(mood, user_id)
     return JSONResponse(content={"playlists": playlists})
 
+@app.post("/music/click")
+async def record_music_click(click: dict):
+    user_id = click.get("user_id")
+    playlist = click.get("playlist") or {}
+    if not user_id or not playlist.get("url"):
+        raise HTTPException(status_code=400, detail="user_id and playlist are required")
+    await load(music_recommender)
+    await music_recommender.record_click(user_id, click.get("mood"), playlist)
+    return JSONResponse(content={"status": "click_recorded"})
+
 # Anonymous chat endpoints
 @app.post("/chat/join")
-async def join_chat_room(user_id: str):
-    room_id = chat_manager.join_chat(user_id)
+async def join_chat_room(user_id: str, topic: str = None, language: str = None):
+    # Optional topic/language keep users in separate matchmaking pools
+    room_id = await chat_manager.join_chat(user_id, topic, language)
     return JSONResponse(content={"room_id": room_id})
 
+@app.get("/chat/rooms")
+async def list_chat_rooms(limit: int = 50, cursor: str = None):
+    await load(db)
+    return JSONResponse(content=await chat_manager.list_rooms(limit, cursor))
+
+@app.get("/chat/rooms/{room_id}/history")
+async def get_chat_history(room_id: str, limit: int = 50, before: str = None):
+    # before is the next_cursor of the previous page
+    try:
+        if before:
+            datetime.fromisoformat(before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid history cursor")
+    await load(db)
+    return JSONResponse(content=await chat_manager.history(room_id, limit, before))
+
 @app.websocket("/ws/chat/{room_id}")
 async def websocket_chat(websocket: WebSocket, room_id: str):
     await websocket.accept()
+    await load(db)
     user_id = "anonymous"
+    connection = await chat_manager.connect(room_id, websocket)
     try:
         while True:
             data = await websocket.receive_text()
             message_data = json.loads(data)
             user_id = message_data.get("user_id", user_id)
             message_text = message_data.get("message", "")
+            timestamp = datetime.now()
             
             # Store message in database
-            db.store_anonymous_message(room_id, user_id, message_text)
+            await db.store_anonymous_message(room_id, user_id, message_text, timestamp)
             
             # Broadcast to all users in room
             await chat_manager.broadcast_message(room_id, {
                 "user_id": user_id,
                 "message": message_text,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": timestamp.isoformat(),
                 "type": "message"
             })
     except WebSocketDisconnect:
-        chat_manager.leave_chat(room_id, user_id)
+        await chat_manager.leave_chat(room_id, user_id)
     except Exception as e:
         print(f"Error in chat: {e}")
+    finally:
+        await chat_manager.disconnect(connection)
 
 # Emergency contact endpoint
 @app.post("/emergency/contacts")
 async def add_emergency_contact(contact: dict):
     user_id = contact.get("user_id")
     contact_info = contact.get("contact_info")
-    success = db.add_emergency_contact(user_id, contact_info)
+    await load(db)
+    success = await db.add_emergency_contact(user_id, contact_info)
     if success:
         return JSONResponse(content={"status": "contact_added"})
     else:
@@ -219,28 +384,49 @@ async def add_emergency_contact(contact: dict):
 
 @app.get("/emergency/contacts/{user_id}")
 async def get_emergency_contacts(user_id: str):
-    contacts = db.get_emergency_contacts(user_id)
+    await load(db)
+    contacts = await db.get_emergency_contacts(user_id)
     return JSONResponse(content={"contacts": contacts})
 
 @app.post("/emergency/alert")
 async def send_emergency_alert(alert: dict):
     user_id = alert.get("user_id")
     message = alert.get("message", "I need help")
+    await load(emergency_system)
     emergency_system.send_alert(user_id, message)
     return JSONResponse(content={"status": "alert_sent"})
 
 # Mood tracking endpoints
 @app.get("/mood/history/{user_id}")
 async def get_mood_history(user_id: str, days: int = 30):
-    history = db.get_mood_history(user_id, days)
-    analysis = mood_analyzer.analyze_trends(history)
-    return JSONResponse(content={"history": history, "analysis": analysis})
+    await load(mood_cache, db)
+    entry = mood_cache.get(user_id, days)
+    if entry is None:
+        entry = mood_cache.put(user_id, days, await db.get_mood_history(user_id, days))
+    # Summarising the distribution runs the text model
+    analysis = await asyncio.to_thread(mood_cache.analysis, entry)
+    return JSONResponse(content={"history": list(entry['records']), "analysis": analysis})
+
+@app.get("/metrics/chat")
+async def get_chat_metrics():
+    await load(chat_assistant)
+    return JSONResponse(content={
+        "latency": chat_assistant.latency.snapshot(),
+        "sessions": chat_assistant.sessions.stats(),
+        "crisis_screen": chat_assistant.crisis_screen.stats()
+    })
+
+@app.get("/metrics/mood")
+async def get_mood_cache_metrics():
+    await load(mood_cache, mood_analyzer)
+    return JSONResponse(content=dict(mood_cache.stats(), text_cache=mood_analyzer.text_cache.stats()))
 
 # Voice processing endpoints
 @app.post("/voice/process")
 async def process_voice(voice_data: dict):
     user_id = voice_data.get("user_id", "anonymous")
     audio_data = voice_data.get("audio")
+    await load(voice_processor, mood_analyzer)
     
     text = voice_processor.speech_to_text(audio_data)
     mood = mood_analyzer.analyze_text(text)
@@ -249,43 +435,94 @@ async def process_voice(voice_data: dict):
 
 @app.post("/voice/synthesize")
 async def synthesize_voice(text: str = Form(...)):
-    audio_data = voice_processor.text_to_speech(text)
-    if audio_data:
-        return StreamingResponse(io.BytesIO(base64.b64decode(audio_data)), media_type="audio/mpeg")
+    await load(voice_processor)
+    # Streamed from the mmap'd cache file, no base64 round trip
+    audio_stream = await asyncio.to_thread(voice_processor.stream_speech, text)
+    if audio_stream is not None:
+        return StreamingResponse(audio_stream, media_type="audio/mpeg")
     else:
         raise HTTPException(status_code=400, detail="Failed to synthesize speech")
 
+@app.websocket("/ws/voice")
+async def websocket_voice(websocket: WebSocket, user_id: str = "anonymous", sample_rate: int = 16000,
+                          voice_response: bool = False):
+    """Streaming speech to chat
+
+    Binary frames carry raw 16-bit mono PCM and a {"type": "end"} text frame
+    ends the audio. Sends interim and final transcripts; each final
+    transcript goes straight into the chat pipeline, whose token, crisis and
+    done messages follow, then the spoken reply as a binary MP3 frame if
+    voice_response is set.
+    """
+    await websocket.accept()
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        await websocket.send_json({"type": "error", "message": f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}"})
+        await websocket.close(code=1008)
+        return
+    await load(voice_processor, chat_assistant, mood_analyzer, db)
+    stream = voice_processor.open_stream(sample_rate)
+    if stream is None:
+        await websocket.send_json({"type": "error", "message": "Voice processing is not available at the moment."})
+        await websocket.close(code=1011)
+        return
+    
+    async def receive_audio():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    stream.feed(message["bytes"])
+                elif message.get("text") and json.loads(message["text"]).get("type") == "end":
+                    break
+        except Exception as e:
+            print(f"Error receiving voice stream: {e}")
+        finally:
+            stream.close()
+    
+    async def reply(transcript, speech_end):
+        first_token = True
+        async for kind, data in chat_assistant.stream_response(transcript, user_id, mood_analyzer):
+            if kind == "token":
+                if first_token:
+                    voice_processor.latency.record("end_of_speech_to_first_token", time.perf_counter() - speech_end)
+                    first_token = False
+                await websocket.send_json({"type": "token", "text": data})
+            elif kind == "crisis":
+                await websocket.send_json({"type": "crisis", "message": "Replacing reply with crisis support"})
+            else:
+                voice_processor.latency.record("end_of_speech_to_reply", time.perf_counter() - speech_end)
+                await db.store_conversation(user_id, transcript, data["response"], data["mood"], crisis=data["crisis"])
+                await websocket.send_json(dict(data, type="done", user_message=transcript))
+                if voice_response:
+                    audio = await asyncio.to_thread(voice_processor.text_to_speech, data["response"])
+                    if audio:
+                        await websocket.send_bytes(audio)
+    
+    receiver = asyncio.create_task(receive_audio())
+    try:
+        async for result in stream:
+            transcript = result["transcript"].strip()
+            if not result["final"]:
+                await websocket.send_json({"type": "interim", "transcript": transcript})
+                continue
+            await websocket.send_json({"type": "final", "transcript": transcript})
+            if transcript:
+                await reply(transcript, result["at"])
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Error in voice stream: {e}")
+    finally:
+        receiver.cancel()
+        stream.close()
+
 # Meditation and exercises endpoints
 @app.get("/meditation/{type}")
 async def get_meditation_guide(type: str):
-    guides = {
-        "breathing": {
-            "title": "Deep Breathing Exercise",
-            "description": "A simple breathing exercise to reduce stress and anxiety",
-            "steps": [
-                "Find a comfortable seated position",
-                "Close your eyes and take a deep breath in for 4 seconds",
-                "Hold your breath for 4 seconds",
-                "Exhale slowly for 6 seconds",
-                "Repeat for 5-10 cycles"
-            ],
-            "duration": 300  # 5 minutes
-        },
-        "mindfulness": {
-            "title": "5-Minute Mindfulness Meditation",
-            "description": "A short mindfulness practice to center yourself",
-            "steps": [
-                "Sit comfortably with your eyes closed",
-                "Focus on your breath without trying to change it",
-                "Notice thoughts as they arise without judgment",
-                "Gently return focus to your breath",
-                "Expand awareness to sounds and sensations around you"
-            ],
-            "duration": 300
-        }
-    }
-    
-    guide = guides.get(type, guides["breathing"])
+    guide = MEDITATION_GUIDES.get(type, MEDITATION_GUIDES["breathing"])
     return JSONResponse(content=guide)
 
 @app.get("/exercises")
@@ -344,10 +581,64 @@ async def get_therapist_recommendations(user_id: str):
     ]
     
     # In a real implementation, we would match based on user preferences and needs
-    user_profile = db.get_user_profile(user_id)
+    await load(db)
+    user_profile = await db.get_user_profile(user_id)
     
     return JSONResponse(content={"therapists": therapists})
 
+@app.get("/metrics/music")
+async def get_music_metrics():
+    await load(music_recommender)
+    return JSONResponse(content=music_recommender.stats())
+
+@app.get("/metrics/voice")
+async def get_voice_metrics():
+    await load(voice_processor)
+    return JSONResponse(content={
+        "latency": voice_processor.latency.snapshot(),
+        "streams": {
+            "active": voice_processor.active_streams,
+            "max": voice_processor.max_streams,
+            "rejected": voice_processor.rejected_streams
+        }
+    })
+
+@app.get("/metrics/tts")
+async def get_tts_metrics():
+    await load(voice_processor)
+    return JSONResponse(content=voice_processor.audio_cache.stats())
+
+@app.get("/metrics/rooms")
+async def get_room_metrics():
+    return JSONResponse(content=chat_manager.stats())
+
+@app.get("/metrics/startup")
+async def get_startup_metrics():
+    return JSONResponse(content=profiler.report())
+
+@app.on_event("startup")
+async def start_workers():
+    profiler.mark_ready()
+    
+    def warmed_up():
+        print(f"Startup profile: {json.dumps(profiler.report())}")
+        voice_processor.prewarm(SPEECH_PREWARM)
+    
+    warm_up(WARMUP_ORDER, on_done=warmed_up)
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    # Only shut down what was actually built
+    if is_loaded(frame_processor):
+        frame_processor.shutdown()
+    if is_loaded(emotion_rollup):
+        await emotion_rollup.close()
+    if is_loaded(music_recommender):
+        music_recommender.close()
+    await chat_manager.close()
+    if is_loaded(db):
+        await db.close()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,143 @@
+# backend/memory_database.py
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+
+class MemoryDatabaseManager:
+    """In-process stand-in for DatabaseManager used in tests and offline runs
+
+    Documents live in dicts keyed by their Firestore-style collection path,
+    and every method mirrors the async DatabaseManager interface.
+    """
+
+    def __init__(self):
+        self.collections = defaultdict(dict)
+        self.writes = 0
+
+    def _add(self, path, data, doc_id=None):
+        doc_id = doc_id or uuid.uuid4().hex
+        self.collections[path][doc_id] = data
+        self.writes += 1
+        return doc_id
+
+    def _docs(self, path):
+        return [dict(data, id=doc_id) for doc_id, data in self.collections.get(path, {}).items()]
+
+    async def close(self):
+        pass
+
+    def write_stats(self):
+        return {"backend": "memory", "writes": self.writes}
+
+    async def store_emotion_data(self, user_id, emotion, confidence, immediate=None):
+        """Store emotion detection data"""
+        self._add(f"users/{user_id}/mood_data", {
+            'emotion': emotion,
+            'confidence': confidence,
+            'timestamp': datetime.now()
+        })
+        return True
+
+    async def store_emotion_bucket(self, user_id, bucket, bucket_seconds):
+        """Store an aggregated time bucket of emotion frames"""
+        counts = bucket['counts']
+        self._add(f"users/{user_id}/mood_data", {
+            'emotion': max(counts, key=counts.get),
+            'confidence': bucket['confidence_sum'] / bucket['frames'],
+            'counts': counts,
+            'frames': bucket['frames'],
+            'bucket_seconds': bucket_seconds,
+            'timestamp': datetime.fromtimestamp(bucket['start'])
+        }, doc_id=bucket['id'])
+        return True
+
+    async def store_conversation(self, user_id, user_message, ai_response, mood=None, crisis=False):
+        """Store conversation history"""
+        self._add(f"users/{user_id}/conversations", {
+            'user_message': user_message,
+            'ai_response': ai_response,
+            'mood': mood,
+            'timestamp': datetime.now()
+        })
+        return True
+
+    async def get_recent_conversations(self, user_id, limit=20):
+        """Get a user's most recent conversations, oldest first"""
+        conversations = sorted(self._docs(f"users/{user_id}/conversations"), key=lambda doc: doc['timestamp'])
+        return conversations[-limit:]
+
+    async def store_anonymous_message(self, room_id, user_id, message, timestamp=None):
+        """Store anonymous chat message"""
+        timestamp = timestamp or datetime.now()
+        self._add(f"chat_rooms/{room_id}/messages", {
+            'user_id': user_id,
+            'message': message,
+            'timestamp': timestamp
+        })
+        self.collections['chat_rooms'].setdefault(room_id, {})['last_message_at'] = timestamp
+        return True
+
+    async def store_playlist_click(self, user_id, mood, playlist):
+        """Store a playlist the user opened from their recommendations"""
+        self._add(f"users/{user_id}/music_clicks", {
+            'mood': mood,
+            'name': playlist.get('name'),
+            'description': playlist.get('description'),
+            'genre': playlist.get('genre'),
+            'url': playlist.get('url'),
+            'timestamp': datetime.now()
+        })
+        return True
+
+    async def get_playlist_clicks(self, user_id, limit=100):
+        """Get a user's most recent playlist clicks"""
+        clicks = sorted(self._docs(f"users/{user_id}/music_clicks"), key=lambda doc: doc['timestamp'])
+        return clicks[::-1][:limit]
+
+    async def get_mood_history(self, user_id, days=30):
+        """Get mood history for a user"""
+        start_date = datetime.now() - timedelta(days=days)
+        docs = [doc for doc in self._docs(f"users/{user_id}/mood_data") if doc['timestamp'] >= start_date]
+        return sorted(docs, key=lambda doc: doc['timestamp'])
+
+    async def add_emergency_contact(self, user_id, contact_info):
+        """Add emergency contact for a user"""
+        self._add(f"users/{user_id}/emergency_contacts", {
+            'name': contact_info.get('name'),
+            'phone': contact_info.get('phone'),
+            'email': contact_info.get('email'),
+            'relationship': contact_info.get('relationship'),
+            'added_date': datetime.now()
+        })
+        return True
+
+    async def get_emergency_contacts(self, user_id):
+        """Get emergency contacts for a user"""
+        return self._docs(f"users/{user_id}/emergency_contacts")
+
+    async def get_user_profile(self, user_id):
+        """Get user profile"""
+        profile = self.collections['users'].get(user_id)
+        return dict(profile) if profile is not None else None
+
+    async def update_user_profile(self, user_id, profile_data):
+        """Update user profile"""
+        self.collections['users'].setdefault(user_id, {}).update(profile_data)
+        self.writes += 1
+        return True
+
+    async def get_chat_rooms(self, limit=50, start_after=None):
+        """Get a page of chat rooms ordered by id, after the start_after room id"""
+        rooms = sorted(self._docs('chat_rooms'), key=lambda doc: doc['id'])
+        if start_after:
+            rooms = [doc for doc in rooms if doc['id'] > start_after]
+        return rooms[:limit]
+
+    async def get_chat_messages(self, room_id, limit=50, start_after=None):
+        """Get the latest messages from a chat room sent before the start_after timestamp"""
+        messages = sorted(self._docs(f"chat_rooms/{room_id}/messages"), key=lambda doc: doc['timestamp'])
+        if start_after:
+            messages = [doc for doc in messages if doc['timestamp'] < start_after]
+        return messages[-limit:]
+
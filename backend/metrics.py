@@ -0,0 +1,36 @@
+# backend/metrics.py
+import threading
+from collections import deque
+
+
+class LatencyTracker:
+    """Rolling latency samples per processing stage"""
+
+    def __init__(self, window=500):
+        self.window = window
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.window)
+            self.samples[stage].append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+
+        stats = {}
+        for stage, values in samples.items():
+            if not values:
+                continue
+            stats[stage] = {
+                "count": len(values),
+                "avg_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(values[len(values) // 2] * 1000, 2),
+                "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 2),
+                "p99_ms": round(values[min(len(values) - 1, int(len(values) * 0.99))] * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2)
+            }
+        return stats
@@ -1,21 +1,59 @@
 # backend/mood_analysis.py
 from google.cloud import aiplatform
 from vertexai.preview.language_models import TextGenerationModel
-import pandas as pd
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 
+from llm_backends import RecordedModel, use_recorded_backend
+from mood_text_cache import MoodTextCache
+from mood_trends import TrendEngine
+
 load_dotenv()
 
 class MoodAnalyzer:
-    def __init__(self):
+    valid_moods = ['happy', 'sad', 'angry', 'anxious', 'stressed', 'neutral', 'crisis']
+    
+    # Map moods (and facial emotion labels) to scores for trend analysis
+    mood_scores = {
+        'happy': 3, 
+        'neutral': 2, 
+        'surprise': 2, 
+        'anxious': 1, 
+        'stressed': 1, 
+        'fear': 1, 
+        'sad': 0, 
+        'angry': 0, 
+        'disgust': 0, 
+        'crisis': -1
+    }
+    
+    def __init__(self, crisis_screen=None):
+        self.text_cache = MoodTextCache(crisis_screen=crisis_screen)
+        self.crisis_screen = self.text_cache.crisis_screen
+        
+        if use_recorded_backend():
+            # Replay recorded responses instead of calling Vertex AI
+            self.text_model = RecordedModel()
+            return
+        
         # Initialize Vertex AI
         aiplatform.init(project=os.getenv("GCP_PROJECT_ID"), location=os.getenv("GCP_LOCATION"))
         self.text_model = TextGenerationModel.from_pretrained("text-bison@001")
     
-    def analyze_text(self, text):
-        """Analyze mood from text input"""
+    def analyze_text(self, text, verdict=None):
+        """Analyze mood from text input, given its crisis screen verdict if known"""
+        key, mood = self.text_cache.lookup(text, verdict)
+        if mood is not None:
+            return mood
+        
+        mood = self._predict_mood(text)
+        if mood is None:
+            return "neutral"
+        self.text_cache.store(key, mood)
+        return mood
+    
+    def _predict_mood(self, text):
         prompt = f"""
         Analyze the following text for emotional content and determine the primary mood:
         "{text}"
@@ -32,47 +70,51 @@ class MoodAnalyzer:
             mood = response.text.strip().lower()
             
             # Validate response
-            valid_moods = ['happy', 'sad', 'angry', 'anxious', 'stressed', 'neutral', 'crisis']
-            if mood not in valid_moods:
+            if mood not in self.valid_moods:
                 return "neutral"
             
             return mood
         except Exception as e:
+            # Not cached, so the next request retries the model
             print(f"Mood analysis error: {e}")
-            return "neutral"
+            return None
     
-    def analyze_trends(self, mood_data):
+    def analyze_trends(self, mood_data, include_summary=True):
         """Analyze mood trends over time"""
         if not mood_data or len(mood_data) < 5:
             return {"insights": ["Not enough data yet. Keep using the app to get personalized insights."]}
         
-        # Convert to DataFrame for analysis
-        df = pd.DataFrame(mood_data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.set_index('timestamp')
-        
-        # Map moods to scores for trend analysis
-        mood_scores = {
-            'happy': 3, 
-            'neutral': 2, 
-            'anxious': 1, 
-            'stressed': 1, 
-            'sad': 0, 
-            'angry': 0, 
-            'crisis': -1
-        }
-        
-        df['mood_score'] = df['mood'].map(mood_scores)
+        insights = self.trend_insights(self.build_trends(mood_data))
         
-        # Calculate daily averages
-        daily_avg = df['mood_score'].resample('D').mean()
+        # Generate weekly summary using AI
+        if include_summary:
+            insights.append(self.generate_weekly_summary(mood_data))
         
+        return {"insights": insights}
+    
+    def build_trends(self, mood_data):
+        """Load mood records into a TrendEngine"""
+        days, hours, scores, weights = [], [], [], []
+        for record in mood_data:
+            timestamp = record['timestamp']
+            score, weight = self.record_score(record)
+            days.append(timestamp.toordinal())
+            hours.append(timestamp.hour)
+            scores.append(float('nan') if score is None else score)
+            weights.append(weight)
+        
+        engine = TrendEngine()
+        engine.load(days, hours, scores, weights)
+        return engine
+    
+    def trend_insights(self, engine):
+        """Weekly and time-of-day insights from a TrendEngine"""
         insights = []
         
         # Weekly trends
-        if len(daily_avg) > 7:
-            recent_week = daily_avg[-7:].mean()
-            previous_week = daily_avg[-14:-7].mean() if len(daily_avg) > 14 else daily_avg[:7].mean()
+        weekly = engine.weekly_change()
+        if weekly is not None:
+            recent_week, previous_week = weekly
             
             if recent_week > previous_week + 0.5:
                 insights.append("Your mood has improved over the last week. Keep up the positive habits!")
@@ -80,10 +122,7 @@ class MoodAnalyzer:
                 insights.append("I've noticed your mood has been lower recently. Would you like to talk about it?")
         
         # Time-of-day patterns
-        df['hour'] = df.index.hour
-        morning_avg = df[df['hour'] < 12]['mood_score'].mean()
-        afternoon_avg = df[(df['hour'] >= 12) & (df['hour'] < 17)]['mood_score'].mean()
-        evening_avg = df[df['hour'] >= 17]['mood_score'].mean()
+        morning_avg, afternoon_avg, evening_avg = engine.time_of_day()
         
         if morning_avg < afternoon_avg and morning_avg < evening_avg:
             insights.append("You tend to feel better as the day goes on. Consider starting your day with a positive routine.")
@@ -93,16 +132,43 @@ class MoodAnalyzer:
         if not insights:
             insights.append("Your mood patterns are fairly consistent. Regular check-ins help maintain mental wellbeing.")
         
-        # Generate weekly summary using AI
-        summary = self.generate_weekly_summary(df)
-        insights.append(summary)
-        
-        return {"insights": insights}
+        return insights
+    
+    def record_score(self, record):
+        """(score, weight) of a mood record; a rollup bucket weighs as many frames as it holds"""
+        counts = record.get('counts')
+        if isinstance(counts, dict):
+            scored = [(self.mood_scores[m], n) for m, n in counts.items() if m in self.mood_scores]
+            total = sum(n for _, n in scored)
+            if total:
+                return sum(score * n for score, n in scored) / total, total
+        
+        # Emotion frames and rollup buckets carry 'emotion' rather than 'mood'
+        mood = record.get('mood') or record.get('emotion')
+        if mood not in self.mood_scores:
+            return None, 0
+        return self.mood_scores[mood], record.get('frames') or 1
+    
+    def mood_distribution(self, mood_data):
+        """Count moods, expanding rollup buckets into their per-emotion counts"""
+        mood_counts = {}
+        for record in mood_data:
+            counts = record.get('counts')
+            if isinstance(counts, dict):
+                for emotion, n in counts.items():
+                    mood_counts[emotion] = mood_counts.get(emotion, 0) + n
+            else:
+                mood = record.get('mood') or record.get('emotion')
+                if mood is not None:
+                    mood_counts[mood] = mood_counts.get(mood, 0) + 1
+        return dict(sorted(mood_counts.items(), key=lambda item: item[1], reverse=True))
     
-    def generate_weekly_summary(self, df):
+    def generate_weekly_summary(self, mood_data):
         """Generate a weekly mood summary using AI"""
-        mood_counts = df['mood'].value_counts().to_dict()
-        
+        return self.summarize_distribution(self.mood_distribution(mood_data))
+    
+    def summarize_distribution(self, mood_counts):
+        """Generate a weekly summary from a {mood: count} distribution"""
         prompt = f"""
         Based on the following mood distribution from the past week: {mood_counts}
         Generate a compassionate, encouraging weekly summary for a mental health app user.
@@ -0,0 +1,153 @@
+# backend/mood_cache.py
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+from mood_trends import TrendEngine
+
+
+class MoodHistoryCache:
+    """Per-user LRU cache of the mood history window and its trend insights
+
+    New mood records are appended to cached windows as they are written,
+    updating the window's TrendEngine and mood distribution in O(1)
+    without a reload. The AI weekly summary is only regenerated when the mood
+    distribution has shifted by more than summary_change_threshold.
+    """
+
+    def __init__(self, analyzer, max_users=None, ttl=None, summary_change_threshold=None):
+        self.analyzer = analyzer
+        self.max_users = max_users or int(os.getenv("MOOD_CACHE_MAX_USERS", "1000"))
+        self.ttl = ttl or float(os.getenv("MOOD_CACHE_TTL", "300"))
+        self.summary_change_threshold = summary_change_threshold or float(os.getenv("MOOD_SUMMARY_CHANGE", "0.15"))
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.appended_records = 0
+        self.summaries_generated = 0
+        self.summaries_reused = 0
+
+    def get(self, user_id, days):
+        """Return the cached entry covering the last `days` days, or None"""
+        entry = self.entries.get(user_id)
+        if entry is not None and time.monotonic() - entry['loaded_at'] > self.ttl:
+            del self.entries[user_id]
+            self.expirations += 1
+            entry = None
+
+        if entry is None or entry['days'] != days:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(user_id)
+        self._trim(entry)
+        self.hits += 1
+        return entry
+
+    def put(self, user_id, days, records):
+        """Cache a freshly loaded history window"""
+        entry = {
+            'days': days,
+            'loaded_at': time.monotonic(),
+            'records': deque(),
+            'trends': TrendEngine(),
+            'distribution': {},
+            'summary': None,
+            'summary_distribution': None
+        }
+        for record in records:
+            self._add_record(entry, record)
+
+        self.entries[user_id] = entry
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_users:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def append(self, user_id, record):
+        """Fold a newly written mood record into the user's cached window"""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return
+        self._add_record(entry, record)
+        self.appended_records += 1
+
+    def analysis(self, entry):
+        """Trend insights for a cached window, reusing the summary when possible
+
+        Safe to call from a worker thread: the records and distribution are
+        copied first, since appends keep landing on the event loop.
+        """
+        records = list(entry['records'])
+        if len(records) < 5:
+            return self.analyzer.analyze_trends(records)
+
+        insights = self.analyzer.trend_insights(entry['trends'])
+        if entry['summary'] is None or self._distribution_changed(entry):
+            distribution = dict(entry['distribution'])
+            entry['summary'] = self.analyzer.summarize_distribution(distribution)
+            entry['summary_distribution'] = distribution
+            self.summaries_generated += 1
+        else:
+            self.summaries_reused += 1
+
+        return {"insights": insights + [entry['summary']]}
+
+    def _add_record(self, entry, record):
+        record = dict(record, timestamp=self._local_time(record['timestamp']))
+        entry['records'].append(record)
+        self._count(entry, record, 1)
+
+    def _trim(self, entry):
+        # Slide the window forward, dropping records older than `days`
+        start = datetime.now() - timedelta(days=entry['days'])
+        records = entry['records']
+        while records and records[0]['timestamp'] < start:
+            self._count(entry, records.popleft(), -1)
+
+    def _count(self, entry, record, sign):
+        score, weight = self.analyzer.record_score(record)
+        if sign > 0:
+            entry['trends'].add(record['timestamp'], score, weight)
+        else:
+            entry['trends'].remove(record['timestamp'], score, weight)
+
+        counts = record.get('counts') or {record.get('mood') or record.get('emotion'): 1}
+        for mood, n in counts.items():
+            entry['distribution'][mood] = entry['distribution'].get(mood, 0) + sign * n
+
+    def _local_time(self, timestamp):
+        # Naive datetime.now() values come back from Firestore tagged as
+        # UTC; dropping the tag restores the value that was written
+        if timestamp.tzinfo is not None:
+            return timestamp.replace(tzinfo=None)
+        return timestamp
+
+    def _distribution_changed(self, entry):
+        """Total variation distance between the current and summarised distributions"""
+        current, previous = entry['distribution'], entry['summary_distribution']
+        current_total = sum(current.values()) or 1
+        previous_total = sum(previous.values()) or 1
+        moods = set(current) | set(previous)
+        distance = sum(abs(current.get(m, 0) / current_total - previous.get(m, 0) / previous_total)
+                       for m in moods) / 2
+        return distance > self.summary_change_threshold
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "appended_records": self.appended_records,
+            "summaries_generated": self.summaries_generated,
+            "summaries_reused": self.summaries_reused
+        }
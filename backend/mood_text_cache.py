@@ -0,0 +1,178 @@
+# backend/mood_text_cache.py
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from crisis_screen import CrisisScreen, normalize
+
+
+def embed(text, dim=256):
+    """Hashed character-trigram vector, L2 normalised"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for i in range(len(text) - 2):
+        vector[zlib.crc32(text[i:i + 3].encode()) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+NEGATIONS = {"not", "no", "never", "nothing", "without", "dont", "cant", "isnt", "wasnt",
+             "arent", "didnt", "doesnt", "wont", "couldnt", "shouldnt"}
+NEGATING_PREFIXES = ("un", "dis", "non", "in", "im")
+
+
+def flips_meaning(a, b):
+    """True if two normalised texts differ by a negation word or a negated
+    form of the other's word ("unhappy" vs "happy")"""
+    changed = set(a.split()) ^ set(b.split())
+    if changed & NEGATIONS:
+        return True
+    return any(word.startswith(prefix) and word[len(prefix):] in changed
+               for word in changed for prefix in NEGATING_PREFIXES)
+
+
+class MoodTextCache:
+    """LRU cache of text mood labels in front of the mood model
+
+    Lookups first try the normalised text exactly, then (optionally) the
+    most similar cached text by cosine similarity of hashed trigram vectors,
+    accepted only at or above min_similarity and when the two texts do not
+    differ by a negation. Trigram similarity is not semantic ("unhappy" is
+    0.9 from "happy"), so that tier is off unless MOOD_TEXT_CACHE_EMBEDDINGS=1.
+    Crisis labels are never
+    stored, and messages the crisis screen flags as crisis or risk always
+    go to the model.
+    """
+
+    def __init__(self, max_entries=None, min_similarity=None, use_embeddings=None, dim=256, crisis_screen=None):
+        self.max_entries = max_entries or int(os.getenv("MOOD_TEXT_CACHE_SIZE", "5000"))
+        self.min_similarity = min_similarity or float(os.getenv("MOOD_TEXT_CACHE_SIMILARITY", "0.9"))
+        if use_embeddings is None:
+            use_embeddings = os.getenv("MOOD_TEXT_CACHE_EMBEDDINGS", "0") == "1"
+        self.use_embeddings = use_embeddings
+        self.dim = dim
+        # Shared with the chat assistant when given
+        self.crisis_screen = crisis_screen or CrisisScreen()
+        self.lock = threading.Lock()
+
+        # key -> (mood, row in the vector matrix)
+        self.entries = OrderedDict()
+        self.vectors = np.zeros((self.max_entries, dim), dtype=np.float32) if use_embeddings else None
+        self.free_rows = list(range(self.max_entries - 1, -1, -1))
+        self.row_keys = [None] * self.max_entries
+
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    def lookup(self, text, verdict=None):
+        """Return (key, cached mood or None); pass the key back to store()
+
+        verdict is the caller's crisis screen result for text, if it has one.
+        """
+        key = normalize(text)
+        if verdict is None:
+            verdict = self.crisis_screen.classify(text)
+        if verdict in ("crisis", "risk"):
+            with self.lock:
+                self.bypassed += 1
+            return None, None
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.exact_hits += 1
+                return key, entry[0]
+
+            if self.use_embeddings and self.entries:
+                similarities = self.vectors @ embed(key, self.dim)
+                row = int(similarities.argmax())
+                nearest = self.row_keys[row]
+                if similarities[row] >= self.min_similarity and not flips_meaning(key, nearest):
+                    self.entries.move_to_end(nearest)
+                    self.similar_hits += 1
+                    return key, self.entries[nearest][0]
+
+            self.misses += 1
+            return key, None
+
+    def store(self, key, mood):
+        if key is None or mood == "crisis":
+            return
+        vector = embed(key, self.dim) if self.use_embeddings else None
+
+        with self.lock:
+            if key in self.entries:
+                self.entries[key] = (mood, self.entries[key][1])
+                self.entries.move_to_end(key)
+                return
+
+            if not self.free_rows:
+                _, (_, row) = self.entries.popitem(last=False)
+                if self.use_embeddings:
+                    self.vectors[row] = 0
+                self.free_rows.append(row)
+                self.evictions += 1
+
+            row = self.free_rows.pop()
+            if self.use_embeddings:
+                self.vectors[row] = vector
+                self.row_keys[row] = key
+            self.entries[key] = (mood, row)
+
+    def stats(self):
+        hits = self.exact_hits + self.similar_hits
+        lookups = hits + self.misses + self.bypassed
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0,
+            "saved_model_calls": hits
+        }
+
+
+if __name__ == "__main__":
+    # Hit rate and lookup latency over a repetitive message stream
+    import random
+    import time
+
+    random.seed(0)
+    phrases = ["I'm stressed", "feeling sad today", "I'm so stressed with work", "I feel anxious",
+               "had a good day", "I'm angry at my boss", "feeling a bit down", "I'm happy today"]
+    variants = [prefix + p + suffix for p in phrases
+                for prefix in ("", "honestly ", "ugh ")
+                for suffix in ("", "!", " :(", " again", " right now")]
+    stream = [random.choice(variants) for _ in range(5000)]
+
+    for use_embeddings in (False, True):
+        cache = MoodTextCache(max_entries=1000, use_embeddings=use_embeddings)
+        start = time.perf_counter()
+        for message in stream:
+            key, mood = cache.lookup(message)
+            if mood is None:
+                cache.store(key, "stressed")
+        per_lookup = (time.perf_counter() - start) / len(stream) * 1e6
+        stats = cache.stats()
+        print(f"embeddings={use_embeddings!s:>5}: hit rate {stats['hit_rate']:.1%}, "
+              f"saved {stats['saved_model_calls']} of {len(stream)} model calls, {per_lookup:.1f} us per lookup")
+
+    # Near-identical texts with the opposite meaning must not share a label
+    cache = MoodTextCache(use_embeddings=True)
+    for cached, asked in [("I am so very happy right now", "I am so very unhappy right now"),
+                          ("I feel okay about everything today", "I don't feel okay about everything today"),
+                          ("I'm so stressed with work", "I'm so stressed with work again")]:
+        key, _ = cache.lookup(cached)
+        cache.store(key, "happy")
+        key, mood = cache.lookup(asked)
+        similarity = float(embed(key) @ embed(normalize(cached)))
+        print(f"{asked!r} vs cached {cached!r}: similarity {similarity:.3f}, cached label {'used' if mood else 'rejected'}")
@@ -0,0 +1,245 @@
+# backend/mood_trends.py
+import os
+
+import numpy as np
+
+
+class TrendEngine:
+    """Rolling per-day, per-hour mood score sums for one user
+
+    Scores are kept in fixed-size (days x 24) NumPy arrays indexed by
+    day ordinal modulo capacity, so adding or removing a record is O(1) and
+    the weekly and time-of-day averages never need a full recompute.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity or int(os.getenv("MOOD_TREND_DAYS", "366"))
+        self.days = np.full(self.capacity, -1, dtype=np.int64)
+        self.records = np.zeros(self.capacity, dtype=np.int64)
+        self.sums = np.zeros((self.capacity, 24))
+        self.weights = np.zeros((self.capacity, 24))
+        self.hour_sums = np.zeros(24)
+        self.hour_weights = np.zeros(24)
+        self.first_day = None
+        self.last_day = None
+
+    def __len__(self):
+        return int(self.records.sum())
+
+    @property
+    def day_span(self):
+        """Number of calendar days from the first to the last record"""
+        if self.first_day is None:
+            return 0
+        return self.last_day - self.first_day + 1
+
+    def add(self, timestamp, score, weight=1.0):
+        """Add one record; score may be None for moods without a score"""
+        day = timestamp.toordinal()
+        if self.last_day is not None and day <= self.last_day - self.capacity:
+            return
+
+        if self.last_day is None or day > self.last_day:
+            self._advance(day)
+            # Advancing past every stored day empties the range and resets it
+            self.last_day = day
+        slot = day % self.capacity
+        if self.days[slot] != day:
+            self._evict(slot)
+            self.days[slot] = day
+
+        self.records[slot] += 1
+        if score is not None and weight:
+            self.sums[slot, timestamp.hour] += score * weight
+            self.weights[slot, timestamp.hour] += weight
+            self.hour_sums[timestamp.hour] += score * weight
+            self.hour_weights[timestamp.hour] += weight
+
+        if self.first_day is None or day < self.first_day:
+            self.first_day = day
+
+    def remove(self, timestamp, score, weight=1.0):
+        """Remove a record previously added with the same values"""
+        day = timestamp.toordinal()
+        slot = day % self.capacity
+        if self.days[slot] != day:
+            return
+
+        self.records[slot] -= 1
+        if score is not None and weight:
+            self.sums[slot, timestamp.hour] -= score * weight
+            self.weights[slot, timestamp.hour] -= weight
+            self.hour_sums[timestamp.hour] -= score * weight
+            self.hour_weights[timestamp.hour] -= weight
+
+        if self.records[slot] <= 0:
+            self._evict(slot)
+            self._skip_empty_days()
+
+    def load(self, days, hours, scores, weights):
+        """Bulk-load an empty engine from arrays of day ordinals, hours, scores and weights"""
+        days = np.asarray(days, dtype=np.int64)
+        if not len(days):
+            return
+        hours = np.asarray(hours, dtype=np.int64)
+        scores = np.asarray(scores, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+
+        keep = days > days.max() - self.capacity
+        days, hours, scores, weights = days[keep], hours[keep], scores[keep], weights[keep]
+        slots = days % self.capacity
+        self.days[slots] = days
+        np.add.at(self.records, slots, 1)
+
+        scored = ~np.isnan(scores) & (weights > 0)
+        weighted = scores[scored] * weights[scored]
+        np.add.at(self.sums, (slots[scored], hours[scored]), weighted)
+        np.add.at(self.weights, (slots[scored], hours[scored]), weights[scored])
+        self.hour_sums += np.bincount(hours[scored], weighted, minlength=24)
+        self.hour_weights += np.bincount(hours[scored], weights[scored], minlength=24)
+
+        self.first_day = int(days.min())
+        self.last_day = int(days.max())
+
+    def _advance(self, day):
+        # Drop days that fall out of the window as the newest day moves forward
+        if self.last_day is not None:
+            for old_day in range(max(self.last_day, day - self.capacity) - self.capacity + 1, day - self.capacity + 1):
+                slot = old_day % self.capacity
+                if self.days[slot] == old_day:
+                    self._evict(slot)
+        self.last_day = day
+        self._skip_empty_days()
+
+    def _evict(self, slot):
+        if self.days[slot] < 0:
+            return
+        self.hour_sums -= self.sums[slot]
+        self.hour_weights -= self.weights[slot]
+        self.sums[slot] = 0
+        self.weights[slot] = 0
+        self.records[slot] = 0
+        self.days[slot] = -1
+
+    def _skip_empty_days(self):
+        if self.first_day is None:
+            return
+        self.first_day = max(self.first_day, self.last_day - self.capacity + 1)
+        while self.first_day <= self.last_day and self.days[self.first_day % self.capacity] != self.first_day:
+            self.first_day += 1
+        if self.first_day > self.last_day:
+            self.first_day = None
+            self.last_day = None
+
+    def mean_daily_score(self, start, stop):
+        """Mean of the daily average scores for day ordinals in [start, stop)"""
+        days = np.arange(start, stop)
+        slots = days % self.capacity
+        present = self.days[slots] == days
+        sums = np.where(present, self.sums[slots].sum(axis=1), 0.0)
+        weights = np.where(present, self.weights[slots].sum(axis=1), 0.0)
+        scored = weights > 0
+        if not scored.any():
+            return float("nan")
+        return float((sums[scored] / weights[scored]).mean())
+
+    def weekly_change(self):
+        """(recent_week, previous_week) mean daily scores, or None with 7 days or fewer"""
+        if self.day_span <= 7:
+            return None
+        recent_week = self.mean_daily_score(self.last_day - 6, self.last_day + 1)
+        if self.day_span > 14:
+            previous_week = self.mean_daily_score(self.last_day - 13, self.last_day - 6)
+        else:
+            previous_week = self.mean_daily_score(self.first_day, self.first_day + 7)
+        return recent_week, previous_week
+
+    def time_of_day(self):
+        """Weighted mean score for morning (<12h), afternoon (12-17h) and evening (>=17h)"""
+        averages = []
+        for start, stop in ((0, 12), (12, 17), (17, 24)):
+            weight = self.hour_weights[start:stop].sum()
+            averages.append(float(self.hour_sums[start:stop].sum() / weight) if weight > 0 else float("nan"))
+        return tuple(averages)
+
+
+if __name__ == "__main__":
+    # Parity check against the previous pandas implementation, plus timings
+    # for a full rebuild and for incremental updates
+    import random
+    import sys
+    import time
+    import types
+    from datetime import datetime, timedelta
+
+    import pandas as pd
+
+    # mood_analysis imports the Vertex AI SDK at module level; the trend
+    # code under test does not need it
+    for name in ("google", "google.cloud", "vertexai", "vertexai.preview", "vertexai.preview.language_models"):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules["google.cloud"].aiplatform = None
+    sys.modules["vertexai.preview.language_models"].TextGenerationModel = None
+    from mood_analysis import MoodAnalyzer
+
+    analyzer = MoodAnalyzer.__new__(MoodAnalyzer)
+
+    def pandas_trends(mood_data):
+        df = pd.DataFrame(mood_data)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df = df.set_index('timestamp')
+        df['mood_score'] = df['mood'].map(MoodAnalyzer.mood_scores)
+        daily_avg = df['mood_score'].resample('D').mean()
+        weekly = None
+        if len(daily_avg) > 7:
+            recent_week = daily_avg[-7:].mean()
+            previous_week = daily_avg[-14:-7].mean() if len(daily_avg) > 14 else daily_avg[:7].mean()
+            weekly = (recent_week, previous_week)
+        df['hour'] = df.index.hour
+        return weekly, (df[df['hour'] < 12]['mood_score'].mean(),
+                        df[(df['hour'] >= 12) & (df['hour'] < 17)]['mood_score'].mean(),
+                        df[df['hour'] >= 17]['mood_score'].mean())
+
+    def generate(n, days):
+        start = datetime(2026, 1, 1)
+        moods = list(MoodAnalyzer.mood_scores)
+        return [{'timestamp': start + timedelta(seconds=random.uniform(0, days * 86400)),
+                 'mood': random.choice(moods)} for _ in range(n)]
+
+    random.seed(0)
+    for days in (5, 10, 30, 90):
+        records = sorted(generate(2000, days), key=lambda r: r['timestamp'])
+        expected = pandas_trends(records)
+        engine = analyzer.build_trends(records)
+        actual = (engine.weekly_change(), engine.time_of_day())
+        same = np.allclose(np.array(expected[0] or (0, 0)), np.array(actual[0] or (0, 0)), equal_nan=True) \
+            and np.allclose(expected[1], actual[1], equal_nan=True)
+        print(f"parity over {days:>2} days: {'ok' if same else 'MISMATCH'}")
+
+    # A record more than capacity days after the previous one resets the window
+    engine = TrendEngine(366)
+    engine.add(datetime(2025, 1, 1, 9), 2)
+    engine.add(datetime(2026, 3, 1, 9), 3)
+    expected = pandas_trends([{'timestamp': datetime(2026, 3, 1, 9), 'mood': 'happy'}])
+    same = engine.weekly_change() == expected[0] and engine.day_span == 1 \
+        and np.allclose(engine.time_of_day(), expected[1], equal_nan=True)
+    print(f"parity after a gap longer than the window: {'ok' if same else 'MISMATCH'}")
+
+    for n in (10_000, 100_000):
+        records = sorted(generate(n, 30), key=lambda r: r['timestamp'])
+        start = time.perf_counter()
+        pandas_trends(records)
+        pandas_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        engine = analyzer.build_trends(records)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for record in records[:1000]:
+            engine.add(record['timestamp'], 2, 1.0)
+            engine.weekly_change()
+            engine.time_of_day()
+        update_us = (time.perf_counter() - start) / 1000 * 1e6
+        print(f"{n:>7} records: pandas {pandas_ms:7.1f} ms, engine build {build_ms:7.1f} ms, "
+              f"incremental update + insights {update_us:6.1f} us")
@@ -1,13 +1,67 @@
 # backend/music_recommendation.py
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import spotipy
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from spotipy.oauth2 import SpotifyClientCredentials
+from urllib3.util.retry import Retry
+
+from music_ranking import PlaylistRanker
 
 load_dotenv()
 
+# Mood to genre mapping
+MOOD_GENRES = {
+    'happy': ['pop', 'dance', 'electronic', 'happy'],
+    'sad': ['sad', 'acoustic', 'piano', 'singer-songwriter'],
+    'anxious': ['ambient', 'classical', 'meditation', 'chill'],
+    'stressed': ['ambient', 'jazz', 'lo-fi', 'meditation'],
+    'angry': ['rock', 'metal', 'punk', 'workout'],
+    'neutral': ['indie', 'alternative', 'pop', 'chill'],
+    'crisis': ['calm', 'meditation', 'ambient', 'classical']
+}
+
+# Unknown moods from the URL are served this mood's playlists
+DEFAULT_MOOD = 'happy'
+
 class MusicRecommender:
-    def __init__(self):
+    """Mood-based Spotify playlists, cached per mood
+
+    The genre searches for a mood run concurrently on a thread pool that
+    shares one pooled HTTP session. Results are fresh for MUSIC_CACHE_TTL
+    seconds; for MUSIC_CACHE_STALE seconds after that the old playlists are
+    still served while a background task fetches new ones. SPOTIFY_API_URL
+    and SPOTIFY_ACCOUNTS_URL point the client at another server, e.g. a
+    local stub.
+
+    The cached results are a candidate pool that PlaylistRanker re-ranks
+    per user; user vectors are rebuilt in the background from the user's
+    mood history and playlist clicks.
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self.ttl = float(os.getenv("MUSIC_CACHE_TTL", "3600"))
+        self.stale = float(os.getenv("MUSIC_CACHE_STALE", "86400"))
+        pool_size = int(os.getenv("SPOTIFY_POOL_SIZE", "16"))
+        self.candidates_per_genre = int(os.getenv("MUSIC_CANDIDATES_PER_GENRE", "10"))
+
+        # One keep-alive connection pool for token and search requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504))
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="spotify")
+
         # Initialize Spotify client
         client_id = os.getenv("SPOTIFY_CLIENT_ID")
         client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
@@ -15,66 +69,173 @@ class MusicRecommender:
         if client_id and client_secret:
             auth_manager = SpotifyClientCredentials(
                 client_id=client_id,
-                client_secret=client_secret
+                client_secret=client_secret,
+                requests_session=self.session
             )
-            self.sp = spotipy.Spotify(auth_manager=auth_manager)
+            accounts_url = os.getenv("SPOTIFY_ACCOUNTS_URL")
+            if accounts_url:
+                auth_manager.OAUTH_TOKEN_URL = accounts_url.rstrip("/") + "/api/token"
+            self.sp = spotipy.Spotify(auth_manager=auth_manager, requests_session=self.session)
+            api_url = os.getenv("SPOTIFY_API_URL")
+            if api_url:
+                self.sp.prefix = api_url.rstrip("/") + "/"
             self.spotify_available = True
         else:
             self.spotify_available = False
             print("Spotify credentials not found. Using mock recommendations.")
         
-        # Mood to genre mapping
-        self.mood_genres = {
-            'happy': ['pop', 'dance', 'electronic', 'happy'],
-            'sad': ['sad', 'acoustic', 'piano', 'singer-songwriter'],
-            'anxious': ['ambient', 'classical', 'meditation', 'chill'],
-            'stressed': ['ambient', 'jazz', 'lo-fi', 'meditation'],
-            'angry': ['rock', 'metal', 'punk', 'workout'],
-            'neutral': ['indie', 'alternative', 'pop', 'chill'],
-            'crisis': ['calm', 'meditation', 'ambient', 'classical']
-        }
+        self.mood_genres = MOOD_GENRES
+        self.ranker = PlaylistRanker(self.mood_genres)
+        
+        # mood -> (fetched_at, candidates, candidate features)
+        self.cache = {}
+        self.refreshing = {}
+        self.building_users = {}
+        # Users clicked while their vector was being built
+        self.rebuild_users = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.searches = 0
+        self.errors = 0
     
-    def get_playlists(self, mood, user_id=None):
+    async def get_playlists(self, mood, user_id=None):
         """Get playlists based on mood"""
+        # Arbitrary mood strings come from the URL; map them to one cache key
+        if mood not in self.mood_genres:
+            mood = DEFAULT_MOOD
         if not self.spotify_available:
             return self.get_default_playlists(mood)
         
-        genres = self.mood_genres.get(mood, ['pop'])
+        if user_id and self.ranker.needs_build(user_id):
+            self._build_user(user_id)
+        
+        entry = self.cache.get(mood)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age <= self.ttl:
+                self.hits += 1
+            elif age <= self.ttl + self.stale:
+                self.stale_hits += 1
+                self._refresh(mood)
+            else:
+                entry = None
+        
+        if entry is None:
+            self.misses += 1
+            # Shielded so a cancelled request doesn't cancel a fetch others wait on
+            entry = await asyncio.shield(self._refresh(mood))
+        
+        _, candidates, features = entry
+        return self.ranker.rank(user_id, candidates, features)
+    
+    async def record_click(self, user_id, mood, playlist):
+        """Store a playlist click and fold it into the user's ranking"""
+        if self.db is not None:
+            await self.db.store_playlist_click(user_id, mood, playlist)
+        self._build_user(user_id, clicked=True)
+    
+    def _build_user(self, user_id, clicked=False):
+        """Rebuild a user's ranking vector in the background"""
+        if self.db is None:
+            return
+        if user_id in self.building_users:
+            # The running build may have read the clicks before this one
+            if clicked:
+                self.rebuild_users.add(user_id)
+            return
+        task = self.building_users[user_id] = asyncio.ensure_future(self._load_user(user_id))
+        task.add_done_callback(lambda _: self._user_built(user_id))
+    
+    def _user_built(self, user_id):
+        self.building_users.pop(user_id, None)
+        if user_id in self.rebuild_users:
+            self.rebuild_users.discard(user_id)
+            self._build_user(user_id)
+    
+    async def _load_user(self, user_id):
+        try:
+            mood_records = await self.db.get_mood_history(user_id, 30)
+            clicked = await self.db.get_playlist_clicks(user_id)
+            self.ranker.build_user(user_id, mood_records, clicked)
+        except Exception as e:
+            print(f"Error building music profile: {e}")
+    
+    def _refresh(self, mood):
+        """Start fetching a mood's playlists unless a fetch is already running"""
+        task = self.refreshing.get(mood)
+        if task is None:
+            task = self.refreshing[mood] = asyncio.ensure_future(self._fetch(mood))
+            task.add_done_callback(lambda _: self.refreshing.pop(mood, None))
+        return task
+    
+    async def _fetch(self, mood):
+        genres = self.mood_genres[mood]
         
         try:
             # Search for playlists based on mood and genres
-            playlists = []
-            
-            for genre in genres:
-                results = self.sp.search(q=f'mood:{mood} {genre}', type='playlist', limit=5)
-                for item in results['playlists']['items']:
-                    playlists.append({
-                        'name': item['name'],
-                        'description': item['description'],
-                        'image': item['images'][0]['url'] if item['images'] else None,
-                        'url': item['external_urls']['spotify'],
-                        'tracks': item['tracks']['total']
-                    })
+            playlists = await self._search_all([(f'mood:{mood} {genre}', genre) for genre in genres])
             
             # If no mood-specific playlists found, search by genre
             if not playlists:
-                for genre in genres:
-                    results = self.sp.search(q=genre, type='playlist', limit=5)
-                    for item in results['playlists']['items']:
-                        playlists.append({
-                            'name': item['name'],
-                            'description': item['description'],
-                            'image': item['images'][0]['url'] if item['images'] else None,
-                            'url': item['external_urls']['spotify'],
-                            'tracks': item['tracks']['total']
-                        })
-            
-            return playlists[:10]  # Return top 10 playlists
+                playlists = await self._search_all([(genre, genre) for genre in genres])
         
         except Exception as e:
             print(f"Spotify API error: {e}")
-            # Return default playlists
-            return self.get_default_playlists(mood)
+            self.errors += 1
+            # Keep serving the last result we had, else the defaults
+            entry = self.cache.get(mood)
+            if entry is not None:
+                return entry
+            playlists = self.get_default_playlists(mood)
+            return (time.monotonic(), playlists, self.ranker.features(playlists))
+        
+        entry = self.cache[mood] = (time.monotonic(), playlists, self.ranker.features(playlists))
+        return entry
+    
+    async def _search_all(self, queries):
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, self._search, query, genre) for query, genre in queries
+        ))
+        # Interleave the genres so the unranked order stays varied
+        playlists, seen = [], set()
+        for rank in range(self.candidates_per_genre):
+            for result in results:
+                if rank < len(result) and result[rank]['url'] not in seen:
+                    seen.add(result[rank]['url'])
+                    playlists.append(result[rank])
+        return playlists
+    
+    def _search(self, query, genre):
+        self.searches += 1
+        results = self.sp.search(q=query, type='playlist', limit=self.candidates_per_genre)
+        return [{
+            'name': item['name'],
+            'description': item['description'],
+            'image': item['images'][0]['url'] if item['images'] else None,
+            'url': item['external_urls']['spotify'],
+            'tracks': item['tracks']['total'],
+            'genre': genre
+        } for item in results['playlists']['items'] if item]
+    
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+    
+    def stats(self):
+        return {
+            "spotify_available": self.spotify_available,
+            "cached_moods": len(self.cache),
+            "refreshing": len(self.refreshing),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "searches": self.searches,
+            "errors": self.errors,
+            "ranking": self.ranker.stats()
+        }
     
     def get_default_playlists(self, mood):
         """Fallback playlists if API fails"""
@@ -135,4 +296,92 @@ class MusicRecommender:
             ]
         }
         
-        return defaults.get(mood, defaults['neutral'])
\ No newline at end of file
+        # No curated 'neutral' list; neutral and unknown moods get the upbeat one
+        return defaults.get(mood, defaults[DEFAULT_MOOD])
+
+if __name__ == "__main__":
+    # Against a local stub of the Spotify token and search endpoints with
+    # 50 ms of latency per call: the old one-genre-at-a-time lookup, a cold
+    # concurrent lookup, cached lookups, and stale-while-revalidate
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    SEARCH_LATENCY = 0.05
+
+    class StubSpotify(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _reply(self, body):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._reply({"access_token": "stub", "token_type": "Bearer", "expires_in": 3600})
+
+        def do_GET(self):
+            time.sleep(SEARCH_LATENCY)
+            self._reply({"playlists": {"items": [{
+                "name": f"{self.path} #{i}",
+                "description": "",
+                "images": [],
+                "external_urls": {"spotify": "https://open.spotify.com/playlist/stub"},
+                "tracks": {"total": 20}
+            } for i in range(5)]}})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSpotify)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    os.environ.update(SPOTIFY_CLIENT_ID="stub", SPOTIFY_CLIENT_SECRET="stub", SPOTIFY_ACCOUNTS_URL=base,
+                      SPOTIFY_API_URL=f"{base}/v1", MUSIC_CACHE_TTL="2", MUSIC_CACHE_STALE="60")
+
+    async def main():
+        recommender = MusicRecommender()
+        moods = list(recommender.mood_genres)
+        recommender.sp.search(q="warm up", type="playlist", limit=5)
+
+        start = time.perf_counter()
+        for mood in moods:
+            for genre in recommender.mood_genres[mood]:
+                recommender._search(f"mood:{mood} {genre}", genre)
+        sequential_ms = (time.perf_counter() - start) / len(moods) * 1000
+
+        start = time.perf_counter()
+        for mood in moods:
+            await recommender.get_playlists(mood)
+        cold_ms = (time.perf_counter() - start) / len(moods) * 1000
+
+        start = time.perf_counter()
+        for i in range(7000):
+            await recommender.get_playlists(moods[i % len(moods)])
+        cached_us = (time.perf_counter() - start) / 7000 * 1e6
+
+        # Unknown moods share the default mood's cache entry
+        searches = recommender.searches
+        for mood in ("bored", "hungry", "bored"):
+            await recommender.get_playlists(mood)
+        unknown_searches = recommender.searches - searches
+
+        await asyncio.sleep(2.1)
+        start = time.perf_counter()
+        await recommender.get_playlists("sad")
+        stale_us = (time.perf_counter() - start) * 1e6
+        await asyncio.sleep(0.2)
+
+        print(f"per mood: sequential {sequential_ms:.1f} ms, concurrent {cold_ms:.1f} ms, "
+              f"cached {cached_us:.1f} us, stale {stale_us:.1f} us, "
+              f"{unknown_searches} searches for unknown moods")
+        print(recommender.stats())
+        recommender.close()
+
+    asyncio.run(main())
+    server.shutdown()
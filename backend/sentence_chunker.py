@@ -0,0 +1,22 @@
+# backend/sentence_chunker.py
+import re
+
+
+class SentenceChunker:
+    """Splits streamed text into complete sentences for per-sentence TTS"""
+    
+    sentence_end = re.compile(r'(?<=[.!?])\s+')
+    
+    def __init__(self):
+        self.buffer = ""
+    
+    def feed(self, text):
+        """Add streamed text and return any sentences it completed"""
+        self.buffer += text
+        parts = self.sentence_end.split(self.buffer)
+        self.buffer = parts.pop()
+        return [part.strip() for part in parts if part.strip()]
+    
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
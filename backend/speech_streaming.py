@@ -0,0 +1,173 @@
+# backend/speech_streaming.py
+import abc
+import asyncio
+import os
+import time
+
+import numpy as np
+
+# Sample rates accepted for streamed PCM, in Hz
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+
+class RecognitionStream(abc.ABC):
+    """Recognition results for raw PCM pushed in chunks
+
+    feed() takes 16-bit mono PCM as it arrives and close() marks the end of
+    the audio. Iterating yields {"transcript", "final", "at"} results, where
+    "at" is the perf_counter time the result was produced; for a final
+    result that is when the end of the utterance was detected.
+    """
+
+    def __init__(self):
+        self.results = asyncio.Queue()
+
+    @abc.abstractmethod
+    def feed(self, chunk):
+        """Push the next chunk of PCM; must not block the event loop"""
+
+    @abc.abstractmethod
+    def close(self):
+        """Mark the end of the audio"""
+
+    def _emit(self, transcript, final):
+        self.results.put_nowait({"transcript": transcript, "final": final, "at": time.perf_counter()})
+
+    def _finish(self):
+        self.results.put_nowait(None)
+
+    async def __aiter__(self):
+        while True:
+            result = await self.results.get()
+            if result is None:
+                return
+            yield result
+
+
+class LocalRecognitionStream(RecognitionStream):
+    """Offline stand-in recognizer with energy-based endpointing
+
+    20 ms frames whose RMS is at least LOCAL_STT_THRESHOLD count as speech,
+    and an utterance ends after VOICE_ENDPOINT_SILENCE_MS of silence. An
+    interim result is emitted every LOCAL_STT_INTERIM_MS of speech. The
+    text comes from transcribe(pcm_bytes); by default it is a placeholder
+    giving the utterance length.
+    """
+
+    def __init__(self, sample_rate=16000, transcribe=None, threshold=None, silence_ms=None, interim_ms=None):
+        super().__init__()
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            # A zero-byte frame would make feed() loop forever
+            raise ValueError(f"Unsupported sample rate {sample_rate}")
+        self.sample_rate = sample_rate
+        self.transcribe = transcribe or self._placeholder
+        self.threshold = threshold or float(os.getenv("LOCAL_STT_THRESHOLD", "500"))
+        self.silence_ms = silence_ms or int(os.getenv("VOICE_ENDPOINT_SILENCE_MS", "500"))
+        self.interim_ms = interim_ms or int(os.getenv("LOCAL_STT_INTERIM_MS", "300"))
+        self.frame_ms = 20
+        self.frame_bytes = sample_rate * self.frame_ms // 1000 * 2
+        self.pending = bytearray()
+        self.utterance = bytearray()
+        self.speech_ms = 0
+        self.silent_ms = 0
+        self.last_interim_ms = 0
+        self.closed = False
+
+    def feed(self, chunk):
+        if self.closed:
+            return
+        self.pending += chunk
+        while len(self.pending) >= self.frame_bytes:
+            frame = bytes(self.pending[:self.frame_bytes])
+            del self.pending[:self.frame_bytes]
+            samples = np.frombuffer(frame, dtype='<i2').astype(np.float32)
+            if np.sqrt(np.mean(samples * samples)) >= self.threshold:
+                self.utterance += frame
+                self.speech_ms += self.frame_ms
+                self.silent_ms = 0
+                if self.speech_ms - self.last_interim_ms >= self.interim_ms:
+                    self.last_interim_ms = self.speech_ms
+                    self._emit(self.transcribe(bytes(self.utterance)), False)
+            elif self.utterance:
+                self.utterance += frame
+                self.silent_ms += self.frame_ms
+                if self.silent_ms >= self.silence_ms:
+                    self._end_utterance()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.speech_ms:
+            self._end_utterance()
+        self._finish()
+
+    def _end_utterance(self):
+        # Leave the trailing silence out of the transcript
+        speech = bytes(self.utterance[:len(self.utterance) - self.silent_ms * self.frame_bytes // self.frame_ms])
+        self._emit(self.transcribe(speech), True)
+        self.utterance = bytearray()
+        self.speech_ms = self.silent_ms = self.last_interim_ms = 0
+
+    def _placeholder(self, pcm):
+        return f"({len(pcm) / 2 / self.sample_rate:.1f} seconds of speech)"
+
+
+if __name__ == "__main__":
+    # Endpointing on paced 20 ms chunks: time from the true end of each
+    # utterance to its final result, and recognizer CPU per second of audio
+    SAMPLE_RATE = 16000
+    CHUNK_MS = 20
+    UTTERANCES = 5
+
+    rng = np.random.default_rng(0)
+
+    def tone(seconds):
+        t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+        return (3000 * np.sin(2 * np.pi * 220 * t)).astype('<i2')
+
+    def silence(seconds):
+        return rng.normal(0, 50, int(SAMPLE_RATE * seconds)).astype('<i2')
+
+    # Each utterance is 0.8-2 s of speech followed by 1 s of silence
+    segments, speech_ends, position = [], [], 0.0
+    for i in range(UTTERANCES):
+        length = 0.8 + 0.3 * i
+        segments += [tone(length), silence(1.0)]
+        speech_ends.append(position + length)
+        position += length + 1.0
+    audio = np.concatenate(segments).tobytes()
+    chunk_bytes = SAMPLE_RATE * CHUNK_MS // 1000 * 2
+
+    async def main():
+        stream = LocalRecognitionStream(SAMPLE_RATE)
+        finals, interims = [], 0
+
+        async def collect():
+            nonlocal interims
+            async for result in stream:
+                if result["final"]:
+                    finals.append((result["at"], result["transcript"]))
+                else:
+                    interims += 1
+
+        collector = asyncio.create_task(collect())
+        start = time.perf_counter()
+        cpu = 0.0
+        for i, offset in enumerate(range(0, len(audio), chunk_bytes)):
+            # A chunk is sent once it has been recorded
+            await asyncio.sleep(max(0.0, start + (i + 1) * CHUNK_MS / 1000 - time.perf_counter()))
+            cpu_start = time.process_time()
+            stream.feed(audio[offset:offset + chunk_bytes])
+            cpu += time.process_time() - cpu_start
+        stream.close()
+        await collector
+
+        delays = [(at - start - end) * 1000 for (at, _), end in zip(finals, speech_ends)]
+        print(f"{len(finals)} utterances, {interims} interim results: end of speech to final "
+              f"{min(delays):.0f}-{max(delays):.0f} ms (endpoint silence {stream.silence_ms} ms), "
+              f"CPU {cpu / (len(audio) / 2 / SAMPLE_RATE) * 1000:.2f} ms per second of audio")
+        print([text for _, text in finals])
+
+    asyncio.run(main())
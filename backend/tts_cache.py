@@ -0,0 +1,195 @@
+# backend/tts_cache.py
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class TTSCache:
+    """Disk-backed, content-addressed cache of synthesized speech
+
+    Files are named by a SHA-256 of the text, voice and audio config, so a
+    reply that has been spoken before is never synthesized again, and the
+    cache survives restarts. The size is bounded to TTS_CACHE_MAX_BYTES by
+    evicting the least recently used files. The bound is kept per process:
+    each process counts the files it found at startup plus the ones it wrote,
+    so API workers sharing one directory can together grow it to about
+    workers x TTS_CACHE_MAX_BYTES. Cached files can be streamed straight from
+    an mmap of the file.
+    """
+
+    def __init__(self, directory=None, max_bytes=None, suffix=".mp3"):
+        self.directory = directory or os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "mannmitra-tts"))
+        self.max_bytes = max_bytes or int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+        self.suffix = suffix
+        os.makedirs(self.directory, exist_ok=True)
+        # key -> size in bytes, least recently used first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Pick up files from earlier runs, oldest access first
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def key(self, text, voice, audio_config):
+        """Content address for text spoken with the given voice and audio config"""
+        material = json.dumps([text, voice, audio_config], sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """The cached audio bytes, or None"""
+        if not self._touch(key):
+            return None
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            self._forget(key)
+            return None
+
+    def put(self, key, audio):
+        # Write to a temporary name first so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, self.path(key))
+        with self._lock:
+            self.total_bytes += len(audio) - self.entries.pop(key, 0)
+            self.entries[key] = len(audio)
+        self._evict()
+
+    def stream(self, key, chunk_size=64 * 1024):
+        """Iterate over a cached file's bytes from an mmap, or None if it is not cached"""
+        if not self._touch(key):
+            return None
+        try:
+            f = open(self.path(key), "rb")
+        except OSError:
+            self._forget(key)
+            return None
+
+        def chunks():
+            # An evicted file stays readable through the open mapping
+            with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(0, len(mapped), chunk_size):
+                    yield mapped[offset:offset + chunk_size]
+
+        return chunks()
+
+    def _touch(self, key):
+        with self._lock:
+            if key not in self.entries:
+                self.misses += 1
+                return False
+            self.entries.move_to_end(key)
+            self.hits += 1
+        try:
+            # Keep the LRU order across restarts
+            os.utime(self.path(key))
+        except OSError:
+            pass
+        return True
+
+    def _forget(self, key):
+        with self._lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+
+    def _evict(self):
+        while True:
+            with self._lock:
+                if self.total_bytes <= self.max_bytes or len(self.entries) <= 1:
+                    return
+                key, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+            try:
+                os.unlink(self.path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "directory": self.directory,
+            "files": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions
+        }
+
+
+if __name__ == "__main__":
+    # Serving repeated replies: synthesizing every time (simulated 150 ms TTS
+    # call plus the old base64 round trip) vs cache hits read whole or
+    # streamed from the mmap
+    import base64
+    import random
+    import shutil
+    import time
+
+    TTS_LATENCY = 0.15
+    REPLIES = 20
+    REQUESTS = 2000
+
+    directory = tempfile.mkdtemp(prefix="tts-cache-benchmark-")
+    cache = TTSCache(directory, max_bytes=8 * 1024 * 1024)
+    voice = {"language_code": "en-US", "name": "en-US-Wavenet-D"}
+    audio_config = {"audio_encoding": "MP3", "speaking_rate": 0.9}
+    replies = [f"Reply number {i}. I'm here to listen." for i in range(REPLIES)]
+
+    def synthesize(text):
+        time.sleep(TTS_LATENCY)
+        return random.randbytes(60 * 1024)
+
+    random.seed(0)
+    start = time.perf_counter()
+    for text in replies[:5]:
+        base64.b64decode(base64.b64encode(synthesize(text)).decode())
+    uncached_ms = (time.perf_counter() - start) / 5 * 1000
+
+    for text in replies:
+        cache.put(cache.key(text, voice, audio_config), synthesize(text))
+
+    keys = [cache.key(random.choice(replies), voice, audio_config) for _ in range(REQUESTS)]
+    start = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    read_us = (time.perf_counter() - start) / REQUESTS * 1e6
+    start = time.perf_counter()
+    for key in keys:
+        for _ in cache.stream(key):
+            pass
+    mmap_us = (time.perf_counter() - start) / REQUESTS * 1e6
+
+    # Bounded size: 200 more distinct replies evict the least recently used
+    for i in range(200):
+        cache.put(cache.key(f"extra {i}", voice, audio_config), random.randbytes(60 * 1024))
+
+    print(f"60 KB reply: synthesize {uncached_ms:.1f} ms, cached read {read_us:.1f} us, "
+          f"cached mmap stream {mmap_us:.1f} us")
+    print(cache.stats())
+    shutil.rmtree(directory)
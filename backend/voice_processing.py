@@ -1,15 +1,104 @@
 # backend/voice_processing.py
+import asyncio
 import base64
-import tempfile
+import queue
 import os
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import speech_v1 as speech
 from google.cloud import texttospeech_v1 as texttospeech
 from dotenv import load_dotenv
 
+from metrics import LatencyTracker
+from speech_streaming import LocalRecognitionStream, RecognitionStream
+from tts_cache import TTSCache
+
 load_dotenv()
 
+class GoogleRecognitionStream(RecognitionStream):
+    """Cloud Speech streaming recognition with interim results
+
+    The client's streaming_recognize is blocking, so it runs on a thread of
+    the given executor, pulling chunks from a bounded queue and handing
+    results back to the event loop. If the recognizer falls SPEECH_STREAM_QUEUE
+    chunks behind, new chunks are dropped rather than buffered.
+    """
+    
+    def __init__(self, client, executor, sample_rate=16000, language_code='en-US', max_chunks=None):
+        super().__init__()
+        self.chunks = queue.Queue(maxsize=max_chunks or int(os.getenv("SPEECH_STREAM_QUEUE", "250")))
+        self.dropped = 0
+        loop = asyncio.get_running_loop()
+        config = speech.StreamingRecognitionConfig(
+            config=speech.RecognitionConfig(
+                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+                sample_rate_hertz=sample_rate,
+                language_code=language_code,
+            ),
+            interim_results=True
+        )
+        
+        def requests():
+            while True:
+                chunk = self.chunks.get()
+                if chunk is None:
+                    return
+                yield speech.StreamingRecognizeRequest(audio_content=chunk)
+        
+        def run():
+            try:
+                for response in client.streaming_recognize(config, requests()):
+                    for result in response.results:
+                        if result.alternatives:
+                            loop.call_soon_threadsafe(self._emit, result.alternatives[0].transcript, result.is_final)
+            except Exception as e:
+                print(f"Streaming speech to text error: {e}")
+            finally:
+                loop.call_soon_threadsafe(self._finish)
+        
+        self.task = loop.run_in_executor(executor, run)
+    
+    def feed(self, chunk):
+        try:
+            self.chunks.put_nowait(chunk)
+        except queue.Full:
+            self.dropped += 1
+    
+    def close(self):
+        # The end marker must get through, so make room for it if needed
+        while True:
+            try:
+                self.chunks.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    self.chunks.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
 class VoiceProcessor:
     def __init__(self):
+        # Voice and audio config; both are part of the audio cache key
+        self.voice = {
+            'language_code': 'en-US',
+            'name': 'en-US-Wavenet-D',  # Compassionate female voice
+            'ssml_gender': 'FEMALE'
+        }
+        self.audio_config = {
+            'audio_encoding': 'MP3',
+            'speaking_rate': 0.9,  # Slightly slower for compassion
+            'pitch': 0.0  # Neutral pitch
+        }
+        self.audio_cache = TTSCache()
+        self.latency = LatencyTracker()
+        
+        # Each streaming recognition holds a thread for its whole session, so
+        # sessions get their own bounded pool instead of the default executor
+        self.max_streams = int(os.getenv("SPEECH_MAX_STREAMS", "32"))
+        self.stream_executor = ThreadPoolExecutor(max_workers=self.max_streams, thread_name_prefix="speech-stream")
+        self.active_streams = 0
+        self.rejected_streams = 0
+        
         # Initialize speech clients
         try:
             self.speech_client = speech.SpeechClient()
@@ -27,16 +116,8 @@ class VoiceProcessor:
             # Decode base64 audio
             audio_content = base64.b64decode(audio_data)
             
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                tmp_file.write(audio_content)
-                tmp_file_name = tmp_file.name
-            
             # Configure recognition
-            with open(tmp_file_name, 'rb') as audio_file:
-                content = audio_file.read()
-            
-            audio = speech.RecognitionAudio(content=content)
+            audio = speech.RecognitionAudio(content=audio_content)
             config = speech.RecognitionConfig(
                 encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
                 sample_rate_hertz=16000,
@@ -46,9 +127,6 @@ class VoiceProcessor:
             # Perform speech-to-text
             response = self.speech_client.recognize(config=config, audio=audio)
             
-            # Clean up
-            os.unlink(tmp_file_name)
-            
             if response.results:
                 return response.results[0].alternatives[0].transcript
             return "Sorry, I couldn't understand that."
@@ -56,7 +134,64 @@ class VoiceProcessor:
             print(f"Speech to text error: {e}")
             return "Sorry, I couldn't process your audio."
     
+    def open_stream(self, sample_rate=16000):
+        """Start streaming recognition of raw 16-bit mono PCM
+
+        SPEECH_RECOGNIZER=local uses the offline stand-in recognizer.
+        Returns None when no recognizer is available or SPEECH_MAX_STREAMS
+        sessions are already open.
+        """
+        if os.getenv("SPEECH_RECOGNIZER", "google").lower() == "local":
+            return LocalRecognitionStream(sample_rate)
+        if not self.speech_available:
+            return None
+        if self.active_streams >= self.max_streams:
+            self.rejected_streams += 1
+            return None
+        stream = GoogleRecognitionStream(self.speech_client, self.stream_executor, sample_rate)
+        self.active_streams += 1
+        stream.task.add_done_callback(self._stream_finished)
+        return stream
+    
+    def _stream_finished(self, task):
+        self.active_streams -= 1
+    
     def text_to_speech(self, text):
+        """MP3 bytes for text, from the audio cache when it has been spoken before"""
+        key = self.audio_key(text)
+        audio = self.audio_cache.get(key)
+        if audio is None:
+            audio = self._synthesize(text)
+            if audio:
+                self.audio_cache.put(key, audio)
+        return audio
+    
+    def stream_speech(self, text):
+        """Iterator over the MP3 for text, served from the cached file"""
+        key = self.audio_key(text)
+        # stream() itself reports a miss, so a file evicted in between is
+        # synthesized again rather than lost
+        stream = self.audio_cache.stream(key)
+        if stream is not None:
+            return stream
+        audio = self._synthesize(text)
+        if not audio:
+            return None
+        self.audio_cache.put(key, audio)
+        return iter((audio,))
+    
+    def audio_key(self, text):
+        return self.audio_cache.key(text, self.voice, self.audio_config)
+    
+    def prewarm(self, phrases):
+        """Synthesize common phrases ahead of time (TTS_PREWARM=0 disables)"""
+        if os.getenv("TTS_PREWARM", "1") == "0":
+            return
+        for text in phrases:
+            if self.audio_key(text) not in self.audio_cache:
+                self.text_to_speech(text)
+    
+    def _synthesize(self, text):
         if not self.speech_available:
             return None
         
@@ -65,15 +200,15 @@ class VoiceProcessor:
             synthesis_input = texttospeech.SynthesisInput(text=text)
             
             voice = texttospeech.VoiceSelectionParams(
-                language_code='en-US',
-                name='en-US-Wavenet-D',  # Compassionate female voice
-                ssml_gender=texttospeech.SsmlVoiceGender.FEMALE
+                language_code=self.voice['language_code'],
+                name=self.voice['name'],
+                ssml_gender=getattr(texttospeech.SsmlVoiceGender, self.voice['ssml_gender'])
             )
             
             audio_config = texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3,
-                speaking_rate=0.9,  # Slightly slower for compassion
-                pitch=0.0  # Neutral pitch
+                audio_encoding=getattr(texttospeech.AudioEncoding, self.audio_config['audio_encoding']),
+                speaking_rate=self.audio_config['speaking_rate'],
+                pitch=self.audio_config['pitch']
             )
             
             # Perform text-to-speech
@@ -81,8 +216,7 @@ class VoiceProcessor:
                 input=synthesis_input, voice=voice, audio_config=audio_config
             )
             
-            # Encode to base64 for sending over HTTP
-            return base64.b64encode(response.audio_content).decode('utf-8')
+            return response.audio_content
         except Exception as e:
             print(f"Text to speech error: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,220 @@
+# backend/write_buffer.py
+import asyncio
+import os
+import time
+from collections import deque
+
+# Firestore rejects write batches with more than 500 operations
+MAX_BATCH_OPS = 500
+
+
+class WriteBehindBuffer:
+    """Groups async Firestore document writes into WriteBatch commits
+
+    Writes are queued and committed by a background task once a batch is
+    full or flush_interval seconds have passed. At most max_pending writes
+    are held in memory; beyond that writers wait for the background task
+    to drain a batch. Only one commit runs at a time, so batches land in
+    queue order. A failed commit puts its writes back at the front of the
+    queue and the task waits flush_interval before retrying, up to
+    max_retries times before they are dropped.
+    """
+
+    def __init__(self, client, max_batch_size=None, flush_interval=None, max_pending=None, max_retries=None):
+        self.client = client
+        self.max_batch_size = min(max_batch_size or int(os.getenv("FIRESTORE_BATCH_SIZE", "500")), MAX_BATCH_OPS)
+        self.flush_interval = flush_interval or float(os.getenv("FIRESTORE_FLUSH_INTERVAL", "1.0"))
+        self.max_pending = max_pending or int(os.getenv("FIRESTORE_MAX_PENDING", "5000"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("FIRESTORE_MAX_RETRIES", "3"))
+
+        self.pending = deque()
+        self._batch_ready = None
+        self._drained = None
+        self._lock = None
+        self._task = None
+        self._closed = False
+
+        self.buffered_writes = 0
+        self.direct_writes = 0
+        self.commits = 0
+        self.failed_writes = 0
+        self.retried_writes = 0
+
+    def _ensure_started(self):
+        # The flush task can only be created once an event loop is running
+        if self._task is None:
+            self._batch_ready = asyncio.Event()
+            self._drained = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def set(self, doc_ref, data, merge=False):
+        """Queue doc_ref.set(data) for the next batch commit"""
+        if self._closed:
+            await self.set_now(doc_ref, data, merge)
+            return
+
+        self._ensure_started()
+        while len(self.pending) >= self.max_pending and not self._closed:
+            # Backpressure: let the flush task commit rather than racing it
+            self._drained.clear()
+            self._batch_ready.set()
+            await self._drained.wait()
+
+        self.pending.append((doc_ref, data, merge, 0))
+        self.buffered_writes += 1
+        if len(self.pending) >= self.max_batch_size:
+            self._batch_ready.set()
+
+    async def set_now(self, doc_ref, data, merge=False):
+        """Write immediately, bypassing the buffer"""
+        self.direct_writes += 1
+        await doc_ref.set(data, merge=merge)
+
+    async def _run(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+
+            while self.pending:
+                flushed = await self._flush_batch()
+                self._drained.set()
+                if not flushed:
+                    # Back off a full interval before retrying, even when
+                    # writers are blocked on a full queue
+                    await asyncio.sleep(self.flush_interval)
+                    break
+                if len(self.pending) < self.max_batch_size:
+                    break
+            self._drained.set()
+
+    async def _flush_batch(self):
+        async with self._lock:
+            return await self._commit_batch()
+
+    async def _commit_batch(self):
+        count = min(len(self.pending), self.max_batch_size)
+        ops = [self.pending.popleft() for _ in range(count)]
+        if not ops:
+            return True
+
+        try:
+            batch = self.client.batch()
+            for doc_ref, data, merge, _ in ops:
+                batch.set(doc_ref, data, merge=merge)
+            await batch.commit()
+            self.commits += 1
+            return True
+        except Exception as e:
+            print(f"Error committing write batch of {len(ops)} operations: {e}")
+            # Requeue in the original order, ahead of newer writes
+            for doc_ref, data, merge, attempts in reversed(ops):
+                if attempts < self.max_retries:
+                    self.pending.appendleft((doc_ref, data, merge, attempts + 1))
+                    self.retried_writes += 1
+                else:
+                    self.failed_writes += 1
+            return False
+
+    async def close(self):
+        """Flush everything still buffered and stop the background task"""
+        self._closed = True
+        if self._task is not None:
+            self._batch_ready.set()
+            await self._task
+            self._drained.set()
+        while self.pending:
+            await self._flush_batch()
+
+    def stats(self):
+        round_trips = self.commits + self.direct_writes
+        total_writes = self.buffered_writes + self.direct_writes
+        return {
+            "pending": len(self.pending),
+            "buffered_writes": self.buffered_writes,
+            "direct_writes": self.direct_writes,
+            "commits": self.commits,
+            "retried_writes": self.retried_writes,
+            "failed_writes": self.failed_writes,
+            "round_trips_saved": max(total_writes - round_trips - self.failed_writes, 0)
+        }
+
+
+if __name__ == "__main__":
+    # Count Firestore round trips against a fake client for a burst of
+    # emotion frame writes, with and without the buffer
+    class FakeBatch:
+        def __init__(self, client):
+            self.client = client
+
+        def set(self, doc_ref, data, merge=False):
+            pass
+
+        async def commit(self):
+            await asyncio.sleep(0.005)
+            self.client.round_trips += 1
+
+    class FakeDocument:
+        def __init__(self, client):
+            self.client = client
+
+        async def set(self, data, merge=False):
+            await asyncio.sleep(0.005)
+            self.client.round_trips += 1
+
+    class FakeClient:
+        def __init__(self):
+            self.round_trips = 0
+
+        def batch(self):
+            return FakeBatch(self)
+
+    async def main(writes=2000):
+        direct = FakeClient()
+        start = time.perf_counter()
+        for _ in range(writes):
+            await FakeDocument(direct).set({"emotion": "neutral"})
+        print(f"direct:       {direct.round_trips} round trips, {time.perf_counter() - start:.2f}s")
+
+        buffered = FakeClient()
+        buffer = WriteBehindBuffer(buffered, flush_interval=0.1)
+        start = time.perf_counter()
+        for _ in range(writes):
+            await buffer.set(FakeDocument(buffered), {"emotion": "neutral"})
+        await buffer.close()
+        print(f"write-behind: {buffered.round_trips} round trips, {time.perf_counter() - start:.2f}s")
+
+        # A commit that fails twice is retried rather than losing its writes
+        class FlakyBatch(FakeBatch):
+            async def commit(self):
+                self.client.attempts += 1
+                if self.client.attempts <= 2:
+                    raise ConnectionError("deadline exceeded")
+                await super().commit()
+
+        flaky = FakeClient()
+        flaky.attempts = 0
+        flaky.batch = lambda: FlakyBatch(flaky)
+        buffer = WriteBehindBuffer(flaky, flush_interval=0.01)
+        for _ in range(100):
+            await buffer.set(FakeDocument(flaky), {"emotion": "neutral"})
+        await buffer.close()
+        stats = buffer.stats()
+        print(f"flaky commits: {stats['retried_writes']} writes retried, {stats['failed_writes']} lost")
+
+        # With a full queue, writers wait on the flush task and its backoff
+        # instead of spending the retries in a tight loop
+        flaky = FakeClient()
+        flaky.attempts = 0
+        flaky.batch = lambda: FlakyBatch(flaky)
+        buffer = WriteBehindBuffer(flaky, max_batch_size=20, flush_interval=0.01, max_pending=20)
+        for _ in range(100):
+            await buffer.set(FakeDocument(flaky), {"emotion": "neutral"})
+        await buffer.close()
+        stats = buffer.stats()
+        print(f"backpressure:  {stats['commits']} commits, {stats['retried_writes']} writes retried, {stats['failed_writes']} lost")
+
+    asyncio.run(main())
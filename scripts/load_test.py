@@ -0,0 +1,106 @@
+# scripts/load_test.py
+"""Concurrent load test against the FastAPI app, in process
+
+Runs /chat, /chat/stream and /mood/history requests concurrently through
+httpx against backend/main.py, with the in-memory database
+(DATABASE_BACKEND=memory) and replayed model responses
+(LLM_BACKEND=recorded), so no Firestore or Gemini credentials are needed.
+Alongside the load, a cheap GET /exercises probe measures how long the
+event loop takes to answer; it rises if a handler blocks the loop.
+
+Usage: python scripts/load_test.py [requests] [concurrency]
+Needs the frontend built, since main.py mounts frontend/build/static
+and frontend/build/assets.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend")
+
+os.environ["DATABASE_BACKEND"] = "memory"
+os.environ["LLM_BACKEND"] = "recorded"
+sys.path.insert(0, BACKEND)
+
+MESSAGES = [
+    "I'm so stressed with work",
+    "I had a nice dinner with a friend today",
+    "I can't sleep before my exam",
+    "Feeling a bit lonely this week"
+]
+
+
+async def chat(client, i):
+    await client.post("/chat", json={"user_id": f"user-{i % 50}", "message": MESSAGES[i % len(MESSAGES)]})
+
+
+async def chat_stream(client, i):
+    request = {"user_id": f"user-{i % 50}", "message": MESSAGES[i % len(MESSAGES)]}
+    async with client.stream("POST", "/chat/stream", json=request) as response:
+        async for _ in response.aiter_lines():
+            pass
+
+
+async def mood_history(client, i):
+    await client.get(f"/mood/history/user-{i % 50}")
+
+
+SCENARIOS = [("/chat", chat), ("/chat/stream", chat_stream), ("/mood/history", mood_history)]
+
+
+async def run(requests, concurrency):
+    import httpx
+    from main import app
+    from metrics import LatencyTracker
+
+    latency = LatencyTracker(window=requests)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+        # Build the lazy components before timing anything
+        for _, scenario in SCENARIOS:
+            await scenario(client, 0)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        done = asyncio.Event()
+
+        async def timed(name, scenario, i):
+            async with semaphore:
+                start = time.perf_counter()
+                await scenario(client, i)
+                latency.record(name, time.perf_counter() - start)
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/exercises")
+                latency.record("loop probe", time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(timed(*SCENARIOS[i % len(SCENARIOS)], i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+        database = (await client.get("/metrics/database")).json()
+
+    print(f"{requests} requests, {concurrency} concurrent: {elapsed:.2f}s, {requests / elapsed:.0f} requests/s, "
+          f"{database.get('writes')} writes")
+    for name, stats in latency.snapshot().items():
+        print(f"{name:>14}: {json.dumps(stats)}")
+
+
+if __name__ == "__main__":
+    for directory in ("static", "assets"):
+        if not os.path.isdir(os.path.join(ROOT, "frontend", "build", directory)):
+            sys.exit(f"frontend/build/{directory} is missing; build the frontend first (main.py mounts it)")
+
+    # main.py resolves frontend/build relative to the working directory
+    os.chdir(ROOT)
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(run(requests, concurrency))